@@ -1,7 +1,14 @@
 import streamlit as st
 import pandas as pd
 from utils.auth import create_user, get_user, hash_password
-from utils.db import run_query, execute_query
+from utils.db import run_query, execute_query, query_metrics, cache_stats, pool_status
+from utils.mviews import get_watermarks
+from utils.figures import figure_cache
+from utils.forecast import forecast_cache
+from utils.models import model_registry
+from utils.jobs import forecast_jobs
+from utils import forecast_store
+from utils.sarima import sarima_states
 
 
 # ==========================================================
@@ -87,12 +94,80 @@ with st.form("reset_password_form", clear_on_submit=True):
             new_hash = hash_password(new_password)
 
             try:
-                query = f"""
+                query = """
                 UPDATE Users 
-                SET password_hash = '{new_hash}' 
-                WHERE email = '{email_reset}';
+                SET password_hash = :password_hash 
+                WHERE email = :email;
                 """
-                execute_query(query)
+                execute_query(
+                    query, {"password_hash": new_hash, "email": email_reset}
+                )
                 st.success("Contraseña restablecida correctamente.")
             except Exception as e:
                 st.error(f"Error al actualizar contraseña: {e}")
+
+
+
+st.divider()
+
+
+# ==========================================================
+# SECCIÓN 4 — RENDIMIENTO DE CONSULTAS
+# ==========================================================
+st.subheader("Rendimiento de consultas")
+
+with st.expander("Ver métricas de base de datos"):
+    col1, col2 = st.columns(2)
+    col1.write("**Pool de conexiones**")
+    col1.json(pool_status())
+    col2.write("**Caché de consultas**")
+    col2.json(cache_stats())
+
+    st.write("**Caché de figuras** (JSON de gráficas ya construidas)")
+    st.json(figure_cache.stats())
+
+    st.write("**Caché de predicciones**")
+    st.json(forecast_cache.stats())
+    predicciones = forecast_cache.entries()
+    if not predicciones.empty:
+        st.dataframe(predicciones, use_container_width=True)
+
+    st.write("**Predicciones precalculadas** (almacén persistente)")
+    precalculadas = forecast_store.summary()
+    if precalculadas.empty:
+        st.info("Todavía no se ha precalculado ninguna predicción.")
+    else:
+        st.dataframe(precalculadas, use_container_width=True)
+
+    st.write("**Trabajos de predicción en segundo plano**")
+    st.json(forecast_jobs.stats())
+    trabajos = forecast_jobs.jobs()
+    if not trabajos.empty:
+        st.dataframe(trabajos, use_container_width=True)
+
+    st.write("**Ajustes SARIMA guardados** (actualizaciones incrementales y reajustes)")
+    st.json(sarima_states.stats())
+
+    st.write("**Modelos de predicción** (se cargan al usarse)")
+    st.dataframe(model_registry.status(), use_container_width=True)
+
+    st.write("**Último refresco de los agregados mv_***")
+    marcas = get_watermarks()
+    if marcas.empty:
+        st.info("Los agregados no se han refrescado todavía con el gestor.")
+    else:
+        st.dataframe(marcas, use_container_width=True)
+
+    resumen = query_metrics.summary()
+    if resumen.empty:
+        st.info("Todavía no se ha registrado ninguna consulta.")
+    else:
+        st.write("**Resumen por consulta** (ordenado por p95)")
+        st.dataframe(resumen, use_container_width=True)
+
+        lentas = query_metrics.slow_queries()
+        st.write(f"**Consultas lentas** (> {query_metrics.slow_threshold_s * 1000:.0f} ms)")
+        if lentas.empty:
+            st.info("No hay consultas lentas registradas.")
+        else:
+            st.dataframe(lentas, use_container_width=True)
@@ -1,12 +1,16 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 import plotly.express as px
-from utils.db import run_query
+from utils.chart_data import chart_frame
+from utils.db import run_query, run_queries
+from utils.figures import cached_figure
+from utils.mviews import sync_caches, data_version
+from utils.semantic import semantic_query
+from utils.series_store import sales_store
+from utils.jobs import JobError, PENDING_STATES, forecast_jobs
+from utils.models import ModelLoadError
+from utils.predictions import HORIZONTES, cached_prediction, prediction_key
 import os
-from tensorflow.keras.models import load_model
-from statsmodels.tsa.statespace.sarimax import SARIMAX
-import pickle
 
 # ==========================================================
 # CONTROL DE ACCESO
@@ -31,6 +35,9 @@ if os.path.exists(logo_path):
 
 st.title("Panel de Dirección - Ventas y Análisis Global")
 
+# Si otro proceso ha refrescado los agregados, descartar lo cacheado
+sync_caches()
+
 
 # ==========================================================
 # FUNCIONES AUXILIARES DE VISUALIZACIÓN
@@ -39,7 +46,8 @@ def plot_line(df, x, y, title):
     if df.empty:
         st.info("No hay datos disponibles.")
         return
-    fig = px.line(
+    fig = cached_figure(
+        px.line,
         df,
         x=x,
         y=y,
@@ -54,7 +62,8 @@ def plot_bar(df, x, y, title, color=None):
     if df.empty:
         st.info("No hay datos disponibles.")
         return
-    fig = px.bar(
+    fig = cached_figure(
+        px.bar,
         df,
         x=x,
         y=y,
@@ -70,7 +79,8 @@ def plot_treemap(df, title="Distribución geográfica de ventas"):
     if df.empty:
         st.info("No hay información geográfica disponible.")
         return
-    fig = px.treemap(
+    fig = cached_figure(
+        px.treemap,
         df,
         path=["REGION", "CITY"],
         values="total_ventas",
@@ -84,6 +94,9 @@ def plot_treemap(df, title="Distribución geográfica de ventas"):
 # ==========================================================
 # TABS PRINCIPALES
 # ==========================================================
+# Métricas de ventas que piden las pestañas 1 y 2 a la capa semántica
+VENTAS = ["total_ventas", "num_pedidos", "ticket_medio"]
+
 tab1, tab2, tab3 = st.tabs(
     ["Análisis por Año", "Comparativa entre Años", "Predicción de Ventas"]
 )
@@ -104,78 +117,57 @@ with tab1:
     st.markdown("---")
 
     # ---------------- CONSULTAS ----------------
-    query_kpis = f"""
-    SELECT 
-        SUM(o."TOTALBASKET") AS total_ventas,
-        COUNT(o."ORDERID") AS num_pedidos,
-        AVG(o."TOTALBASKET") AS ticket_medio
-    FROM "Orders" o
-    JOIN "Branches" b ON o."BRANCH_ID" = b."BRANCH_ID"
-    WHERE EXTRACT(YEAR FROM o."DATE_") = {year}
-    {"AND b.\"REGION\" ILIKE '%" + region + "%'" if region else ""};
-    """
-
-    query_evolucion = f"""
-    SELECT 
-        mes,
-        SUM(total_ventas) AS total_ventas,
-        SUM(num_pedidos) AS num_pedidos,
-        AVG(ticket_medio) AS ticket_medio
-    FROM mv_evolucion_mensual
-    WHERE anio = {year}
-    {"AND \"REGION\" ILIKE '%" + region + "%'" if region else ""}
-    GROUP BY mes
-    ORDER BY mes;
-    """
-
-    query_mapa = f"""
-    SELECT 
-        "REGION",
-        "CITY",
-        SUM(total_ventas) AS total_ventas,
-        SUM(num_pedidos) AS num_pedidos,
-        AVG(ticket_medio) AS ticket_medio
-    FROM mv_ventas_mapa
-    WHERE anio = {year}
-    GROUP BY "REGION", "CITY"
-    ORDER BY total_ventas DESC;
-    """
-
-    query_top_productos = f"""
-    SELECT 
-        "ITEMNAME",
-        categoria,
-        marca,
-        ingresos,
-        unidades
-    FROM mv_top_productos
-    WHERE anio = {year}
-    ORDER BY ingresos DESC
-    LIMIT 15;
-    """
-
-    query_top_categorias = f"""
-    SELECT 
-        categoria,
-        ingresos,
-        unidades
-    FROM mv_top_categorias
-    WHERE anio = {year}
-    ORDER BY ingresos DESC
-    LIMIT 10;
-    """
+    # Cada petición se describe por métricas, dimensiones y filtros; la capa
+    # semántica elige el agregado más barato que la responde. El SQL es fijo
+    # con parámetros y la región vacía se traduce en NULL (sin filtro).
+    params = {
+        "year": year,
+        "region": f"%{region}%" if region else None,
+    }
 
     # ---------------- CARGA DE DATOS ----------------
-    try:
-        kpis = run_query(query_kpis)
-        evolucion = run_query(query_evolucion)
-        mapa = run_query(query_mapa)
-        top_prod = run_query(query_top_productos)
-        top_cat = run_query(query_top_categorias)
-    except Exception as e:
+    # Las cinco consultas son independientes: se lanzan a la vez
+    datos = run_queries({
+        "kpis": semantic_query("direccion_kpis", VENTAS, filters=params),
+        "evolucion": semantic_query(
+            "direccion_evolucion", VENTAS, ["mes"], params, order_by=["mes"]
+        ),
+        "mapa": semantic_query(
+            "direccion_mapa",
+            VENTAS,
+            ["REGION", "CITY"],
+            params,
+            order_by=["-total_ventas"],
+        ),
+        "top_prod": semantic_query(
+            "direccion_top_productos",
+            ["ingresos", "unidades"],
+            ["ITEMNAME", "categoria", "marca"],
+            {"year": year},
+            order_by=["-ingresos"],
+            limit=15,
+        ),
+        "top_cat": semantic_query(
+            "direccion_top_categorias",
+            ["ingresos", "unidades"],
+            ["categoria"],
+            {"year": year},
+            order_by=["-ingresos"],
+            limit=10,
+        ),
+    })
+
+    if datos.errors:
+        e = next(iter(datos.errors.values()))
         st.error(f"Error al cargar los datos: {e}")
         st.stop()
 
+    kpis = datos["kpis"]
+    evolucion = datos["evolucion"]
+    mapa = datos["mapa"]
+    top_prod = datos["top_prod"]
+    top_cat = datos["top_cat"]
+
     # ==========================================================
     # SECCIÓN — KPIs
     # ==========================================================
@@ -237,18 +229,9 @@ with tab2:
 
     # Consulta global si no se selecciona nada
     if not regiones_seleccionadas:
-        query_comparativa = """
-        SELECT 
-            EXTRACT(YEAR FROM o."DATE_") AS anio,
-            SUM(o."TOTALBASKET") AS total_ventas,
-            COUNT(o."ORDERID") AS num_pedidos,
-            AVG(o."TOTALBASKET") AS ticket_medio
-        FROM "Orders" o
-        GROUP BY anio
-        ORDER BY anio;
-        """
-
-        df_comp = run_query(query_comparativa)
+        df_comp = run_query(*semantic_query(
+            "direccion_comparativa", VENTAS, ["anio"], order_by=["anio"]
+        ))
 
         if not df_comp.empty:
             st.subheader("Ventas Totales (Global)")
@@ -275,22 +258,13 @@ with tab2:
             st.info("No hay datos disponibles.")
     else:
         # Consulta por regiones seleccionadas
-        regiones_str = ", ".join([f"'{r}'" for r in regiones_seleccionadas])
-        query_comparativa = f"""
-        SELECT 
-            EXTRACT(YEAR FROM o."DATE_") AS anio,
-            b."REGION",
-            SUM(o."TOTALBASKET") AS total_ventas,
-            COUNT(o."ORDERID") AS num_pedidos,
-            AVG(o."TOTALBASKET") AS ticket_medio
-        FROM "Orders" o
-        JOIN "Branches" b ON o."BRANCH_ID" = b."BRANCH_ID"
-        WHERE b."REGION" IN ({regiones_str})
-        GROUP BY anio, b."REGION"
-        ORDER BY anio, b."REGION";
-        """
-
-        df_comp = run_query(query_comparativa)
+        df_comp = run_query(*semantic_query(
+            "direccion_comparativa_regiones",
+            VENTAS,
+            ["anio", "REGION"],
+            {"regiones": list(regiones_seleccionadas)},
+            order_by=["anio", "REGION"],
+        ))
 
         if not df_comp.empty:
             st.subheader("Ventas por Región y Año")
@@ -324,159 +298,37 @@ with tab2:
 # TAB 3 — PREDICCIÓN DE VENTAS (SARIMA DINÁMICO)
 # ==========================================================
 
-# 0. CACHE DE DATOS
-@st.cache_data
-def load_all_sales():
-    query = """
-    SELECT 
-        o."DATE_" AS date,
-        o."TOTALBASKET" AS daily_sales,
-        b."REGION",
-        b."CITY"
-    FROM "Orders" o
-    LEFT JOIN "Branches" b ON o."BRANCH_ID" = b."BRANCH_ID"
-    ORDER BY o."DATE_";
-    """
-    df = run_query(query)
-    df["date"] = pd.to_datetime(df["date"])
-    return df
-
-
-# 1. CACHE DE MODELOS (sin SARIMA en disco)
-@st.cache_resource
-def load_models():
-    models = {}
-
-    # Random Forest
-    with open("modelos/random_forest_sales.pkl", "rb") as f:
-        models["RF"] = pickle.load(f)
-
-    # XGBoost
-    with open("modelos/xgboost_sales_model.pkl", "rb") as f:
-        models["XGB"] = pickle.load(f)
-
-    # LSTM
-    models["LSTM_MODEL"] = load_model("modelos/lstm_sales_model.h5", compile=False)
-    with open("modelos/lstm_scaler.pkl", "rb") as f:
-        models["LSTM_SCALER"] = pickle.load(f)
-
-    # LSTM estilo PDF
-    models["LSTM_PDF"] = load_model("modelos/lstm_pdf_model.h5", compile=False)
-    with open("modelos/lstm_pdf_scaler.pkl", "rb") as f:
-        models["LSTM_PDF_SCALER"] = pickle.load(f)
-
-    return models
-
-
-# 2. FUNCIÓN SARIMA DINÁMICO
-def predict_sarima(ts, horizonte):
-    model = SARIMAX(
-        ts,
-        order=(2, 1, 2),
-        seasonal_order=(1, 1, 1, 7),
-        enforce_stationarity=False,
-        enforce_invertibility=False,
-    )
-    res = model.fit(disp=False)
-    pred = res.forecast(horizonte)
-
-    # Clipping para evitar valores locos
-    max_hist = ts.max()
-    pred = pred.clip(lower=0, upper=max_hist * 3)
-
-    return pred.values
-
-
-# 3. PREDICCIÓN UNIFICADA PARA TODOS LOS MODELOS
-def predict(modelo_sel, ts, horizonte, _models):
-    modelo_sel = modelo_sel.upper()
-
-    # ===== SARIMA DINÁMICO =====
-    if modelo_sel == "SARIMA":
-        return predict_sarima(ts, horizonte)
-
-    # ===== RANDOM FOREST / XGBOOST =====
-    if modelo_sel in ["RANDOM FOREST", "XGBOOST"]:
-        model = _models["RF"] if modelo_sel == "RANDOM FOREST" else _models["XGB"]
-
-        future_dates = pd.date_range(
-            start=ts.index.max(), periods=horizonte + 1, freq="D"
-        )[1:]
-        df_future = pd.DataFrame({"date": future_dates})
-
-        df_future["day"] = df_future.date.dt.day
-        df_future["month"] = df_future.date.dt.month
-        df_future["dow"] = df_future.date.dt.dayofweek
-
-        df_future["day_sin"] = np.sin(2 * np.pi * df_future["day"] / 31)
-        df_future["day_cos"] = np.cos(2 * np.pi * df_future["day"] / 31)
-        df_future["month_sin"] = np.sin(2 * np.pi * df_future["month"] / 12)
-        df_future["month_cos"] = np.cos(2 * np.pi * df_future["month"] / 12)
-        df_future["dow_sin"] = np.sin(2 * np.pi * df_future["dow"] / 7)
-        df_future["dow_cos"] = np.cos(2 * np.pi * df_future["dow"] / 7)
-
-        X = df_future[
-            ["day_sin", "day_cos", "month_sin", "month_cos", "dow_sin", "dow_cos"]
-        ]
-        return model.predict(X)
-
-    # ===== LSTM =====
-    if modelo_sel == "LSTM":
-        lstm = _models["LSTM_MODEL"]
-        scaler = _models["LSTM_SCALER"]
-
-        last_window = ts.values[-14:]
-        seq = scaler.transform(last_window.reshape(-1, 1))
-        preds = []
-
-        for _ in range(horizonte):
-            p = lstm.predict(seq.reshape(1, 14, 1), verbose=0)
-            preds.append(p[0][0])
-            seq = np.vstack([seq[1:], p])
-
-        return scaler.inverse_transform(
-            np.array(preds).reshape(-1, 1)
-        ).flatten()
-
-    # ===== LSTM PDF =====
-    if modelo_sel == "LSTM_PDF":
-        lstm = _models["LSTM_PDF"]
-        scaler = _models["LSTM_PDF_SCALER"]
-
-        time_steps = 50
-        last_seq = ts.values[-time_steps:].reshape(-1, 1)
-        last_scaled = scaler.transform(last_seq).reshape(-1)
-
-        seq = last_scaled.copy()
-        preds = []
-
-        for _ in range(horizonte):
-            x = seq[-time_steps:].reshape(1, time_steps, 1)
-            p = lstm.predict(x, verbose=0)[0][0]
-            preds.append(p)
-            seq = np.append(seq, p)
-
-        preds = scaler.inverse_transform(
-            np.array(preds).reshape(-1, 1)
-        ).flatten()
-        return preds
-
-
-# 4. CACHE DE PREDICCIÓN
-@st.cache_data
-def cached_prediction(modelo_sel, horizonte, region, ciudad, ts, _models):
-    return predict(modelo_sel, ts, horizonte, _models)
-
-
-# 5. UI DEL TAB 3
+# 0. SERIES DE VENTAS
+# Las series diarias (total, región, región/ciudad) salen del almacén
+# compartido utils.series_store, construido una vez por versión de datos.
+
+# 1. PREDICCIONES
+# Modelos, claves de caché y cálculo viven en utils.predictions. Todas las
+# combinaciones se precalculan tras cada refresco de datos
+# (scripts/precompute_forecasts) y se leen del almacén persistente; lo que
+# falte se calcula al vuelo: los SARIMA en el pool de procesos de
+# utils.jobs, sin bloquear la app.
+
+# 2. ESPERA DE LOS AJUSTES EN SEGUNDO PLANO
+@st.fragment(run_every=1.0)
+def esperar_prediccion(key, modelo_sel):
+    """Aviso que se refresca solo; cuando el ajuste termina, relanza la página."""
+    job = forecast_jobs.poll(key)
+    if job is None or job["state"] not in PENDING_STATES:
+        st.rerun()
+    estado = "En cola" if job["state"] == "queued" else "Ajustando"
+    st.info(f"{estado} el modelo {modelo_sel}… ({job['elapsed_s']:.0f} s)")
+
+
+# 3. UI DEL TAB 3
 with tab3:
     st.subheader("Predicción de Ventas Futuras")
 
-    df_all = load_all_sales()
-    models = load_models()
+    version = data_version()
+    store = sales_store(version)
 
     # Filtros
-    regiones = ["Todas"] + sorted(df_all["REGION"].dropna().unique().tolist())
+    regiones = ["Todas"] + store.members("REGION")
     ciudades = ["Todas"]
 
     col1, col2, col3 = st.columns(3)
@@ -485,12 +337,7 @@ with tab3:
         region_sel = st.selectbox("Región:", regiones, index=0)
 
     if region_sel != "Todas":
-        ciudades += sorted(
-            df_all[df_all["REGION"] == region_sel]["CITY"]
-            .dropna()
-            .unique()
-            .tolist()
-        )
+        ciudades += store.members("CITY", REGION=region_sel)
 
     with col2:
         ciudad_sel = st.selectbox("Ciudad:", ciudades, index=0)
@@ -502,44 +349,74 @@ with tab3:
         )
 
     horizonte = st.radio(
-        "Horizonte de predicción (días):", [30, 90], horizontal=True
+        "Horizonte de predicción (días):", HORIZONTES, horizontal=True
     )
 
-    # Filtrado de datos
-    df = df_all.copy()
+    # Serie de la selección (ya construida)
+    filtros = {}
     if region_sel != "Todas":
-        df = df[df["REGION"] == region_sel]
+        filtros["REGION"] = region_sel
     if ciudad_sel != "Todas":
-        df = df[df["CITY"] == ciudad_sel]
-
-    df = df.groupby("date")["daily_sales"].sum().reset_index()
-    df = df.sort_values("date")
-    ts = df.set_index("date")["daily_sales"]
+        filtros["CITY"] = ciudad_sel
+    ts = store.series(**filtros)
 
     if ts.empty:
         st.warning("No hay datos disponibles para estos filtros.")
         st.stop()
 
-    # Predicción cacheada
-    pred = cached_prediction(
-        modelo_sel, horizonte, region_sel, ciudad_sel, ts, models
-    )
-
-    # Mostrar solo datos recientes desde 2023
-    fecha_corte = pd.to_datetime("2023-01-01")
-    ts_reciente = ts[ts.index >= fecha_corte]
+    # Predicción cacheada (el modelo se carga aquí si aún no lo estaba)
+    try:
+        pred = cached_prediction(
+            modelo_sel, horizonte, region_sel, ciudad_sel, version, ts
+        )
+    except ModelLoadError as e:
+        st.error(f"El modelo {modelo_sel} no está disponible: {e}")
+        st.stop()
+    except JobError as e:
+        st.error(f"Error ajustando {modelo_sel}: {e}")
+        st.stop()
 
-    df_real = ts_reciente.reset_index().rename(columns={"daily_sales": "value"})
-    df_real["tipo"] = "Real"
+    if pred is None:
+        esperar_prediccion(
+            prediction_key(modelo_sel, horizonte, region_sel, ciudad_sel, version),
+            modelo_sel,
+        )
+        st.stop()
 
     future_dates = pd.date_range(
         start=ts.index.max(), periods=horizonte + 1, freq="D"
     )[1:]
+
+    # Rango visible: por defecto desde 2023; acotarlo es el "zoom" con
+    # resolución completa (la serie se reduce en el servidor, utils.chart_data)
+    fecha_min = ts.index.min().date()
+    fecha_max = future_dates[-1].date()
+    desde, hasta = st.slider(
+        "Rango de fechas:",
+        min_value=fecha_min,
+        max_value=fecha_max,
+        value=(max(fecha_min, pd.Timestamp("2023-01-01").date()), fecha_max),
+        format="DD/MM/YYYY",
+    )
+
+    df_real = ts.loc[pd.Timestamp(desde):pd.Timestamp(hasta)].reset_index()
+    df_real = df_real.rename(columns={"daily_sales": "value"})
+    df_real["tipo"] = "Real"
+
     df_pred = pd.DataFrame(
         {"date": future_dates, "value": pred, "tipo": "Predicción"}
     )
+    df_pred = df_pred[df_pred["date"].between(pd.Timestamp(desde), pd.Timestamp(hasta))]
 
-    df_full = pd.concat([df_real, df_pred])
+    # El último día real (unión con la predicción) se conserva siempre
+    df_full, total = chart_frame(
+        pd.concat([df_real, df_pred]), "date", "value", "tipo", keep=[ts.index.max()]
+    )
+    if len(df_full) < total:
+        st.caption(
+            f"Mostrando {len(df_full)} de {total} puntos; "
+            "acota el rango de fechas para verlos todos."
+        )
 
     fig = px.line(
         df_full,
@@ -3,6 +3,8 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 from utils.db import run_query, run_cached_query
+from utils.figures import cached_figure
+from utils.mviews import sync_caches
 import os
 
 
@@ -29,6 +31,9 @@ if os.path.exists(logo_path):
 
 st.title("Panel de Expansión - Oportunidades de Crecimiento")
 
+# Si otro proceso ha refrescado los agregados, descartar lo cacheado
+sync_caches()
+
 
 # ==========================================================
 # TABS PRINCIPALES
@@ -50,6 +55,7 @@ with tab1:
     # ------------------------------------------------------
 
     if nivel == "Región":
+        nombre_gasto = "expansion_gasto_region"
         query_gasto = """
         SELECT 
             b."REGION" AS nivel,
@@ -65,6 +71,7 @@ with tab1:
         """
 
     elif nivel == "Ciudad":
+        nombre_gasto = "expansion_gasto_ciudad"
         query_gasto = """
         SELECT 
             b."CITY" AS nivel,
@@ -80,6 +87,7 @@ with tab1:
         """
 
     else:  # Pueblo
+        nombre_gasto = "expansion_gasto_pueblo"
         query_gasto = """
         SELECT 
             COALESCE(b."TOWN", c."TOWN") AS nivel,
@@ -113,8 +121,12 @@ with tab1:
     # EJECUCIÓN (pesadas → cache)
     # ------------------------------------------------------
     try:
-        df_gasto = run_cached_query(query_gasto)
-        df_pueblos = run_cached_query(query_pueblos_sin_tiendas)
+        df_gasto = run_cached_query(query_gasto, name=nombre_gasto, persist=True)
+        df_pueblos = run_cached_query(
+            query_pueblos_sin_tiendas,
+            name="expansion_pueblos_sin_tiendas",
+            persist=True,
+        )
     except Exception as e:
         st.error(f"Error al ejecutar las consultas: {e}")
         st.stop()
@@ -128,7 +140,8 @@ with tab1:
         col1, col2 = st.columns(2)
 
         with col1:
-            fig1 = px.bar(
+            fig1 = cached_figure(
+                px.bar,
                 df_gasto.head(10),
                 x="nivel",
                 y="ventas_por_tienda",
@@ -138,7 +151,8 @@ with tab1:
             st.plotly_chart(fig1, use_container_width=True)
 
         with col2:
-            fig2 = px.bar(
+            fig2 = cached_figure(
+                px.bar,
                 df_gasto.head(10),
                 x="nivel",
                 y="clientes_por_tienda",
@@ -168,11 +182,14 @@ with tab2:
     st.subheader("Recomendador de nuevas ubicaciones")
 
     # ⇢ Consulta ligera → NO cacheada
-    regiones = run_query('SELECT DISTINCT "REGION" FROM "Branches" ORDER BY "REGION";')["REGION"].tolist()
+    regiones = run_query(
+        'SELECT DISTINCT "REGION" FROM "Branches" ORDER BY "REGION";',
+        name="expansion_regiones",
+    )["REGION"].tolist()
     region_sel = st.selectbox("Selecciona una región", regiones)
 
     # ⇢ Consulta pesada → cacheada
-    query_ciudades = f"""
+    query_ciudades = """
     SELECT 
         c."CITY",
         COUNT(DISTINCT c."USERID") AS num_clientes,
@@ -181,11 +198,13 @@ with tab2:
     FROM "Customers" c
     LEFT JOIN "Orders" o ON c."USERID" = o."USERID"
     LEFT JOIN "Branches" b ON c."CITY" = b."CITY"
-    WHERE c."REGION" = '{region_sel}'
+    WHERE c."REGION" = :region
     GROUP BY c."CITY";
     """
 
-    df = run_cached_query(query_ciudades)
+    df = run_cached_query(
+        query_ciudades, {"region": region_sel}, name="expansion_ciudades", persist=True
+    )
 
     if df.empty:
         st.warning("No hay datos suficientes para esta región.")
@@ -236,7 +255,8 @@ with tab2:
         use_container_width=True
     )
 
-    fig = px.bar(
+    fig = cached_figure(
+        px.bar,
         top5,
         x="CITY",
         y="score",
@@ -1,8 +1,12 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from utils.db import run_query
-from statsmodels.tsa.statespace.sarimax import SARIMAX
+from utils.chart_data import chart_frame
+from utils.mviews import data_version
+from utils.series_store import rrhh_store
+from utils.forecast import sarima_prediction
+from utils.jobs import JobError, PENDING_STATES, forecast_jobs
+from utils.sarima import SARIMA_SPEC
 import warnings
 
 
@@ -33,27 +37,18 @@ def normalizar_empleados(x):
 # ============================================
 # 1. CARGA DE DATOS
 # ============================================
-@st.cache_data
-def load_data():
-    q = """
-    SELECT "TOWN", date, daily_sales
-    FROM vw_sales_rrhh
-    ORDER BY date;
-    """
-    df = run_query(q)
-    df["date"] = pd.to_datetime(df["date"])
-    return df
-
-df_all = load_data()
+# Series diarias por pueblo de vw_sales_rrhh en un almacén compartido
+# (utils.series_store): se construye una vez por versión de datos y lo
+# comparten todas las sesiones.
+version = data_version()
+store = rrhh_store(version)
 
 # ============================================
 # 2. CLASIFICACIÓN DE TIENDAS POR CUARTILES
 # ============================================
 sales_by_town = (
-    df_all.groupby("TOWN")["daily_sales"]
-    .sum()
+    store.totals("TOWN")
     .reset_index()
-    .rename(columns={"daily_sales": "total_sales"})
     .sort_values("total_sales")
 )
 
@@ -100,24 +95,19 @@ st.info(
 # ============================================
 # 4. DATOS DIARIOS DE ESA TIENDA (HISTÓRICO COMPLETO)
 # ============================================
-df_store_daily = (
-    df_all[df_all["TOWN"] == tienda_sel]
-    .groupby("date", as_index=False)["daily_sales"]
-    .sum()
-    .sort_values("date")
-)
+ts_store = store.series(TOWN=tienda_sel)
 
-if df_store_daily.empty:
+if ts_store.empty:
     st.error("No hay datos para esta tienda.")
     st.stop()
 
 # ============================================
 # 5. FILTRAR SOLO ÚLTIMOS 30 DÍAS PARA MODELO Y GRÁFICA
 # ============================================
-fecha_max = df_store_daily["date"].max()
+fecha_max = ts_store.index[-1]
 fecha_min_30 = fecha_max - pd.Timedelta(days=30)
 
-df_30 = df_store_daily[df_store_daily["date"] >= fecha_min_30].copy()
+df_30 = store.between(fecha_min_30, TOWN=tienda_sel).reset_index()
 
 if df_30.empty:
     st.error("No hay datos en los últimos 30 días para esta tienda.")
@@ -138,24 +128,36 @@ if len(ts) < 10:
     st.error("No hay suficientes datos en los últimos 30 días para entrenar SARIMA.")
     st.stop()
 
+# El primer ajuste de cada tienda se hace en el pool de procesos (utils.jobs);
+# con datos nuevos solo se avanza ese ajuste (utils.sarima). La predicción se
+# guarda en la caché: ni bloquea la app ni se repite en cada interacción.
+steps = 7
+clave_pred = ("RRHH_SARIMA", SARIMA_SPEC, steps, tienda_sel, version)
+
+
+@st.fragment(run_every=1.0)
+def esperar_prediccion(key):
+    """Aviso que se refresca solo; cuando el ajuste termina, relanza la página."""
+    job = forecast_jobs.poll(key)
+    if job is None or job["state"] not in PENDING_STATES:
+        st.rerun()
+    st.info(f"Entrenando SARIMA para {tienda_sel}… ({job['elapsed_s']:.0f} s)")
+
+
 try:
-    model = SARIMAX(
-        ts,
-        order=(2, 1, 2),
-        seasonal_order=(1, 1, 1, 7),
-        enforce_stationarity=True,       # forzamos más estabilidad
-        enforce_invertibility=True,
-    )
-    res = model.fit(disp=False)
-except Exception as e:
+    # enforce=True: forzamos más estabilidad con solo 30 días
+    pred_vals = sarima_prediction(clave_pred, ("rrhh", tienda_sel), ts, steps, True)
+except JobError as e:
     st.error(f"Error entrenando SARIMA: {e}")
     st.stop()
 
+if pred_vals is None:
+    esperar_prediccion(clave_pred)
+    st.stop()
+
 # ============================================
 # 7. PREDICCIÓN 7 DÍAS (LIMPIA)
 # ============================================
-steps = 7
-pred_vals = res.forecast(steps)
 
 future_dates = pd.date_range(
     start=ts.index.max(),
@@ -165,15 +167,12 @@ future_dates = pd.date_range(
 
 df_pred = pd.DataFrame({
     "date": future_dates,
-    "daily_sales": pred_vals.values
+    "daily_sales": pred_vals
 })
 
-# ---- LIMPIAR PREDICCIONES RARAS ----
-max_hist = df_30["daily_sales"].max()
-
-# - No permitir ventas negativas
-# - No permitir predicciones > 3x el máximo histórico reciente
-df_pred["daily_sales"] = df_pred["daily_sales"].clip(lower=0, upper=max_hist * 3)
+# ---- PREDICCIONES RARAS ----
+# sarima_forecast ya las recorta: ni ventas negativas ni más de 3x el
+# máximo histórico reciente.
 
 df_pred["empleados_pred"] = (
     df_pred["daily_sales"] / 5000
@@ -200,6 +199,9 @@ legend_map = {
 }
 df_melt["label"] = df_melt["tipo"].map(legend_map)
 
+# Si la ventana crece, se reduce en el servidor (utils.chart_data)
+df_melt, _ = chart_frame(df_melt, "date", "empleados", "label", keep=[ts.index.max()])
+
 # ============================================
 # 9. GRÁFICA ÚNICA
 # ============================================
@@ -243,9 +245,9 @@ fecha_sel = pd.to_datetime(fecha_sel)
 ventas_dia = None
 es_prediccion = False
 
-fila_hist = df_store_daily[df_store_daily["date"] == fecha_sel]
+fila_hist = store.between(fecha_sel, fecha_sel, TOWN=tienda_sel)
 if not fila_hist.empty:
-    ventas_dia = fila_hist["daily_sales"].iloc[0]
+    ventas_dia = fila_hist.iloc[0]
 else:
     fila_pred = df_pred[df_pred["date"] == fecha_sel]
     if not fila_pred.empty:
@@ -285,15 +287,7 @@ st.write(f"**Beneficio (modelo):** {beneficio_modelo:,.2f} €")
 # ============================================
 # 13. ÚLTIMOS 5 DÍAS (MISMO DÍA DE LA SEMANA)
 # ============================================
-weekday_sel = fecha_sel.weekday()
-
-df_week = df_store_daily.copy()
-df_week["weekday"] = df_week["date"].dt.weekday
-
-historico = df_week[
-    (df_week["weekday"] == weekday_sel) &
-    (df_week["date"] < fecha_sel)
-].tail(5)
+historico = store.same_weekday(fecha_sel, 5, TOWN=tienda_sel).reset_index()
 
 st.subheader("📚 Últimos 5 días del mismo día de la semana")
 
@@ -0,0 +1,84 @@
+"""
+Backtesting con origen móvil de los modelos de predicción: error (MAE,
+MAPE) y coste (ajuste, predicción, pico de memoria) por modelo y horizonte.
+
+Uso:
+    python -m scripts.backtest_forecasts                      # total y regiones
+    python -m scripts.backtest_forecasts --level ciudad --origins 6 --step 15
+    python -m scripts.backtest_forecasts --model SARIMA --model LSTM --workers 8
+    python -m scripts.backtest_forecasts --out hoy.csv --baseline ayer.csv
+"""
+import argparse
+import logging
+import os
+import sys
+
+import pandas as pd
+
+from utils.backtest import BACKTEST_ORIGINS, BACKTEST_STEP_DAYS, regressions, run_backtest
+from utils.mviews import data_version
+from utils.predictions import HORIZONTES, MODELOS, selecciones
+from utils.series_store import sales_store
+
+# Qué selecciones (región, ciudad) entran según el nivel pedido
+LEVELS = {
+    "total": lambda region, ciudad: region == "Todas",
+    "region": lambda region, ciudad: ciudad == "Todas",
+    "ciudad": lambda region, ciudad: True,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model", action="append", choices=MODELOS, help="solo este modelo (repetible)")
+    parser.add_argument("--horizon", action="append", type=int, help="solo este horizonte (repetible)")
+    parser.add_argument("--level", choices=list(LEVELS), default="region",
+                        help="series evaluadas: total, + regiones o + ciudades")
+    parser.add_argument("--origins", type=int, default=BACKTEST_ORIGINS, help="orígenes por serie")
+    parser.add_argument("--step", type=int, default=BACKTEST_STEP_DAYS, help="días entre orígenes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="procesos (por defecto, todos los núcleos)")
+    parser.add_argument("--timeout", type=float, default=1800, help="segundos máximos por serie y modelo")
+    parser.add_argument("--out", help="guarda el resumen en este CSV")
+    parser.add_argument("--detail", help="guarda una fila por predicción en este CSV")
+    parser.add_argument("--baseline", help="CSV de un resumen anterior: sale con error si algo empeora")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    version = data_version(max_age_s=0)
+    store = sales_store(version)
+    series = {
+        f"{region} / {ciudad}": store.series(**filtros)
+        for region, ciudad, filtros in selecciones(store)
+        if LEVELS[args.level](region, ciudad)
+    }
+
+    detalle, resumen = run_backtest(
+        series,
+        args.model or MODELOS,
+        args.horizon or HORIZONTES,
+        args.origins,
+        args.step,
+        args.workers,
+        args.timeout,
+    )
+
+    print(f"Versión de datos {version}: {len(series)} series, {len(detalle)} predicciones")
+    print(resumen.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+
+    if args.out:
+        resumen.to_csv(args.out, index=False)
+    if args.detail:
+        detalle.to_csv(args.detail, index=False)
+
+    if args.baseline:
+        peores = regressions(resumen, pd.read_csv(args.baseline))
+        if not peores.empty:
+            print("\nEmpeoran frente a la referencia:")
+            print(peores.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
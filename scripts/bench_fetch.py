@@ -0,0 +1,95 @@
+"""
+Benchmark de los motores de lectura de utils.db ("read_sql" frente a "copy").
+
+Cada medición se ejecuta en un proceso nuevo para que el pico de memoria
+(ru_maxrss) de una no contamine la siguiente.
+
+Uso:
+    python -m scripts.bench_fetch
+    python -m scripts.bench_fetch --repeat 5 --query 'SELECT * FROM "Orders"'
+"""
+import argparse
+import multiprocessing as mp
+import resource
+import time
+
+
+# ==========================================================
+# CONSULTAS PESADAS DE LAS PÁGINAS
+# ==========================================================
+DEFAULT_QUERIES = {
+    "load_all_sales": """
+    SELECT 
+        o."DATE_" AS date,
+        o."TOTALBASKET" AS daily_sales,
+        b."REGION",
+        b."CITY"
+    FROM "Orders" o
+    LEFT JOIN "Branches" b ON o."BRANCH_ID" = b."BRANCH_ID"
+    ORDER BY o."DATE_";
+    """,
+    "load_data_rrhh": """
+    SELECT "TOWN", date, daily_sales
+    FROM vw_sales_rrhh
+    ORDER BY date;
+    """,
+}
+
+
+# ==========================================================
+# MEDICIÓN EN UN PROCESO HIJO
+# ==========================================================
+def _measure(query, fetch, queue):
+    from utils.db import run_query
+
+    base_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    df = run_query(query, fetch=fetch)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    queue.put({
+        "rows": len(df),
+        "seconds": elapsed,
+        "peak_mb": (peak_kb - base_kb) / 1024,
+        "frame_mb": df.memory_usage(deep=True).sum() / 1024 ** 2,
+    })
+
+
+def measure(query, fetch):
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_measure, args=(query, fetch, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+# ==========================================================
+# MAIN
+# ==========================================================
+def main():
+    from utils.db import FETCH_ENGINES
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--query", help="SQL propio en lugar de las consultas por defecto")
+    args = parser.parse_args()
+
+    queries = {"custom": args.query} if args.query else DEFAULT_QUERIES
+
+    print(f"{'consulta':<16}{'motor':<10}{'filas':>10}{'seg (min)':>12}{'pico MB':>10}{'df MB':>8}")
+    for label, query in queries.items():
+        for fetch in FETCH_ENGINES:
+            runs = [measure(query, fetch) for _ in range(args.repeat)]
+            best = min(runs, key=lambda r: r["seconds"])
+            peak = max(r["peak_mb"] for r in runs)
+            print(
+                f"{label:<16}{fetch:<10}{best['rows']:>10}"
+                f"{best['seconds']:>12.3f}{peak:>10.1f}{best['frame_mb']:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
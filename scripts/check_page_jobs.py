@@ -0,0 +1,79 @@
+"""
+Comprobación de extremo a extremo de los trabajos en segundo plano lanzados
+desde las páginas: ejecuta cada página con el AppTest de Streamlit (la
+página queda instalada como __main__, igual que en el servidor), espera a
+que sus trabajos terminen y exige que acaben en "done" y que la página,
+al volver a ejecutarse, muestre la gráfica sin errores. Después abre
+Administración con esos trabajos en memoria.
+
+Uso:
+    python -m scripts.check_page_jobs
+    python -m scripts.check_page_jobs --page rrhh --timeout 600
+"""
+import argparse
+import os
+import sys
+
+from streamlit.testing.v1 import AppTest
+
+from utils.jobs import forecast_jobs
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pages")
+
+# Páginas que lanzan ajustes SARIMA en el pool (rol con acceso a todas)
+JOB_PAGES = ["rrhh", "direccion"]
+
+
+def run_page(page: str, timeout: float) -> AppTest:
+    at = AppTest.from_file(os.path.join(PAGES_DIR, f"{page}.py"), default_timeout=timeout)
+    at.session_state["logged_in"] = True
+    at.session_state["role"] = "admin"
+    return at.run()
+
+
+def page_problems(at: AppTest) -> list:
+    return [str(e.value) for e in at.exception] + [e.value for e in at.error]
+
+
+def check(page: str, timeout: float) -> list:
+    """Lista de fallos de una página (vacía si todo va bien)."""
+    at = run_page(page, timeout)
+    problems = page_problems(at)
+
+    jobs = forecast_jobs.wait_idle(timeout)
+    if jobs:
+        print(f"{page}: {len(jobs)} trabajo(s) " + ", ".join(j["state"] for j in jobs))
+    else:
+        print(f"{page}: sin trabajos (predicción ya precalculada o en caché)")
+    problems += [f"trabajo {j['key']}: {j['state']} {j['error'] or ''}"
+                 for j in jobs if j["state"] != "done"]
+
+    # Con los trabajos terminados la página ya debe dibujar la predicción
+    at.run()
+    problems += page_problems(at)
+    if not at.get("plotly_chart"):
+        problems.append("la página no muestra ninguna gráfica")
+    return [f"{page}: {p}" for p in problems]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--page", action="append", choices=JOB_PAGES, help="solo esta página (repetible)")
+    parser.add_argument("--timeout", type=float, default=300, help="segundos máximos por página")
+    args = parser.parse_args()
+
+    problems = []
+    for page in args.page or JOB_PAGES:
+        problems += check(page, args.timeout)
+
+    # La tabla de trabajos de Administración con claves reales
+    problems += [f"administracion: {p}" for p in page_problems(run_page("administracion", args.timeout))]
+
+    if problems:
+        print("\n".join(problems))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Exporta los LSTM (.h5 + escalador .pkl) al formato .npz del runtime NumPy.
+
+Uso:
+    python -m scripts.export_lstm                      # los dos modelos de modelos/
+    python -m scripts.export_lstm --model modelos/lstm_sales_model.h5 --scaler modelos/lstm_scaler.pkl
+"""
+import argparse
+import os
+
+from utils.lstm import export_lstm
+
+
+DEFAULT_MODELS = [
+    ("modelos/lstm_sales_model.h5", "modelos/lstm_scaler.pkl"),
+    ("modelos/lstm_pdf_model.h5", "modelos/lstm_pdf_scaler.pkl"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model", help="ruta del .h5")
+    parser.add_argument("--scaler", help="ruta del escalador .pkl")
+    parser.add_argument("--out", help="ruta del .npz (por defecto junto al .h5)")
+    args = parser.parse_args()
+
+    if bool(args.model) != bool(args.scaler):
+        parser.error("--model y --scaler van juntos")
+
+    pairs = [(args.model, args.scaler)] if args.model else DEFAULT_MODELS
+    for h5_path, scaler_path in pairs:
+        out = export_lstm(h5_path, scaler_path, args.out)
+        print(f"{h5_path} -> {out} ({os.path.getsize(out) / 1024 / 1024:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Genera la base offline (DuckDB) con datos sintéticos para perfilar la app
+sin conexión a Postgres.
+
+Uso:
+    python -m scripts.generate_offline_db --orders 20000000
+    DB_BACKEND=duckdb streamlit run app.py
+"""
+import argparse
+import time
+
+from utils.offline import DEFAULT_PATH, generate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--path", default=DEFAULT_PATH)
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--branches", type=int, default=150)
+    parser.add_argument("--customers", type=int, default=None)
+    parser.add_argument("--items", type=int, default=2_000)
+    parser.add_argument("--start", default="2021-01-01")
+    parser.add_argument("--days", type=int, default=3 * 365)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--admin-password", default="admin")
+    args = parser.parse_args()
+
+    print(f"Generando {args.orders:,} pedidos en {args.path} (semilla {args.seed})")
+    start = time.perf_counter()
+    generate(
+        path=args.path,
+        orders=args.orders,
+        branches=args.branches,
+        customers=args.customers,
+        items=args.items,
+        start=args.start,
+        days=args.days,
+        seed=args.seed,
+        admin_password=args.admin_password,
+    )
+    print(f"Hecho en {time.perf_counter() - start:.1f} s. Usuario: admin@admin3a.com")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Precalcula todas las predicciones del tab 3 de Dirección (modelos x
+horizontes x región/ciudad) y las guarda en el almacén persistente.
+
+Uso:
+    python -m scripts.precompute_forecasts --install      # crear la tabla
+    python -m scripts.precompute_forecasts                # una pasada (versión actual)
+    python -m scripts.precompute_forecasts --every 300    # tras cada refresco de datos
+    python -m scripts.precompute_forecasts --workers 8 --model SARIMA
+"""
+import argparse
+import logging
+import os
+
+from utils import forecast_store
+from utils.jobs import FORECAST_JOB_KEEP_S, FORECAST_JOB_TIMEOUT_S, JobScheduler
+from utils.mviews import data_version
+from utils.predictions import HORIZONTES, MODELOS, precompute_grid, run_watcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--install", action="store_true", help="crea la tabla si falta")
+    parser.add_argument("--every", type=float, help="segundos entre comprobaciones de la versión")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="procesos para los SARIMA (por defecto, todos los núcleos)")
+    parser.add_argument("--model", action="append", choices=MODELOS, help="solo este modelo (repetible)")
+    parser.add_argument("--timeout", type=float, default=FORECAST_JOB_TIMEOUT_S,
+                        help="segundos máximos por ajuste SARIMA")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    if args.install:
+        forecast_store.install()
+
+    scheduler = JobScheduler(args.workers, args.timeout, FORECAST_JOB_KEEP_S)
+    if args.every:
+        run_watcher(args.every, scheduler, args.model or MODELOS)
+    else:
+        version = data_version(max_age_s=0)
+        resumen = precompute_grid(version, scheduler, args.model or MODELOS, HORIZONTES)
+        print(f"Versión de datos {version}: {resumen}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Instala y refresca los agregados mv_* (ver utils/mviews.py).
+
+Uso:
+    python -m scripts.refresh_mviews --install          # crear objetos
+    python -m scripts.refresh_mviews                    # refresco incremental
+    python -m scripts.refresh_mviews --full             # refresco completo
+    python -m scripts.refresh_mviews --every 900 --full-every 86400
+
+Migración en Postgres: --install no borra ni sustituye vistas existentes.
+Antes de instalar, renombre cada vista materializada mv_* de producción a
+<vista>_legacy (ALTER MATERIALIZED VIEW ... RENAME TO ...): su definición
+es la que se usa para construir el histórico y el año en curso.
+"""
+import argparse
+import logging
+
+from utils import mviews
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--install", action="store_true", help="crea los objetos si faltan")
+    parser.add_argument("--full", action="store_true", help="refresca también el histórico")
+    parser.add_argument("--view", action="append", help="solo este agregado (repetible)")
+    parser.add_argument("--every", type=float, help="segundos entre refrescos incrementales")
+    parser.add_argument("--full-every", type=float, help="segundos entre refrescos completos")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    if args.install:
+        mviews.install(args.view)
+
+    if args.every:
+        mviews.run_scheduler(args.every, args.full_every, args.view)
+    else:
+        result = mviews.refresh(args.view, mode="full" if args.full else "incremental")
+        print(result.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
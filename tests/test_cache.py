@@ -0,0 +1,165 @@
+import threading
+import time
+
+import pytest
+
+from utils import cache
+from utils.cache import BoundedCache, SingleFlight
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj controlado para los TTL de la caché."""
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+# ==========================================================
+# BoundedCache
+# ==========================================================
+def test_get_set_and_stats():
+    c = BoundedCache(max_bytes=100)
+    assert c.set("a", 1, size=10)
+    assert c.get("a") == 1
+    assert c.get("b", "x") == "x"
+    stats = c.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["bytes"]) == (1, 1, 1, 10)
+
+
+def test_evicts_least_recently_used():
+    c = BoundedCache(max_bytes=30)
+    for key in "abc":
+        c.set(key, key, size=10)
+    c.get("a")
+    c.set("d", "d", size=10)
+
+    assert c.get("b") is None
+    assert [c.get(k) for k in "acd"] == ["a", "c", "d"]
+    assert c.stats()["evictions"] == 1
+
+
+def test_rejects_values_over_budget():
+    c = BoundedCache(max_bytes=10)
+    assert not c.set("a", "x", size=11)
+    assert c.stats()["entries"] == 0
+
+
+def test_replacing_a_key_updates_bytes():
+    c = BoundedCache(max_bytes=100)
+    c.set("a", 1, size=40)
+    c.set("a", 2, size=10)
+    assert c.get("a") == 2
+    assert c.stats()["bytes"] == 10
+
+
+def test_entries_expire(clock):
+    c = BoundedCache(max_bytes=100, default_ttl=60)
+    c.set("a", 1, size=1)
+    c.set("b", 2, size=1, ttl=300)
+    clock[0] += 61
+
+    assert c.get("a") is None
+    assert c.get("b") == 2
+    assert c.items() == [("b", 2)]
+    assert c.stats()["expirations"] == 1
+
+
+def test_expired_entries_go_before_lru(clock):
+    c = BoundedCache(max_bytes=20)
+    c.set("old", 1, size=10)
+    c.set("short", 2, size=10, ttl=5)
+    clock[0] += 10
+    c.set("new", 3, size=10)
+
+    assert c.get("old") == 1
+    assert c.get("new") == 3
+    assert c.stats()["evictions"] == 0
+
+
+def test_invalidate_tags_is_case_insensitive():
+    c = BoundedCache(max_bytes=100)
+    c.set("a", 1, size=1, tags=["Orders"])
+    c.set("b", 2, size=1, tags=["orders", "branches"])
+    c.set("c", 3, size=1, tags=["categories"])
+
+    assert c.invalidate_tags("ORDERS") == 2
+    assert [c.get(k) for k in "abc"] == [None, None, 3]
+
+
+def test_query_tables():
+    query = 'SELECT * FROM "Orders" o JOIN public."Branches" b ON true'
+    assert cache.query_tables(query) == {"orders", "branches"}
+    assert cache.query_tables("REFRESH MATERIALIZED VIEW CONCURRENTLY mv_x") == {"mv_x"}
+
+
+# ==========================================================
+# SingleFlight
+# ==========================================================
+def _concurrent(n, target):
+    results = [None] * n
+    errors = [None] * n
+
+    def worker(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    return threads, results, errors
+
+
+def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return object()
+
+    threads, results, errors = _concurrent(5, lambda: flights.do("k", slow))
+    deadline = time.monotonic() + 5
+    while flights.stats()["shared"] < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert errors == [None] * 5
+    assert all(r is results[0] for r in results)
+    stats = flights.stats()
+    assert (stats["executions"], stats["shared"], stats["in_flight"]) == (1, 4, 0)
+
+
+def test_waiters_get_the_same_exception():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise ValueError("falla")
+
+    threads, _, errors = _concurrent(3, lambda: flights.do("k", failing))
+    deadline = time.monotonic() + 5
+    while flights.stats()["shared"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert all(isinstance(e, ValueError) for e in errors)
+    assert errors[0] is errors[1] is errors[2]
+    assert flights.stats()["errors"] == 1
+
+
+def test_sequential_calls_run_again():
+    flights = SingleFlight()
+    assert flights.do("k", lambda: 1) == 1
+    assert flights.do("k", lambda: 2) == 2
+    assert flights.stats()["executions"] == 2
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from utils.calendar_features import FEATURES, calendar_features, future_dates
+
+
+def pandas_features(dates) -> pd.DataFrame:
+    """Referencia: las variables tal como se calcularon al entrenar."""
+    dates = pd.DatetimeIndex(dates)
+    return pd.DataFrame({
+        "day_sin": np.sin(2 * np.pi * dates.day / 31),
+        "day_cos": np.cos(2 * np.pi * dates.day / 31),
+        "month_sin": np.sin(2 * np.pi * dates.month / 12),
+        "month_cos": np.cos(2 * np.pi * dates.month / 12),
+        "dow_sin": np.sin(2 * np.pi * dates.dayofweek / 7),
+        "dow_cos": np.cos(2 * np.pi * dates.dayofweek / 7),
+    })[FEATURES]
+
+
+def test_matches_pandas_over_leap_years():
+    dates = pd.date_range("1969-12-25", "2025-03-10", freq="D")
+    np.testing.assert_allclose(calendar_features(dates.values), pandas_features(dates).to_numpy(), atol=1e-12)
+
+
+def test_accepts_a_matrix_of_dates():
+    last = pd.to_datetime(["2024-02-27", "2023-12-30"])
+    dates = future_dates(last.values, 4)
+
+    assert dates.shape == (2, 4)
+    assert pd.Timestamp(dates[0, 2]) == pd.Timestamp("2024-03-01")
+    assert pd.Timestamp(dates[1, 1]) == pd.Timestamp("2024-01-01")
+    np.testing.assert_allclose(
+        calendar_features(dates), pandas_features(dates.ravel()).to_numpy(), atol=1e-12
+    )
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+from utils.chart_data import chart_frame, downsample, lttb
+
+
+def test_lttb_keeps_short_series():
+    assert lttb(np.arange(5), np.arange(5.0), 10).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_lttb_picks_n_out_sorted_points_with_both_ends():
+    x = np.arange(1000)
+    y = np.sin(x / 20.0)
+    out = lttb(x, y, 100)
+
+    assert len(out) == 100
+    assert out[0] == 0 and out[-1] == 999
+    assert np.all(np.diff(out) > 0)
+
+
+def test_lttb_keeps_isolated_spikes():
+    y = np.zeros(1000)
+    y[[137, 612]] = [50.0, -40.0]
+    out = lttb(np.arange(1000), y, 50)
+    assert {137, 612} <= set(out.tolist())
+
+
+def test_downsample_keeps_extremes_and_requested_dates():
+    dates = pd.date_range("2020-01-01", periods=3000, freq="D")
+    y = np.random.default_rng(0).normal(size=3000)
+    df = pd.DataFrame({"date": dates, "y": y})
+    out = downsample(df, "date", "y", max_points=200, keep=[dates[1234]])
+
+    assert len(out) <= 203
+    assert out["date"].is_monotonic_increasing
+    assert dates[1234] in set(out["date"])
+    assert out["y"].max() == y.max() and out["y"].min() == y.min()
+
+
+def test_chart_frame_reduces_each_trace():
+    dates = pd.date_range("2020-01-01", periods=2000, freq="D")
+    df = pd.concat([
+        pd.DataFrame({"date": dates, "y": np.arange(2000.0), "serie": name})
+        for name in ("a", "b")
+    ])
+    out, n = chart_frame(df, "date", "y", "serie", max_points=100)
+
+    assert n == 4000
+    assert out.groupby("serie").size().to_dict() == {"a": 100, "b": 100}
+
+
+def test_lttb_ignores_nans_and_keeps_one_per_gap():
+    y = np.sin(np.arange(1000) / 20.0)
+    y[300:350] = np.nan
+    y[990:] = np.nan
+    out = lttb(np.arange(1000), y, 100)
+
+    assert {300, 990} <= set(out.tolist())
+    assert np.isnan(y[out]).sum() == 2
+    assert np.isfinite(y[out]).sum() == 100
+    assert out[0] == 0 and 989 in out
+
+
+def test_downsample_keeps_gaps_in_the_trace():
+    dates = pd.date_range("2020-01-01", periods=3000, freq="D")
+    y = np.random.default_rng(0).normal(size=3000)
+    y[2500:] = np.nan
+    out = downsample(pd.DataFrame({"date": dates, "y": y}), "date", "y", max_points=200)
+
+    assert out["y"].isna().sum() == 1
+    assert out["y"].max() == np.nanmax(y) and out["y"].min() == np.nanmin(y)
+    all_nan = pd.DataFrame({"date": dates, "y": np.nan})
+    assert len(downsample(all_nan, "date", "y", max_points=200)) == 1
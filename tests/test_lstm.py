@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from utils.lstm import compile_rollout
+
+
+def eager_rollout(model, window, horizon):
+    """Bucle de referencia: una llamada a Keras por paso, ventana en NumPy."""
+    preds = []
+    for _ in range(horizon):
+        p = model(window[:, :, np.newaxis], training=False).numpy()[:, 0]
+        preds.append(p)
+        window = np.concatenate([window[:, 1:], p[:, np.newaxis]], axis=1)
+    return np.stack(preds, axis=1)
+
+
+@pytest.mark.parametrize("time_steps", [14, 50])
+def test_keras_rollout_equals_eager_loop(time_steps):
+    tf = pytest.importorskip("tensorflow")
+    tf.random.set_seed(0)
+    model = tf.keras.Sequential([
+        tf.keras.Input((time_steps, 1)),
+        tf.keras.layers.LSTM(8, return_sequences=True),
+        tf.keras.layers.LSTM(8),
+        tf.keras.layers.Dense(1),
+    ])
+    rollout = compile_rollout(model)
+    window = np.random.default_rng(0).random((5, time_steps), dtype=np.float32)
+
+    for horizon in (1, 7, 30):
+        got = rollout(window, horizon)
+        assert got.shape == (5, horizon)
+        np.testing.assert_allclose(got, eager_rollout(model, window, horizon), rtol=1e-5, atol=1e-6)
@@ -0,0 +1,107 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.sarima import (
+    SARIMA_DRIFT_MIN_OBS,
+    SARIMA_REFIT_MAX_AGE_S,
+    SARIMA_REFIT_MAX_NEW_OBS,
+    SarimaStates,
+    _clip,
+    _model,
+    refit_reason,
+    sarima_forecasts,
+    sarima_update,
+)
+
+HORIZONS = [7, 30]
+
+
+def daily_series(n: int, seed: int = 0) -> pd.Series:
+    """Ventas diarias sintéticas: tendencia, estacionalidad semanal y ruido."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(n)
+    values = 1000 + 2 * t + 150 * np.sin(2 * np.pi * t / 7) + rng.normal(0, 30, n)
+    return pd.Series(values, index=pd.date_range("2024-01-01", periods=n, freq="D"))
+
+
+@pytest.fixture(scope="module")
+def series():
+    return daily_series(200)
+
+
+@pytest.fixture(scope="module")
+def fitted(series):
+    """Ajuste completo con los primeros 180 días (solo una vez por módulo)."""
+    return sarima_forecasts(series.iloc[:180], HORIZONS)
+
+
+def test_update_equals_refilter(series, fitted):
+    ts = series.iloc[:190]
+    result = sarima_update(fitted["state"], ts, HORIZONS)
+
+    # Referencia: filtrar la serie entera con los mismos parámetros
+    horizon = max(HORIZONS)
+    endog = np.concatenate([ts.to_numpy(), np.full(horizon, np.nan)])
+    res = _model(endog, False).filter(fitted["state"]["params"])
+    expected = _clip(res.forecasts[0, len(ts):], ts)
+
+    for h in HORIZONS:
+        np.testing.assert_allclose(result["preds"][h], expected[:h], rtol=1e-6)
+    assert result["state"]["last_date"] == ts.index[-1]
+    assert result["state"]["new_obs"] == 10
+
+
+def test_no_refit_with_a_few_new_days(series, fitted):
+    assert refit_reason(fitted["state"], series.iloc[:190]) is None
+
+
+def test_changed_history_triggers_refit(series, fitted):
+    ts = series.iloc[:190].copy()
+    ts.iloc[175] += 1
+    assert refit_reason(fitted["state"], ts) == "historico"
+
+
+def test_missing_last_day_triggers_refit(series, fitted):
+    ts = series.iloc[:190].drop(series.index[179])
+    assert refit_reason(fitted["state"], ts) == "historico"
+
+
+def test_old_fit_triggers_scheduled_refit(series, fitted):
+    state = {**fitted["state"], "fitted_at": time.time() - SARIMA_REFIT_MAX_AGE_S - 1}
+    assert refit_reason(state, series.iloc[:190]) == "programado"
+
+
+def test_many_new_days_trigger_scheduled_refit(fitted):
+    ts = daily_series(180 + SARIMA_REFIT_MAX_NEW_OBS + 1)
+    assert refit_reason(fitted["state"], ts) == "programado"
+
+
+def test_other_spec_triggers_refit(series, fitted):
+    assert refit_reason(fitted["state"], series.iloc[:190], enforce=True) == "especificacion"
+    assert refit_reason(None, series) == "sin_ajuste"
+
+
+def test_drift_triggers_refit(series, fitted):
+    states = SarimaStates(max_entries=10)
+    states.put("serie", fitted["state"])
+
+    # Días nuevos muy lejos de lo que predice el ajuste
+    ts = series.iloc[:180 + SARIMA_DRIFT_MIN_OBS].copy()
+    ts.iloc[180:] *= 5
+    assert refit_reason(fitted["state"], ts) is None
+    assert states.forecast("serie", ts, HORIZONS) is None
+    assert states.stats()["refits"] == {"deriva": 1}
+
+
+def test_states_advance_without_drift(series, fitted):
+    states = SarimaStates(max_entries=10)
+    states.put("serie", fitted["state"])
+
+    result = states.forecast("serie", series.iloc[:190], HORIZONS)
+    assert result is not None and result["fit_s"] == 0.0
+    assert states.stats()["updates"] == 1
+    assert states.forecast("serie", series, HORIZONS) is not None
+    assert states.stats()["updates"] == 2
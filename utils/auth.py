@@ -53,8 +53,8 @@ def verify_password(password: str, hashed: str) -> bool:
 # ==========================================================
 
 def user_exists(email: str) -> bool:
-    query = f"SELECT email FROM Users WHERE email = '{email}'"
-    df = run_query(query)
+    query = "SELECT email FROM Users WHERE email = :email"
+    df = run_query(query, {"email": email}, name="auth_user_exists")
     return not df.empty
 
 
@@ -62,8 +62,8 @@ def get_user(email: str):
     """
     Devuelve fila del usuario o None si no existe.
     """
-    query = f"SELECT email, password_hash, role FROM Users WHERE email = '{email}'"
-    df = run_query(query)
+    query = "SELECT email, password_hash, role FROM Users WHERE email = :email"
+    df = run_query(query, {"email": email}, name="auth_get_user")
     if df.empty:
         return None
     return df.iloc[0].to_dict()
@@ -87,11 +87,14 @@ def create_user(email: str, password: str, role: str = None) -> bool:
     password_hash = hash_password(password)
 
     try:
-        query = f"""
+        query = """
         INSERT INTO Users (email, password_hash, role)
-        VALUES ('{email}', '{password_hash}', '{role}');
+        VALUES (:email, :password_hash, :role);
         """
-        execute_query(query)
+        execute_query(
+            query,
+            {"email": email, "password_hash": password_hash, "role": role},
+        )
         return True, "Usuario creado correctamente."
     except Exception as e:
         return False, f"Error al crear usuario: {e}"
@@ -0,0 +1,178 @@
+import resource
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.jobs import JobScheduler
+from utils.models import model_registry
+from utils.predictions import predict
+
+
+# ==========================================================
+# BACKTESTING CON ORIGEN MÓVIL
+# ==========================================================
+# Para cada modelo, horizonte y serie se simulan varias predicciones
+# pasadas: en cada origen se predice con el histórico hasta ese día (con
+# predict(), igual que en la app) y se compara con lo que pasó después.
+# Además del error (MAE, MAPE) se mide el coste: segundos de ajuste y de
+# predicción por origen y pico de memoria. Cada (modelo, serie, horizonte)
+# es un trabajo del pool de procesos de utils.jobs, en un proceso nuevo: así
+# su pico de memoria residente es solo suyo.
+BACKTEST_ORIGINS = 4
+BACKTEST_STEP_DAYS = 30
+
+# Histórico mínimo antes del primer origen (el LSTM_PDF necesita 50 días)
+MIN_TRAIN_DAYS = 60
+
+
+def rolling_origins(ts, horizon: int, n: int = BACKTEST_ORIGINS,
+                    step_days: int = BACKTEST_STEP_DAYS) -> list:
+    """
+    Los `n` últimos orígenes con `horizon` días reales por detrás, separados
+    `step_days` días (del más antiguo al más reciente).
+    """
+    if ts.empty:
+        return []
+    last = ts.index[-1] - pd.Timedelta(days=horizon)
+    first_allowed = ts.index[0] + pd.Timedelta(days=MIN_TRAIN_DAYS)
+    origins = [last - pd.Timedelta(days=step_days * i) for i in range(n)]
+    return sorted(o for o in origins if o >= first_allowed)
+
+
+def _evaluate(modelo_id, ts, horizon: int, origin) -> dict:
+    """Una predicción desde `origin` y sus errores frente a lo real."""
+    train = ts.loc[:origin]
+    timings = {}
+    start = time.perf_counter()
+    pred = np.asarray(predict(modelo_id, train, horizon, timings), dtype="float64")
+    elapsed = time.perf_counter() - start
+
+    # Se compara por fecha: los días sin ventas no cuentan
+    dates = pd.date_range(train.index[-1], periods=horizon + 1, freq="D")[1:]
+    actual = ts.reindex(dates).to_numpy(dtype="float64")
+    known = ~np.isnan(actual)
+    errors = np.abs(pred[known] - actual[known])
+    nonzero = actual[known] != 0
+
+    fit_s = timings.get("fit_s", 0.0)
+    return {
+        "origen": origin,
+        "dias": int(known.sum()),
+        "abs_err": float(errors.sum()),
+        "ape": float((errors[nonzero] / np.abs(actual[known][nonzero])).sum()),
+        "ape_dias": int(nonzero.sum()),
+        "fit_s": fit_s,
+        "predict_s": elapsed - fit_s,
+    }
+
+
+def peak_rss_mb() -> float:
+    """Pico de memoria residente de este proceso en MB (TensorFlow incluido)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB; macOS, en bytes
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def backtest_task(modelo_id, serie, ts, horizon: int, origins) -> list:
+    """
+    Se ejecuta en un proceso del pool. El modelo se carga antes de medir
+    los tiempos; el pico de memoria es el del proceso al terminar todas
+    las predicciones (carga del modelo incluida).
+    """
+    if modelo_id != "SARIMA":
+        model_registry.get(modelo_id)
+
+    rows = [
+        {"modelo": modelo_id, "serie": serie, "horizonte": horizon,
+         **_evaluate(modelo_id, ts, horizon, origin)}
+        for origin in origins
+    ]
+    peak = peak_rss_mb()
+    for row in rows:
+        row["pico_mb"] = peak
+    return rows
+
+
+def run_backtest(series: dict, modelos, horizontes, n_origins: int = BACKTEST_ORIGINS,
+                 step_days: int = BACKTEST_STEP_DAYS, workers: int = 1,
+                 timeout_s: float = 1800):
+    """
+    Backtesting de cada modelo x horizonte x serie ({nombre: serie diaria}).
+    Devuelve (detalle, resumen): una fila por predicción y otra por
+    modelo y horizonte (ver summarize).
+    """
+    scheduler = JobScheduler(workers, timeout_s, keep_s=timeout_s, max_tasks_per_child=1)
+    rows, errors = [], []
+    try:
+        tasks = []
+        for modelo_id in modelos:
+            for horizon in horizontes:
+                for serie, ts in series.items():
+                    origins = rolling_origins(ts, horizon, n_origins, step_days)
+                    if not origins:
+                        continue
+                    key = (modelo_id, serie, horizon)
+                    scheduler.submit(key, backtest_task, modelo_id, serie, ts, horizon, origins)
+                    tasks.append(key)
+
+        for key in tasks:
+            job = scheduler.wait(key)
+            if job["state"] == "done":
+                rows.extend(job["result"])
+            else:
+                errors.append({"modelo": key[0], "serie": key[1], "horizonte": key[2],
+                               "error": job["error"]})
+    finally:
+        scheduler.shutdown()
+
+    detalle = pd.DataFrame(rows)
+    return detalle, summarize(detalle, pd.DataFrame(errors))
+
+
+def summarize(detalle: pd.DataFrame, errores: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Por modelo y horizonte: MAE y MAPE (%) sobre todos los días evaluados,
+    media de segundos de ajuste y de predicción por origen, pico de memoria
+    (MB) y nº de predicciones y de trabajos fallidos.
+    """
+    columns = ["modelo", "horizonte", "mae", "mape", "fit_s", "predict_s",
+               "pico_mb", "predicciones", "fallos"]
+    if detalle.empty:
+        resumen = pd.DataFrame(columns=columns)
+    else:
+        g = detalle.groupby(["modelo", "horizonte"])
+        resumen = pd.DataFrame({
+            "mae": g["abs_err"].sum() / g["dias"].sum(),
+            "mape": 100 * g["ape"].sum() / g["ape_dias"].sum(),
+            "fit_s": g["fit_s"].mean(),
+            "predict_s": g["predict_s"].mean(),
+            "pico_mb": g["pico_mb"].max(),
+            "predicciones": g.size(),
+        }).reset_index()
+
+    fallos = (
+        errores.groupby(["modelo", "horizonte"]).size().rename("fallos").reset_index()
+        if errores is not None and not errores.empty
+        else pd.DataFrame(columns=["modelo", "horizonte", "fallos"])
+    )
+    resumen = resumen.merge(fallos, on=["modelo", "horizonte"], how="outer")
+    for col in ("predicciones", "fallos"):
+        resumen[col] = resumen[col].fillna(0).astype(int)
+    return resumen[columns].sort_values(["horizonte", "mae"]).reset_index(drop=True)
+
+
+def regressions(resumen: pd.DataFrame, baseline: pd.DataFrame,
+                max_error_ratio: float = 1.1, max_cost_ratio: float = 1.5) -> pd.DataFrame:
+    """
+    Filas del resumen que empeoran frente a uno anterior: MAE más de
+    `max_error_ratio` veces o tiempo total más de `max_cost_ratio` veces.
+    """
+    both = resumen.merge(baseline, on=["modelo", "horizonte"], suffixes=("", "_base"))
+    cost = both["fit_s"] + both["predict_s"]
+    cost_base = both["fit_s_base"] + both["predict_s_base"]
+    both["mae_ratio"] = both["mae"] / both["mae_base"]
+    both["coste_ratio"] = cost / cost_base.where(cost_base > 0)
+    worse = (both["mae_ratio"] > max_error_ratio) | (both["coste_ratio"] > max_cost_ratio)
+    return both.loc[worse, ["modelo", "horizonte", "mae", "mae_base", "mae_ratio", "coste_ratio"]]
@@ -0,0 +1,231 @@
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+
+# ==========================================================
+# ESTIMACIÓN DE TAMAÑO
+# ==========================================================
+def estimate_size(value) -> int:
+    """
+    Devuelve el tamaño aproximado en bytes de un valor cacheado.
+    Para DataFrames cuenta también el contenido de las columnas de texto.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    return sys.getsizeof(value)
+
+
+# ==========================================================
+# TABLAS REFERENCIADAS POR UNA CONSULTA
+# ==========================================================
+_TABLE_RE = re.compile(
+    r"\b(?:FROM|JOIN|INTO|UPDATE|TABLE|VIEW)\s+(?:CONCURRENTLY\s+)?"
+    r'(?:"?\w+"?\.)?"?([A-Za-z_]\w*)"?',
+    re.IGNORECASE,
+)
+
+
+def query_tables(query: str) -> set:
+    """
+    Extrae los nombres de tablas/vistas que aparecen en una consulta.
+    Se usan como etiquetas de invalidación (en minúsculas).
+    """
+    return {name.lower() for name in _TABLE_RE.findall(query)}
+
+
+# ==========================================================
+# CACHÉ ACOTADA (LRU + TTL + ETIQUETAS)
+# ==========================================================
+class BoundedCache:
+    """
+    Caché en memoria con presupuesto en bytes, expulsión LRU, TTL por
+    entrada e invalidación por etiquetas. Es segura entre hilos.
+    """
+
+    def __init__(self, max_bytes: int, default_ttl: float = None):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()  # clave -> (valor, tamaño, caduca, etiquetas)
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    # ------------------------------------------------------
+    # LECTURA / ESCRITURA
+    # ------------------------------------------------------
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return default
+
+            value, _, expires, _ = entry
+            if expires is not None and expires <= time.monotonic():
+                self._remove(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key, value, ttl: float = None, tags=(), size: int = None) -> bool:
+        """
+        Guarda un valor. Devuelve False si no cabe en el presupuesto.
+        """
+        size = estimate_size(value) if size is None else size
+        if size > self.max_bytes:
+            return False
+
+        ttl = self.default_ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        tags = frozenset(t.lower() for t in tags)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires, tags)
+            self._bytes += size
+            self._evict()
+        return True
+
+    # ------------------------------------------------------
+    # INVALIDACIÓN
+    # ------------------------------------------------------
+    def invalidate_tags(self, *tags) -> int:
+        """Elimina todas las entradas con alguna de las etiquetas dadas."""
+        tags = {t.lower() for t in tags}
+        with self._lock:
+            keys = [k for k, e in self._entries.items() if e[3] & tags]
+            for key in keys:
+                self._remove(key)
+            self._stats["invalidations"] += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def items(self) -> list:
+        """Pares (clave, valor) vigentes, sin tocar contadores ni orden LRU."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                (k, e[0]) for k, e in self._entries.items()
+                if e[2] is None or e[2] > now
+            ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    # ------------------------------------------------------
+    # INTERNOS
+    # ------------------------------------------------------
+    def _remove(self, key):
+        _, size, _, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _evict(self):
+        if self._bytes <= self.max_bytes:
+            return
+
+        # Primero lo caducado; después lo menos usado recientemente
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if e[2] is not None and e[2] <= now]:
+            self._remove(key)
+            self._stats["expirations"] += 1
+
+        while self._bytes > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            self._remove(key)
+            self._stats["evictions"] += 1
+
+
+# ==========================================================
+# COALESCENCIA DE PETICIONES IDÉNTICAS (single-flight)
+# ==========================================================
+class _Flight:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Si varios hilos piden a la vez la misma clave, solo el primero ejecuta
+    la función; el resto espera y recibe el mismo resultado (o la misma
+    excepción). Cuenta cuántas ejecuciones duplicadas se han evitado.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._stats = {"executions": 0, "shared": 0, "errors": 0, "wait_seconds": 0.0}
+
+    def do(self, key, func):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._stats["executions"] += 1
+            else:
+                flight.waiters += 1
+                self._stats["shared"] += 1
+
+        if not leader:
+            start = time.perf_counter()
+            flight.done.wait()
+            with self._lock:
+                self._stats["wait_seconds"] += time.perf_counter() - start
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "in_flight": len(self._flights),
+                "waiting": sum(f.waiters for f in self._flights.values()),
+            }
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+
+# ==========================================================
+# VARIABLES DE CALENDARIO (Random Forest / XGBoost)
+# ==========================================================
+# Los modelos de árboles se entrenaron con seis variables cíclicas del día:
+# seno y coseno del día del mes (/31), del mes (/12) y del día de la semana
+# (/7). Los valores posibles son pocos, así que se precalculan en tablas y
+# la matriz de cualquier lote de fechas se construye indexándolas.
+FEATURES = ["day_sin", "day_cos", "month_sin", "month_cos", "dow_sin", "dow_cos"]
+
+
+def _cyclic_table(values, period) -> np.ndarray:
+    angle = 2 * np.pi * np.asarray(values) / period
+    return np.column_stack([np.sin(angle), np.cos(angle)])
+
+
+# Fila = valor (día 1-31, mes 1-12, día de la semana 0-6 con lunes = 0)
+_DAY_TABLE = _cyclic_table(np.arange(32), 31)
+_MONTH_TABLE = _cyclic_table(np.arange(13), 12)
+_DOW_TABLE = _cyclic_table(np.arange(7), 7)
+
+
+def future_dates(last_dates, horizon: int) -> np.ndarray:
+    """Matriz (n_series, horizon) con los `horizon` días siguientes a cada fecha."""
+    last = np.asarray(last_dates, dtype="datetime64[D]").reshape(-1, 1)
+    return last + np.arange(1, horizon + 1)
+
+
+def calendar_features(dates) -> np.ndarray:
+    """Matriz (n_fechas, 6) con las variables de FEATURES, en ese orden."""
+    days = np.asarray(dates, dtype="datetime64[D]").ravel()
+    months = days.astype("datetime64[M]")
+
+    day = (days - months).astype("int64") + 1
+    month = months.astype("int64") % 12 + 1
+    # 1970-01-01 fue jueves (3 con lunes = 0)
+    dow = (days.astype("int64") + 3) % 7
+
+    return np.hstack([_DAY_TABLE[day], _MONTH_TABLE[month], _DOW_TABLE[dow]])
+
+
+def tree_forecast(model, last_dates, horizon: int) -> np.ndarray:
+    """
+    Predicción de un modelo de árboles para el horizonte siguiente a cada
+    fecha de `last_dates`, con una sola llamada a model.predict.
+    Devuelve una matriz (n_fechas, horizon).
+    """
+    dates = future_dates(last_dates, horizon)
+    X = pd.DataFrame(calendar_features(dates), columns=FEATURES)
+    return np.asarray(model.predict(X)).reshape(dates.shape)
@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# ==========================================================
+# REDUCCIÓN DE SERIES LARGAS PARA GRÁFICAS
+# ==========================================================
+# Plotly manda al navegador todos los puntos de cada traza, pero una gráfica
+# de ~1000 px de ancho no muestra más de uno o dos por píxel. Las series que
+# pasan de CHART_MAX_POINTS se reducen con LTTB (Largest-Triangle-Three-
+# Buckets): de cada tramo se queda el punto que forma el triángulo de mayor
+# área con sus vecinos, lo que conserva picos y forma. Siempre se conservan
+# el primer y el último punto (la unión con la predicción), el máximo, el
+# mínimo y las fechas que se pidan. Los valores NaN no entran en el cálculo,
+# pero se conserva el primero de cada hueco para que la línea siga cortada
+# ahí. Acotando el rango de fechas hay menos puntos y, por debajo del
+# límite, se ven todos.
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "1500"))
+
+
+def lttb(x, y, n_out: int) -> np.ndarray:
+    """
+    Posiciones de los `n_out` puntos que elige LTTB (ordenadas) entre los
+    de `y` con valor, más la del primer NaN de cada hueco.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+
+    finite = np.isfinite(y)
+    if not finite.all():
+        pos = np.flatnonzero(finite)
+        gaps = np.flatnonzero(~finite & np.r_[True, finite[:-1]])
+        return np.union1d(pos[lttb(x[pos], y[pos], n_out)], gaps)
+
+    # Primer y último punto fijos; n_out - 2 tramos entre medias
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    out = np.empty(n_out, dtype=int)
+    out[0], out[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # El tercer vértice es la media del tramo siguiente
+        nxt_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[hi:nxt_hi].mean()
+        avg_y = y[hi:nxt_hi].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def _as_float(values) -> np.ndarray:
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy(dtype="datetime64[s]").astype("int64").astype("float64")
+    return values.to_numpy(dtype="float64")
+
+
+def downsample(df: pd.DataFrame, x: str, y: str, max_points: int = CHART_MAX_POINTS,
+               keep=()) -> pd.DataFrame:
+    """
+    Filas de `df` (ordenado por `x`) que bastan para dibujar la línea `y`:
+    unas `max_points` elegidas con LTTB más el máximo, el mínimo y las
+    filas cuyo `x` esté en `keep`. Si ya cabe, se devuelve tal cual.
+    """
+    if len(df) <= max_points:
+        return df
+
+    ys = df[y].to_numpy(dtype="float64")
+    rows = set(lttb(_as_float(df[x]), ys, max_points).tolist())
+    if np.isfinite(ys).any():
+        rows.update((int(np.nanargmax(ys)), int(np.nanargmin(ys))))
+    if len(keep):
+        rows.update(np.flatnonzero(df[x].isin(keep)).tolist())
+    return df.iloc[sorted(rows)]
+
+
+def chart_frame(df: pd.DataFrame, x: str, y: str, color: str = None,
+                max_points: int = CHART_MAX_POINTS, keep=()):
+    """
+    downsample por traza (una por valor de `color`).
+    Devuelve (df reducido, nº de puntos original).
+    """
+    if color is None:
+        return downsample(df, x, y, max_points, keep), len(df)
+
+    parts = [
+        downsample(part, x, y, max_points, keep)
+        for _, part in df.groupby(color, sort=False)
+    ]
+    return pd.concat(parts) if parts else df, len(df)
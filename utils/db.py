@@ -1,18 +1,66 @@
+import functools
+import io
 import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pa_csv
 import streamlit as st
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import DBAPIError, DisconnectionError
 from dotenv import load_dotenv
+from utils.cache import BoundedCache, SingleFlight, estimate_size, query_tables
+from utils.metrics import QueryMetrics
+from utils.snapshots import SnapshotCache
 
 # ==========================================================
 # CARGA DE VARIABLES DE ENTORNO
 # ==========================================================
 load_dotenv()
 
-DB_URL = st.secrets.get("DATABASE_URL") or os.getenv("DATABASE_URL")
+# DB_BACKEND:
+#   "postgres" -> base de producción (DATABASE_URL)
+#   "duckdb"   -> base offline local (DUCKDB_PATH), ver utils/offline.py
+DB_BACKEND = os.getenv("DB_BACKEND", "postgres")
 
-if not DB_URL:
-    raise ValueError("Falta la variable DATABASE_URL en el archivo .env")
+if DB_BACKEND == "duckdb":
+    DUCKDB_PATH = os.getenv("DUCKDB_PATH", os.path.join("data", "offline.duckdb"))
+    if not os.path.exists(DUCKDB_PATH):
+        raise ValueError(
+            f"No existe la base offline '{DUCKDB_PATH}'. "
+            "Genérela con: python -m scripts.generate_offline_db"
+        )
+    DB_URL = f"duckdb:///{DUCKDB_PATH}"
+elif DB_BACKEND == "postgres":
+    DB_URL = st.secrets.get("DATABASE_URL") or os.getenv("DATABASE_URL")
+    if not DB_URL:
+        raise ValueError("Falta la variable DATABASE_URL en el archivo .env")
+else:
+    raise ValueError(f"DB_BACKEND no válido: '{DB_BACKEND}'")
+
+# DuckDB es embebida: no hay plan de servidor que reutilizar ni COPY TO STDOUT
+SUPPORTS_PREPARE = DB_BACKEND == "postgres"
+
+
+# ==========================================================
+# CONFIGURACIÓN DEL POOL
+# ==========================================================
+# DB_PRE_PING:
+#   "always" -> ping en cada checkout (una ida y vuelta extra por consulta)
+#   "idle"   -> ping solo si la conexión lleva más de DB_PRE_PING_IDLE s parada
+#   "never"  -> sin ping; se confía en DB_POOL_RECYCLE
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_PRE_PING = os.getenv("DB_PRE_PING", "idle")
+DB_PRE_PING_IDLE = float(os.getenv("DB_PRE_PING_IDLE", "60"))
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "500"))
+
+PRE_PING_STRATEGIES = ("always", "idle", "never")
 
 
 # ==========================================================
@@ -20,42 +68,623 @@ if not DB_URL:
 # ==========================================================
 def get_engine():
     """Devuelve una conexión cacheada para evitar recrear el engine cada vez."""
-    return create_engine(DB_URL, pool_pre_ping=True)
+    if DB_PRE_PING not in PRE_PING_STRATEGIES:
+        raise ValueError(f"DB_PRE_PING no válido: '{DB_PRE_PING}'")
+
+    new_engine = create_engine(
+        DB_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_PRE_PING == "always",
+    )
+    if DB_PRE_PING == "idle":
+        _ping_idle_connections(new_engine)
+    _instrument(new_engine)
+    return new_engine
+
+
+def _ping_idle_connections(target):
+    """Hace ping solo a las conexiones que llevan tiempo sin usarse."""
+
+    @event.listens_for(target, "checkin")
+    def _on_checkin(dbapi_conn, record):
+        record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(target, "checkout")
+    def _on_checkout(dbapi_conn, record, proxy):
+        idle = time.monotonic() - record.info.get("checked_in_at", time.monotonic())
+        if idle < DB_PRE_PING_IDLE:
+            return
+        try:
+            cursor = dbapi_conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+        except Exception as e:
+            # El pool descarta la conexión y reintenta con otra
+            raise DisconnectionError() from e
+
+
+# ==========================================================
+# INSTRUMENTACIÓN
+# ==========================================================
+# Cada consulta del módulo deja un registro con: tiempo total, tiempo en
+# base de datos, espera del pool, filas y bytes leídos. Las que superan
+# DB_SLOW_QUERY_MS se guardan además en el log de consultas lentas.
+query_metrics = QueryMetrics(slow_threshold_s=DB_SLOW_QUERY_MS / 1000)
+
+
+def _instrument(target):
+    @event.listens_for(target, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["cursor_started_at"] = time.perf_counter()
+
+    @event.listens_for(target, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop("cursor_started_at", time.perf_counter())
+        record = conn.info.get("query_record")
+        if record is not None:
+            record["db_seconds"] += elapsed
+            return
+
+        # Sentencia lanzada fuera de las funciones del módulo
+        query_metrics.add({
+            "label": _label(statement),
+            "seconds": elapsed,
+            "db_seconds": elapsed,
+            "pool_wait": None,
+            "rows": max(cursor.rowcount, 0),
+            "bytes": None,
+        })
+
+
+def _label(query: str, name: str = None) -> str:
+    return name or " ".join(query.split())[:80]
+
+
+@contextmanager
+def _connect(query: str, name: str = None):
+    """
+    Conexión del pool instrumentada. Mide la espera del checkout y el
+    tiempo total; las funciones de lectura añaden filas y bytes.
+    """
+    record = {
+        "label": _label(query, name),
+        "db_seconds": 0.0,
+        "rows": 0,
+        "bytes": 0,
+    }
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        record["pool_wait"] = time.perf_counter() - start
+        conn.info["query_record"] = record
+        try:
+            yield conn
+        finally:
+            conn.info.pop("query_record", None)
+            record["seconds"] = time.perf_counter() - start
+            query_metrics.add(record)
+
+
+def _note_result(conn, df: pd.DataFrame, nbytes: int = None) -> pd.DataFrame:
+    """Suma filas y bytes del resultado al registro de la consulta en curso."""
+    record = conn.info.get("query_record")
+    if record is not None:
+        record["rows"] += len(df)
+        record["bytes"] += estimate_size(df) if nbytes is None else nbytes
+    return df
+
+
+def pool_status() -> dict:
+    """Estado actual del pool de conexiones."""
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "checked_in": pool.checkedin(),
+    }
 
 
 engine = get_engine()
 
 
+# ==========================================================
+# REGISTRO DE SENTENCIAS PREPARADAS
+# ==========================================================
+# Las consultas usan parámetros con nombre (:year, :region...). Si además
+# se les da un nombre, se preparan en el servidor (PREPARE) una sola vez
+# por conexión del pool y las siguientes ejecuciones reutilizan el plan.
+_PARAM_RE = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+_NAME_RE = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+# Código de Postgres para "prepared statement does not exist"
+_PG_INVALID_STATEMENT = "26000"
+
+_STATEMENTS = {}
+
+
+def _compile_statement(query: str):
+    """
+    Convierte los parámetros :nombre en $1, $2... para usarlos en PREPARE.
+    Devuelve el SQL compilado y el orden de los parámetros.
+    """
+    order = []
+
+    def replace(match):
+        name = match.group(1)
+        if name not in order:
+            order.append(name)
+        return f"${order.index(name) + 1}"
+
+    sql = _PARAM_RE.sub(replace, query.strip().rstrip(";"))
+    return sql, tuple(order)
+
+
+def register_statement(name: str, query: str) -> str:
+    """
+    Registra una consulta con nombre. Registrar dos veces el mismo SQL
+    no hace nada; reutilizar el nombre con otro SQL es un error.
+    """
+    if not _NAME_RE.match(name):
+        raise ValueError(f"Nombre de sentencia no válido: '{name}'")
+
+    compiled = _compile_statement(query)
+    previous = _STATEMENTS.get(name)
+    if previous is not None and previous != compiled:
+        raise ValueError(f"La sentencia '{name}' ya está registrada con otro SQL.")
+
+    _STATEMENTS[name] = compiled
+    return name
+
+
+def _prepare(conn, name: str):
+    """Prepara la sentencia en la conexión si todavía no lo está."""
+    prepared = conn.info.setdefault("prepared_statements", set())
+    if name not in prepared:
+        sql, _ = _STATEMENTS[name]
+        conn.execute(text(f"PREPARE {name} AS {sql}"))
+        prepared.add(name)
+
+
+def _execute_statement(name: str, params: dict):
+    """Construye la llamada EXECUTE y sus parámetros para una sentencia registrada."""
+    _, order = _STATEMENTS[name]
+    missing = [p for p in order if p not in params]
+    if missing:
+        raise ValueError(f"Faltan parámetros para '{name}': {', '.join(missing)}")
+
+    args = ", ".join(f":{p}" for p in order)
+    call = f"EXECUTE {name}({args})" if order else f"EXECUTE {name}"
+    return text(call), {p: params[p] for p in order}
+
+
+def _is_missing_statement(error: DBAPIError) -> bool:
+    return getattr(error.orig, "pgcode", None) == _PG_INVALID_STATEMENT
+
+
+def _read_sql(conn, query: str, params: dict = None, name: str = None) -> pd.DataFrame:
+    """
+    Lanza la consulta en la conexión dada. Con nombre usa la sentencia
+    preparada; si el servidor la ha perdido, la vuelve a preparar una vez.
+    """
+    params = params or {}
+
+    if name is None or not SUPPORTS_PREPARE:
+        return _note_result(conn, pd.read_sql(text(query), conn, params=params))
+
+    register_statement(name, query)
+    try:
+        _prepare(conn, name)
+        call, args = _execute_statement(name, params)
+        return _note_result(conn, pd.read_sql(call, conn, params=args))
+    except DBAPIError as e:
+        if not _is_missing_statement(e):
+            raise
+        conn.rollback()
+        conn.info.get("prepared_statements", set()).discard(name)
+        _prepare(conn, name)
+        call, args = _execute_statement(name, params)
+        return _note_result(conn, pd.read_sql(call, conn, params=args))
+
+
+# ==========================================================
+# LECTURA COLUMNAR (COPY ... TO STDOUT)
+# ==========================================================
+# Alternativa a pd.read_sql para resultados grandes: Postgres vuelca el
+# resultado con COPY y pyarrow lo parsea en C directamente a columnas
+# tipadas, sin pasar por tuplas de Python fila a fila.
+FETCH_ENGINES = ("read_sql", "copy")
+
+# OID de tipo de Postgres -> tipo Arrow. Lo no listado se lee como texto.
+_PG_ARROW_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(),
+    21: pa.int16(),
+    23: pa.int32(),
+    700: pa.float32(),
+    701: pa.float64(),
+    1700: pa.float64(),
+    1082: pa.date32(),
+    1114: pa.timestamp("ns"),
+}
+_PG_TIMESTAMPTZ = 1184
+
+
+def _driver_sql(query: str) -> str:
+    """Pasa los parámetros :nombre al formato %(nombre)s de psycopg2."""
+    return _PARAM_RE.sub(r"%(\1)s", query.strip().rstrip(";").replace("%", "%%"))
+
+
+def _read_columnar(conn, query: str, params: dict = None) -> pd.DataFrame:
+    """Lectura columnar según el backend: COPY en Postgres, nativa en DuckDB."""
+    if DB_BACKEND == "duckdb":
+        return _read_duckdb(conn, query, params)
+    return _read_copy(conn, query, params)
+
+
+def _read_duckdb(conn, query: str, params: dict = None) -> pd.DataFrame:
+    """DuckDB entrega el resultado ya en columnas: se pide como DataFrame."""
+    start = time.perf_counter()
+    cursor = conn.connection.cursor()
+    try:
+        sql = _PARAM_RE.sub(r"$\1", query.strip().rstrip(";"))
+        cursor.execute(sql, params or {})
+        df = cursor.fetchdf()
+    finally:
+        cursor.close()
+
+    record = conn.info.get("query_record")
+    if record is not None:
+        record["db_seconds"] += time.perf_counter() - start
+    return _note_result(conn, df)
+
+
+def _read_copy(conn, query: str, params: dict = None) -> pd.DataFrame:
+    """
+    Ejecuta la consulta con COPY (FORMAT csv) y la convierte con pyarrow.
+    Los tipos se obtienen de la descripción de la consulta, así que los
+    textos que parecen números se mantienen como texto.
+    """
+    start = time.perf_counter()
+    cursor = conn.connection.cursor()
+    try:
+        # Siempre con dict (aunque vacío): _driver_sql duplica los %, y
+        # psycopg2 solo los vuelve a juntar cuando recibe parámetros
+        inner = cursor.mogrify(_driver_sql(query), params or {}).decode()
+
+        cursor.execute(f"SELECT * FROM ({inner}) AS q LIMIT 0")
+        columns = [(col.name, col.type_code) for col in cursor.description]
+
+        buffer = io.BytesIO()
+        cursor.copy_expert(
+            f"COPY ({inner}) TO STDOUT WITH (FORMAT csv, HEADER true)", buffer
+        )
+    finally:
+        cursor.close()
+
+    # El cursor crudo no pasa por los eventos del engine
+    record = conn.info.get("query_record")
+    if record is not None:
+        record["db_seconds"] += time.perf_counter() - start
+
+    nbytes = buffer.tell()
+    if nbytes == 0:
+        return _note_result(conn, pd.DataFrame(columns=[name for name, _ in columns]), 0)
+
+    buffer.seek(0)
+    table = pa_csv.read_csv(
+        buffer,
+        convert_options=pa_csv.ConvertOptions(
+            column_types={
+                name: _PG_ARROW_TYPES.get(oid, pa.string()) for name, oid in columns
+            },
+            true_values=["t"],
+            false_values=["f"],
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False,
+        ),
+    )
+    del buffer
+
+    df = table.to_pandas(self_destruct=True, split_blocks=True)
+    for name, oid in columns:
+        if oid == _PG_TIMESTAMPTZ:
+            df[name] = pd.to_datetime(df[name], utc=True)
+    return _note_result(conn, df, nbytes)
+
+
 # ==========================================================
 # CONSULTA SIN CACHÉ
 # ==========================================================
-def run_query(query: str) -> pd.DataFrame:
+def run_query(
+    query: str,
+    params: dict = None,
+    name: str = None,
+    fetch: str = "read_sql",
+) -> pd.DataFrame:
     """
     Ejecuta una consulta SELECT sin usar caché.
+    - params: valores para los parámetros :nombre de la consulta.
+    - name: si se indica, la consulta se prepara en el servidor y se reutiliza.
+    - fetch: "read_sql" (por defecto) o "copy" para resultados grandes.
+      Con "copy" no se usa la sentencia preparada. En DuckDB, "copy" usa
+      la lectura columnar nativa.
     """
-    with engine.connect() as conn:
-        return pd.read_sql(query, conn)
+    if fetch not in FETCH_ENGINES:
+        raise ValueError(f"Motor de lectura no válido: '{fetch}'")
+
+    with _connect(query, name) as conn:
+        if fetch == "copy":
+            return _read_columnar(conn, query, params)
+        return _read_sql(conn, query, params, name)
+
+# ==========================================================
+# CONSULTAS EN PARALELO
+# ==========================================================
+# Para páginas que lanzan varias consultas independientes: cada una va por
+# su propia conexión del pool y la latencia total es la de la más lenta.
+QUERY_BATCH_WORKERS = int(os.getenv("QUERY_BATCH_WORKERS", "8"))
+
+_batch_executor = ThreadPoolExecutor(
+    max_workers=QUERY_BATCH_WORKERS, thread_name_prefix="query-batch"
+)
+
+
+class QueryBatch(dict):
+    """
+    Resultado de run_queries: nombre -> DataFrame de las consultas que
+    terminaron bien, más `timings` (segundos por consulta) y `errors`
+    (excepción por consulta fallida).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.timings = {}
+        self.errors = {}
+
+
+def _timed_query(query, params, name, fetch):
+    start = time.perf_counter()
+    try:
+        return run_query(query, params, name, fetch), None, time.perf_counter() - start
+    except Exception as e:
+        return None, e, time.perf_counter() - start
+
+
+def run_queries(queries: dict, fetch: str = "read_sql") -> QueryBatch:
+    """
+    Ejecuta a la vez varias consultas independientes.
+    - queries: {clave: (sql, params)} o {clave: (sql, params, nombre_preparada)}
+    Un fallo no cancela el resto: queda en `errors` del resultado.
+    """
+    futures = {}
+    for key, spec in queries.items():
+        query, params, name = (*spec, None)[:3]
+        futures[key] = _batch_executor.submit(_timed_query, query, params, name, fetch)
+
+    batch = QueryBatch()
+    for key, future in futures.items():
+        df, error, elapsed = future.result()
+        batch.timings[key] = elapsed
+        if error is None:
+            batch[key] = df
+        else:
+            batch.errors[key] = error
+    return batch
+
+
+# ==========================================================
+# LECTURA POR BLOQUES (cursor de servidor)
+# ==========================================================
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "50000"))
+
+
+def stream_query(
+    query: str,
+    params: dict = None,
+    chunk_rows: int = STREAM_CHUNK_ROWS,
+    dtype: dict = None,
+    parse_dates=None,
+):
+    """
+    Generador que devuelve el resultado en DataFrames de chunk_rows filas.
+    Usa un cursor con nombre en el servidor, así que en memoria solo hay un
+    bloque cada vez. La conexión se libera al agotar o cerrar el generador.
+    - dtype / parse_dates: tipos que se aplican a cada bloque.
+    """
+    with _connect(query) as conn:
+        stream = conn.execution_options(stream_results=True, max_row_buffer=chunk_rows)
+        chunks = pd.read_sql(
+            text(query),
+            stream,
+            params=params or {},
+            chunksize=chunk_rows,
+            dtype=dtype,
+            parse_dates=parse_dates,
+        )
+        for chunk in chunks:
+            yield _note_result(conn, chunk)
+
+
+def fold_sum(chunks, by: list, column: str) -> pd.DataFrame:
+    """
+    Agrega por bloques: suma `column` por las claves `by` en cada bloque y
+    combina los parciales. Si los bloques vienen ordenados por alguna de las
+    claves, los parciales apenas se solapan y la memoria queda acotada.
+    """
+    partials = [
+        chunk.groupby(by, dropna=False, sort=False)[column].sum() for chunk in chunks
+    ]
+    if not partials:
+        return pd.DataFrame(columns=[*by, column])
+
+    return (
+        pd.concat(partials)
+        .groupby(level=list(range(len(by))), dropna=False)
+        .sum()
+        .reset_index()
+    )
+
 
 # ==========================================================
 # CONSULTA CON CACHÉ (para queries pesadas)
 # ==========================================================
-@st.cache_data(show_spinner=False)
-def run_cached_query(query: str) -> pd.DataFrame:
+# Caché compartida por todo el proceso: presupuesto en bytes, LRU, TTL por
+# consulta e invalidación por tabla. Configurable por variables de entorno.
+QUERY_CACHE_MAX_MB = int(os.getenv("QUERY_CACHE_MAX_MB", "256"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+
+query_cache = BoundedCache(
+    max_bytes=QUERY_CACHE_MAX_MB * 1024 * 1024,
+    default_ttl=QUERY_CACHE_TTL,
+)
+
+
+def _cache_key(query: str, params: dict = None):
+    """Clave estable: SQL normalizado + parámetros ordenados."""
+    items = tuple(sorted((k, repr(v)) for k, v in (params or {}).items()))
+    return " ".join(query.split()), items
+
+
+# Segundo nivel en disco: sobrevive a reinicios. La clave incluye la
+# versión de los datos (último refresco de los agregados y huella de
+# "Orders"), así que con datos nuevos las instantáneas antiguas dejan de
+# usarse y caducan solas. Nunca se lee una más antigua que QUERY_CACHE_TTL
+# (o el ttl de la consulta), y sin gestor de refrescos no se usan.
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(".cache", "snapshots"))
+SNAPSHOT_MAX_MB = int(os.getenv("SNAPSHOT_MAX_MB", "2048"))
+SNAPSHOT_MAX_AGE = float(os.getenv("SNAPSHOT_MAX_AGE", str(7 * 24 * 3600)))
+
+snapshot_cache = SnapshotCache(
+    SNAPSHOT_DIR,
+    max_bytes=SNAPSHOT_MAX_MB * 1024 * 1024,
+    max_age_s=SNAPSHOT_MAX_AGE,
+)
+
+
+# Peticiones idénticas simultáneas (varias sesiones abriendo el mismo
+# panel) comparten una única ejecución en lugar de lanzar N veces el mismo
+# escaneo contra la base de datos.
+query_flights = SingleFlight()
+
+
+def _snapshot_version():
+    """
+    Versión de datos para las claves en disco, o None si no es fiable (sin
+    gestor de refrescos): entonces no se usa el disco.
+    """
+    # Import local: utils.mviews importa este módulo
+    from utils.mviews import data_version, tracked
+
+    version = data_version()
+    return version if tracked(version) else None
+
+
+def run_cached_query(
+    query: str,
+    params: dict = None,
+    name: str = None,
+    ttl: float = None,
+    tags=None,
+    fetch: str = "read_sql",
+    persist: bool = False,
+) -> pd.DataFrame:
     """
     Ejecuta una consulta SELECT usando caché.
     Solo usar para consultas pesadas.
+    - ttl: segundos de validez (por defecto QUERY_CACHE_TTL).
+    - tags: tablas de las que depende; por defecto se extraen del SQL.
+    - persist: guardar también el resultado en disco (Parquet).
     """
-    with engine.connect() as conn:
-        return pd.read_sql(query, conn)
+    key = _cache_key(query, params)
+    df = query_cache.get(key)
+
+    if df is None:
+        def load():
+            version = _snapshot_version() if persist else None
+            snapshot_key = None if version is None else SnapshotCache.key(key, version)
+            # Lo de disco no puede ser más antiguo que lo que admite la caché
+            df = (
+                None if snapshot_key is None
+                else snapshot_cache.load(snapshot_key, max_age_s=ttl or QUERY_CACHE_TTL)
+            )
+
+            if df is None:
+                df = run_query(query, params, name, fetch)
+                if snapshot_key is not None:
+                    snapshot_cache.save(snapshot_key, df)
+
+            query_cache.set(key, df, ttl=ttl, tags=query_tables(query) if tags is None else tags)
+            return df
+
+        df = query_flights.do(("query", key), load)
+
+    # Copia para que el llamador pueda modificarla sin tocar la caché
+    return df.copy()
+
+
+def persistent(label: str):
+    """
+    Decorador para funciones de carga que devuelven un DataFrame: guarda el
+    resultado en disco por (label, argumentos, versión de datos) y en un
+    arranque en frío lo lee de ahí en lugar de consultar la base de datos.
+    Sin gestor de refrescos (versión no fiable) no se usa el disco.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            version = _snapshot_version()
+            if version is None:
+                return func(*args, **kwargs)
+            key = SnapshotCache.key(label, args, sorted(kwargs.items()), version)
+
+            def load():
+                df = snapshot_cache.load(key, max_age_s=QUERY_CACHE_TTL)
+                if df is None:
+                    df = func(*args, **kwargs)
+                    snapshot_cache.save(key, df)
+                return df
+
+            return query_flights.do(("persistent", key), load)
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate_tables(*tables) -> int:
+    """
+    Invalida los resultados cacheados que dependen de esas tablas
+    (por ejemplo, tras una carga de datos en "Orders").
+    """
+    return query_cache.invalidate_tags(*tables)
+
+
+def cache_stats() -> dict:
+    """
+    Contadores de la caché de consultas (aciertos, fallos, expulsiones...),
+    de la caché en disco y de la coalescencia de peticiones simultáneas.
+    """
+    return {
+        **query_cache.stats(),
+        "disco": snapshot_cache.stats(),
+        "coalescencia": query_flights.stats(),
+    }
 
 
 # ==========================================================
-# OPCIONAL: CONSULTAS DE ESCRITURA (por si las usas en el futuro)
+# CONSULTAS DE ESCRITURA
 # ==========================================================
-def execute_query(query: str) -> None:
+def execute_query(query: str, params: dict = None) -> None:
     """
     Ejecuta una consulta SQL que modifica datos (INSERT, UPDATE, DELETE, DDL).
+    Invalida las entradas de caché de las tablas afectadas.
     """
-    with engine.connect() as conn:
-        conn.execute(text(query))
+    with _connect(query) as conn:
+        conn.execute(text(query), params or {})
         conn.commit()
+
+    invalidate_tables(*query_tables(query))
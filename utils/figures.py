@@ -0,0 +1,56 @@
+import hashlib
+import os
+
+import pandas as pd
+import plotly.io as pio
+
+from utils.cache import BoundedCache
+
+
+# ==========================================================
+# CACHÉ DE FIGURAS PLOTLY
+# ==========================================================
+# Construir una figura con plotly.express (sobre todo el treemap) cuesta
+# mucho más que reconstruirla desde su JSON. Se guarda el JSON de cada
+# figura con la clave (función, parámetros, huella de los datos): si en un
+# rerun ni los datos ni los parámetros han cambiado, se reutiliza. Con datos
+# nuevos cambia la huella y las figuras viejas salen por LRU/TTL.
+FIGURE_CACHE_MAX_MB = int(os.getenv("FIGURE_CACHE_MAX_MB", "64"))
+FIGURE_CACHE_TTL = float(os.getenv("FIGURE_CACHE_TTL", "3600"))
+
+figure_cache = BoundedCache(
+    max_bytes=FIGURE_CACHE_MAX_MB * 1024 * 1024,
+    default_ttl=FIGURE_CACHE_TTL,
+)
+
+
+def data_fingerprint(df: pd.DataFrame) -> str:
+    """Hash del contenido de `df`: columnas, tipos, índice y valores."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((list(df.columns), [str(t) for t in df.dtypes])).encode())
+    try:
+        hashed = pd.util.hash_pandas_object(df, index=True)
+    except TypeError:
+        # Celdas no hashables (listas, dicts): se hashea su texto
+        hashed = pd.util.hash_pandas_object(df.astype(str), index=True)
+    h.update(hashed.to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def cached_figure(build, df: pd.DataFrame, **spec):
+    """
+    Figura build(df, **spec) (p. ej. build = px.bar), desde la caché si
+    ya se construyó con los mismos datos y parámetros.
+    """
+    key = (
+        f"{build.__module__}.{build.__name__}",
+        repr(sorted(spec.items())),
+        data_fingerprint(df),
+    )
+    cached = figure_cache.get(key)
+    if cached is not None:
+        return pio.from_json(cached)
+
+    fig = build(df, **spec)
+    figure_cache.set(key, fig.to_json())
+    return fig
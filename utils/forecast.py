@@ -0,0 +1,189 @@
+import hashlib
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import BoundedCache, SingleFlight
+from utils.jobs import JobError, forecast_jobs
+from utils.sarima import sarima_forecast, sarima_states
+
+
+# ==========================================================
+# VERSIÓN DE UN MODELO
+# ==========================================================
+def file_version(*paths) -> str:
+    """
+    Huella barata de los ficheros de un modelo (ruta, tamaño y fecha de
+    modificación). Cambia al sustituir el fichero sin leer su contenido.
+    """
+    parts = []
+    for path in paths:
+        try:
+            info = os.stat(path)
+            parts.append(f"{path}:{info.st_size}:{info.st_mtime_ns}")
+        except FileNotFoundError:
+            parts.append(f"{path}:-")
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()[:12]
+
+
+# ==========================================================
+# CACHÉ DE PREDICCIONES
+# ==========================================================
+# La clave la construye el llamador con valores pequeños (modelo, versión
+# del modelo, horizonte, región, ciudad, versión de datos), así que buscar
+# una predicción no depende de la longitud del histórico.
+FORECAST_CACHE_MAX_MB = int(os.getenv("FORECAST_CACHE_MAX_MB", "64"))
+FORECAST_CACHE_TTL = float(os.getenv("FORECAST_CACHE_TTL", str(24 * 3600)))
+
+
+ENTRY_COLUMNS = [
+    "modelo", "version", "horizonte", "seleccion", "version_datos",
+    "fit_s", "predict_s", "computed_at",
+]
+
+
+def _key_columns(key) -> dict:
+    """
+    Partes de una clave (modelo, versión, horizonte, *selección, versión de
+    datos); la selección es (región, ciudad) en Dirección y la tienda en RRHH.
+    """
+    if not isinstance(key, tuple) or len(key) < 4:
+        return {"modelo": str(key)}
+    modelo, version, horizonte, *seleccion, version_datos = key
+    return {
+        "modelo": str(modelo),
+        "version": str(version),
+        "horizonte": int(horizonte),
+        "seleccion": " / ".join(map(str, seleccion)),
+        "version_datos": str(version_datos),
+    }
+
+
+class ForecastCache:
+    """
+    Predicciones por clave, acotadas en bytes (LRU + TTL). Cada entrada
+    guarda también cuánto costó: segundos de ajuste y de predicción.
+    Peticiones simultáneas de la misma clave se calculan una sola vez.
+    """
+
+    def __init__(self, max_bytes: int, default_ttl: float = None):
+        self._cache = BoundedCache(max_bytes, default_ttl)
+        self._flights = SingleFlight()
+
+    def get(self, key):
+        """Predicción cacheada de `key` o None (no calcula nada)."""
+        entry = self._cache.get(key)
+        return None if entry is None else entry["pred"]
+
+    def get_or_compute(self, key, compute) -> np.ndarray:
+        """
+        Predicción para `key`; si no está, llama a compute(timings). La
+        función puede anotar timings["fit_s"]; el resto del tiempo cuenta
+        como predicción. El array devuelto es de solo lectura.
+        """
+        entry = self._cache.get(key)
+        if entry is None:
+            entry = self._flights.do(key, lambda: self._compute(key, compute))
+        return entry["pred"]
+
+    def _compute(self, key, compute) -> dict:
+        timings = {}
+        start = time.perf_counter()
+        pred = compute(timings)
+        elapsed = time.perf_counter() - start
+
+        fit_s = timings.get("fit_s", 0.0)
+        return self.put(key, pred, fit_s=fit_s, predict_s=elapsed - fit_s)
+
+    def put(self, key, pred, fit_s: float = 0.0, predict_s: float = 0.0) -> dict:
+        """Guarda una predicción calculada fuera (p. ej. en un lote)."""
+        pred = np.array(pred, dtype="float64")
+        pred.flags.writeable = False
+        entry = {
+            "pred": pred,
+            "fit_s": fit_s,
+            "predict_s": predict_s,
+            "computed_at": pd.Timestamp.now(),
+        }
+        self._cache.set(key, entry, size=pred.nbytes + 256)
+        return entry
+
+    def entries(self) -> pd.DataFrame:
+        """
+        Una fila por predicción cacheada: las partes de su clave en columnas
+        con tipo (una tupla mezcla str e int y Arrow no la admite) y tiempos.
+        """
+        rows = [
+            {**_key_columns(key), **{k: v for k, v in entry.items() if k != "pred"}}
+            for key, entry in self._cache.items()
+        ]
+        df = pd.DataFrame(rows, columns=ENTRY_COLUMNS)
+        return df.astype({"horizonte": "Int64"})
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return {**self._cache.stats(), "coalescencia": self._flights.stats()}
+
+
+forecast_cache = ForecastCache(
+    max_bytes=FORECAST_CACHE_MAX_MB * 1024 * 1024,
+    default_ttl=FORECAST_CACHE_TTL,
+)
+
+
+# ==========================================================
+# PREDICCIONES EN SEGUNDO PLANO
+# ==========================================================
+def forecast_in_background(key, func, *args, timeout_s: float = None, on_result=None):
+    """
+    Predicción de `key` calculada con func(*args) en el pool de procesos
+    (utils.jobs); func devuelve {"pred", "fit_s", "predict_s"}.
+    - Devuelve el array si ya está calculado.
+    - Devuelve None mientras el trabajo está en cola o en marcha.
+    - JobError si el trabajo falló o superó su tiempo máximo.
+    - on_result(result) se llama una vez con el resultado completo.
+    """
+    pred = forecast_cache.get(key)
+    if pred is not None:
+        return pred
+
+    job = forecast_jobs.submit(key, func, *args, timeout_s=timeout_s)
+    if job["state"] == "done":
+        result = job["result"]
+        if on_result is not None:
+            on_result(result)
+        entry = forecast_cache.put(key, result["pred"], result["fit_s"], result["predict_s"])
+        forecast_jobs.forget(key)
+        return entry["pred"]
+    if job["state"] in ("failed", "timeout"):
+        raise JobError(job["error"])
+    return None
+
+
+def sarima_prediction(key, serie, ts, horizon: int, enforce: bool = False):
+    """
+    SARIMA de `ts` para `key`. Si hay un ajuste previo de la serie `serie`
+    se avanza con los días nuevos en este proceso (milisegundos); si no,
+    ajuste completo en segundo plano (None mientras tanto) y su estado se
+    guarda para la próxima vez.
+    """
+    pred = forecast_cache.get(key)
+    if pred is not None:
+        return pred
+
+    # Con un ajuste completo ya en marcha para esta clave, se espera a él
+    rolled = None
+    if forecast_jobs.poll(key) is None:
+        rolled = sarima_states.forecast(serie, ts, [horizon], enforce)
+    if rolled is not None:
+        entry = forecast_cache.put(key, rolled["preds"][horizon], 0.0, rolled["predict_s"])
+        return entry["pred"]
+
+    return forecast_in_background(
+        key, sarima_forecast, ts, horizon, enforce,
+        on_result=lambda result: sarima_states.put(serie, result["state"]),
+    )
@@ -0,0 +1,181 @@
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from utils.db import engine, run_query
+
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================================================
+# ALMACÉN PERSISTENTE DE PREDICCIONES
+# ==========================================================
+# Una fila por predicción precalculada, con la misma clave que la caché en
+# memoria: (modelo, versión del modelo, horizonte, región, ciudad, versión
+# de datos). La escribe el proceso de precálculo (scripts/precompute_forecasts)
+# y la leen las páginas; se guardan las dos últimas versiones de datos.
+# Una predicción con más de FORECAST_STORE_MAX_AGE segundos no se usa (ni
+# cuenta como hecha para el precálculo) y prune() la borra.
+STORE_TABLE = "forecast_store"
+FORECAST_STORE_MAX_AGE = float(os.getenv("FORECAST_STORE_MAX_AGE", str(7 * 24 * 3600)))
+
+# Si el almacén no está instalado (o la consulta falla), no se vuelve a
+# consultar hasta pasados FORECAST_STORE_RETRY_S segundos.
+FORECAST_STORE_RETRY_S = float(os.getenv("FORECAST_STORE_RETRY_S", "300"))
+
+KEY_COLUMNS = ["model_id", "model_version", "horizon", "region", "city", "data_version"]
+
+_STORE_DDL = f"""
+CREATE TABLE IF NOT EXISTS {STORE_TABLE} (
+    model_id VARCHAR NOT NULL,
+    model_version VARCHAR NOT NULL,
+    horizon INTEGER NOT NULL,
+    region VARCHAR NOT NULL,
+    city VARCHAR NOT NULL,
+    data_version VARCHAR NOT NULL,
+    pred DOUBLE PRECISION[] NOT NULL,
+    fit_s DOUBLE PRECISION NOT NULL,
+    predict_s DOUBLE PRECISION NOT NULL,
+    computed_at TIMESTAMP NOT NULL,
+    PRIMARY KEY ({", ".join(KEY_COLUMNS)})
+)
+"""
+
+_STORE_UPSERT = f"""
+INSERT INTO {STORE_TABLE}
+    ({", ".join(KEY_COLUMNS)}, pred, fit_s, predict_s, computed_at)
+VALUES ({", ".join(":" + c for c in KEY_COLUMNS)}, :pred, :fit_s, :predict_s, :computed_at)
+ON CONFLICT ({", ".join(KEY_COLUMNS)}) DO UPDATE SET
+    pred = excluded.pred,
+    fit_s = excluded.fit_s,
+    predict_s = excluded.predict_s,
+    computed_at = excluded.computed_at
+"""
+
+_STORE_LOAD = f"""
+SELECT pred, fit_s, predict_s
+FROM {STORE_TABLE}
+WHERE {" AND ".join(f"{c} = :{c}" for c in KEY_COLUMNS)}
+  AND computed_at >= :computed_after
+"""
+
+# Conserva solo las dos versiones de datos más recientes, sin lo caducado
+_STORE_PRUNE = f"""
+DELETE FROM {STORE_TABLE}
+WHERE computed_at < :computed_after
+   OR data_version NOT IN (
+    SELECT data_version FROM {STORE_TABLE}
+    GROUP BY data_version
+    ORDER BY MAX(computed_at) DESC
+    LIMIT 2
+)
+"""
+
+_unavailable = {"since": None}
+
+
+def install() -> None:
+    """Crea la tabla del almacén si falta."""
+    with engine.begin() as conn:
+        conn.execute(text(_STORE_DDL))
+    _unavailable["since"] = None
+
+
+def _computed_after():
+    """Instante a partir del cual una predicción guardada sigue valiendo."""
+    return (pd.Timestamp.now() - pd.Timedelta(seconds=FORECAST_STORE_MAX_AGE)).to_pydatetime()
+
+
+def _available() -> bool:
+    since = _unavailable["since"]
+    return since is None or time.monotonic() - since >= FORECAST_STORE_RETRY_S
+
+
+# ==========================================================
+# LECTURA / ESCRITURA
+# ==========================================================
+def load(key):
+    """
+    Predicción guardada para `key` como dict {"pred", "fit_s", "predict_s"},
+    o None si no está, si ha caducado o si el almacén no está instalado.
+    """
+    if not _available():
+        return None
+    params = {**dict(zip(KEY_COLUMNS, key)), "computed_after": _computed_after()}
+    try:
+        df = run_query(_STORE_LOAD, params, "forecast_store_load")
+    except DBAPIError as exc:
+        logger.warning("Almacén de predicciones no disponible: %s", exc.orig)
+        _unavailable["since"] = time.monotonic()
+        return None
+    _unavailable["since"] = None
+    if df.empty:
+        return None
+
+    row = df.iloc[0]
+    return {
+        "pred": np.asarray(row["pred"], dtype="float64"),
+        "fit_s": float(row["fit_s"]),
+        "predict_s": float(row["predict_s"]),
+    }
+
+
+def stored_keys(data_version: str) -> set:
+    """Claves ya guardadas (sin caducar) para una versión de datos."""
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                text(f"SELECT {', '.join(KEY_COLUMNS)} FROM {STORE_TABLE} "
+                     "WHERE data_version = :data_version "
+                     "AND computed_at >= :computed_after"),
+                {"data_version": data_version, "computed_after": _computed_after()},
+            ).all()
+    except DBAPIError:
+        return set()
+    return {tuple(row) for row in rows}
+
+
+def save(entries) -> int:
+    """Guarda (o sustituye) predicciones: iterable de (key, pred, fit_s, predict_s)."""
+    now = pd.Timestamp.now().to_pydatetime()
+    rows = [
+        {
+            **dict(zip(KEY_COLUMNS, key)),
+            "pred": [float(v) for v in pred],
+            "fit_s": float(fit_s),
+            "predict_s": float(predict_s),
+            "computed_at": now,
+        }
+        for key, pred, fit_s, predict_s in entries
+    ]
+    if rows:
+        with engine.begin() as conn:
+            conn.execute(text(_STORE_UPSERT), rows)
+    return len(rows)
+
+
+def prune() -> None:
+    with engine.begin() as conn:
+        conn.execute(text(_STORE_PRUNE), {"computed_after": _computed_after()})
+
+
+def summary() -> pd.DataFrame:
+    """Nº de predicciones y coste por versión de datos y modelo."""
+    try:
+        with engine.connect() as conn:
+            return pd.read_sql(text(
+                f"SELECT data_version, model_id, COUNT(*) AS predicciones, "
+                f"SUM(fit_s + predict_s) AS coste_s, MAX(computed_at) AS calculado "
+                f"FROM {STORE_TABLE} GROUP BY data_version, model_id "
+                f"ORDER BY calculado DESC, model_id"
+            ), conn)
+    except DBAPIError:
+        return pd.DataFrame(
+            columns=["data_version", "model_id", "predicciones", "coste_s", "calculado"]
+        )
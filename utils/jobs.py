@@ -0,0 +1,409 @@
+import io
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import context, forkserver, popen_forkserver, spawn, util
+
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================================================
+# PLANIFICADOR DE TRABAJOS DE PREDICCIÓN
+# ==========================================================
+# Los ajustes pesados (SARIMA) no se hacen en el hilo del script de
+# Streamlit sino en un pool de procesos:
+# - como mucho FORECAST_WORKERS trabajos a la vez (el resto espera en cola),
+# - cada trabajo tiene un tiempo máximo; si lo supera se mata su proceso,
+# - dos peticiones con la misma clave comparten el mismo trabajo.
+# Los trabajos terminados (o fallidos) se conservan FORECAST_JOB_KEEP_S
+# segundos para que la sesión que los espera recoja el resultado.
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+FORECAST_JOB_TIMEOUT_S = float(os.getenv("FORECAST_JOB_TIMEOUT_S", "120"))
+FORECAST_JOB_KEEP_S = float(os.getenv("FORECAST_JOB_KEEP_S", "600"))
+
+# Módulos que el forkserver importa una sola vez: cada proceso del pool
+# nace de él con ellos ya cargados (nunca "__main__": sería la página)
+FORECAST_PRELOAD = os.getenv("FORECAST_PRELOAD", "utils.sarima").split(",")
+
+PENDING_STATES = ("queued", "running")
+
+
+class JobError(RuntimeError):
+    """Un trabajo ha fallado o ha superado su tiempo máximo."""
+
+
+def key_text(key) -> str:
+    """Clave como texto para tablas: las tuplas mezclan str e int y Arrow no las admite."""
+    if isinstance(key, tuple):
+        return " / ".join(map(str, key))
+    return str(key)
+
+
+def _run(func, args):
+    """Se ejecuta en el proceso del pool."""
+    return func(*args)
+
+
+# ==========================================================
+# PROCESOS DEL POOL
+# ==========================================================
+# Los procesos nacen del forkserver: no heredan los hilos ni las conexiones
+# de Streamlit y no vuelven a importar nada de lo precargado. Pero, como con
+# "spawn", el hijo reconstruiría el __main__ del padre, y Streamlit instala
+# la página como __main__: el proceso ejecutaría la página fuera de una
+# sesión y moriría. Los trabajos son funciones de utils/ y no lo necesitan,
+# así que a los procesos del pool no se les pasa.
+class _WorkerPopen(popen_forkserver.Popen):
+    def _launch(self, process_obj):
+        prep_data = spawn.get_preparation_data(process_obj._name)
+        prep_data.pop("init_main_from_name", None)
+        prep_data.pop("init_main_from_path", None)
+        buf = io.BytesIO()
+        context.set_spawning_popen(self)
+        try:
+            context.reduction.dump(prep_data, buf)
+            context.reduction.dump(process_obj, buf)
+        finally:
+            context.set_spawning_popen(None)
+
+        self.sentinel, w = forkserver.connect_to_new_process(self._fds)
+        _parent_w = os.dup(w)
+        self.finalizer = util.Finalize(self, util.close_fds, (_parent_w, self.sentinel))
+        with open(w, "wb", closefd=True) as f:
+            f.write(buf.getbuffer())
+        self.pid = forkserver.read_signed(self.sentinel)
+
+
+class _WorkerProcess(context.ForkServerProcess):
+    @staticmethod
+    def _Popen(process_obj):
+        return _WorkerPopen(process_obj)
+
+
+class _WorkerContext(context.ForkServerContext):
+    Process = _WorkerProcess
+
+
+_worker_context = {"ctx": None}
+_worker_context_lock = threading.Lock()
+
+
+def worker_context() -> _WorkerContext:
+    """Contexto de los pools; arranca el forkserver (una vez por proceso)."""
+    with _worker_context_lock:
+        if _worker_context["ctx"] is None:
+            ctx = _WorkerContext()
+            ctx.set_forkserver_preload([m for m in FORECAST_PRELOAD if m and m != "__main__"])
+            forkserver.ensure_running()
+            _worker_context["ctx"] = ctx
+        return _worker_context["ctx"]
+
+
+class JobScheduler:
+    """
+    Cola de trabajos sobre un ProcessPoolExecutor. submit() no bloquea:
+    devuelve el estado del trabajo ("queued", "running", "done", "failed"
+    o "timeout") y poll() permite consultarlo después.
+    La función y sus argumentos deben poder serializarse (funciones de
+    módulo en utils/, no de las páginas).
+    - max_tasks_per_child: trabajos por proceso antes de sustituirlo
+      (1 = un proceso nuevo por trabajo; por defecto, sin límite).
+    """
+
+    def __init__(self, workers: int, timeout_s: float, keep_s: float,
+                 max_tasks_per_child: int = None):
+        self.workers = workers
+        self.timeout_s = timeout_s
+        self.keep_s = keep_s
+        self.max_tasks_per_child = max_tasks_per_child
+        self._cond = threading.Condition()
+        self._jobs = {}
+        self._queue = deque()
+        self._executor = None
+        self._dispatcher = None
+        self._closed = False
+        self._stats = {
+            "submitted": 0,
+            "deduplicated": 0,
+            "done": 0,
+            "failed": 0,
+            "timeouts": 0,
+            "pool_restarts": 0,
+        }
+
+    # ------------------------------------------------------
+    # API
+    # ------------------------------------------------------
+    def submit(self, key, func, *args, timeout_s: float = None) -> dict:
+        """Encola func(*args) con la clave `key` (si no hay ya uno igual)."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("El planificador de trabajos está cerrado")
+            self._expire()
+            job = self._jobs.get(key)
+            if job is not None:
+                self._stats["deduplicated"] += 1
+                return self._public(job)
+
+            job = {
+                "key": key,
+                "func": func,
+                "args": args,
+                "timeout_s": timeout_s or self.timeout_s,
+                "state": "queued",
+                "submitted_at": time.monotonic(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None,
+                "future": None,
+            }
+            self._jobs[key] = job
+            self._queue.append(job)
+            self._stats["submitted"] += 1
+            self._start_dispatcher()
+            self._cond.notify_all()
+            return self._public(job)
+
+    def poll(self, key):
+        """Estado actual del trabajo de `key` o None si no existe."""
+        with self._cond:
+            job = self._jobs.get(key)
+            return None if job is None else self._public(job)
+
+    def wait(self, key, timeout: float = None):
+        """Bloquea hasta que el trabajo termine (para procesos por lotes)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                job = self._jobs.get(key)
+                if job is None or job["state"] not in PENDING_STATES:
+                    return None if job is None else self._public(job)
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return self._public(job)
+                self._cond.wait(remaining)
+
+    def wait_idle(self, timeout: float = None) -> list:
+        """
+        Bloquea hasta que no quede ningún trabajo en cola ni en marcha
+        (o hasta `timeout`) y devuelve el estado de todos los conservados.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while any(j["state"] in PENDING_STATES for j in self._jobs.values()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return [self._public(job) for job in self._jobs.values()]
+
+    def forget(self, key) -> None:
+        """Olvida un trabajo ya terminado (su resultado se ha guardado en otro sitio)."""
+        with self._cond:
+            job = self._jobs.get(key)
+            if job is not None and job["state"] not in PENDING_STATES:
+                del self._jobs[key]
+
+    def shutdown(self) -> None:
+        """
+        Cierra el planificador: lo que sigue en cola o en marcha acaba como
+        "failed", se matan los procesos del pool y termina el hilo de despacho.
+        """
+        with self._cond:
+            self._closed = True
+            for job in [*self._queue, *self._running()]:
+                self._finish(job, "failed", error="Planificador cerrado")
+            self._queue.clear()
+            executor, self._executor = self._executor, None
+            dispatcher = self._dispatcher
+            self._cond.notify_all()
+        if executor is not None:
+            self._kill_pool(executor, wait=True)
+        if dispatcher is not None:
+            dispatcher.join()
+
+    @staticmethod
+    def _public(job: dict) -> dict:
+        end = job["finished_at"] or time.monotonic()
+        return {
+            "key": job["key"],
+            "state": job["state"],
+            "result": job["result"],
+            "error": job["error"],
+            "queued_s": (job["started_at"] or end) - job["submitted_at"],
+            "elapsed_s": end - job["submitted_at"],
+        }
+
+    # ------------------------------------------------------
+    # DESPACHO (hilo de fondo)
+    # ------------------------------------------------------
+    def _start_dispatcher(self) -> None:
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(
+                target=self._dispatch_forever, name="forecast-jobs", daemon=True
+            )
+            self._dispatcher.start()
+
+    def _running(self) -> list:
+        return [j for j in self._jobs.values() if j["state"] == "running"]
+
+    def _dispatch_forever(self) -> None:
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                now = time.monotonic()
+                running = self._running()
+
+                timed_out = [j for j in running if now - j["started_at"] > j["timeout_s"]]
+                if timed_out:
+                    for job in timed_out:
+                        self._finish(job, "timeout", error=(
+                            f"El trabajo superó el tiempo máximo ({job['timeout_s']:.0f} s)"
+                        ))
+                        self._stats["timeouts"] += 1
+                    self._restart_pool()
+                    running = self._running()
+
+                launch = []
+                while self._queue and len(running) < self.workers:
+                    job = self._queue.popleft()
+                    job["state"] = "running"
+                    job["started_at"] = now
+                    running.append(job)
+                    launch.append(job)
+
+                if not launch:
+                    deadlines = [j["started_at"] + j["timeout_s"] - now for j in running]
+                    self._cond.wait(max(0.05, min(deadlines, default=1.0)))
+                    continue
+                executor = self._pool()
+
+            # Fuera del candado: submit() arranca procesos y eso tarda
+            for job in launch:
+                self._launch(executor, job)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=worker_context(),
+                max_tasks_per_child=self.max_tasks_per_child,
+            )
+        return self._executor
+
+    def _launch(self, executor: ProcessPoolExecutor, job: dict) -> None:
+        # Los procesos se arrancan en submit(), según hacen falta
+        try:
+            future = executor.submit(_run, job["func"], job["args"])
+        except Exception as e:
+            future, error = None, e
+
+        with self._cond:
+            # Entretanto se ha reiniciado el pool: el trabajo ya está en cola
+            if executor is not self._executor or job["state"] != "running":
+                if future is not None:
+                    future.cancel()
+                return
+            if future is None:
+                self._finish(job, "failed", error=f"No se pudo lanzar el trabajo: {error}")
+                self._stats["failed"] += 1
+                if isinstance(error, BrokenProcessPool):
+                    self._restart_pool()
+                return
+            job["future"] = future
+        future.add_done_callback(lambda f, job=job: self._on_done(job, f))
+
+    def _on_done(self, job: dict, future) -> None:
+        with self._cond:
+            # Futuro de un pool ya descartado (trabajo vencido o reencolado)
+            if job["future"] is not future or job["state"] != "running":
+                return
+            try:
+                self._finish(job, "done", result=future.result())
+                self._stats["done"] += 1
+            except BrokenProcessPool as e:
+                # Un proceso murió (p. ej. sin memoria): el pool no sirve
+                self._finish(job, "failed", error=f"El proceso de cálculo terminó: {e}")
+                self._stats["failed"] += 1
+                self._restart_pool()
+            except Exception as e:
+                self._finish(job, "failed", error=str(e))
+                self._stats["failed"] += 1
+
+    def _finish(self, job: dict, state: str, result=None, error=None) -> None:
+        job.update(state=state, result=result, error=error, future=None)
+        job["finished_at"] = time.monotonic()
+        if error is not None:
+            logger.warning("Trabajo %s: %s", job["key"], error)
+        self._cond.notify_all()
+
+    def _restart_pool(self) -> None:
+        """
+        Mata los procesos del pool actual (la única forma de parar un ajuste
+        en curso) y devuelve a la cola los trabajos que seguían en marcha.
+        """
+        old, self._executor = self._executor, None
+        for job in self._running():
+            job.update(state="queued", started_at=None, future=None)
+            self._queue.appendleft(job)
+        if old is not None:
+            self._kill_pool(old, wait=False)
+        self._stats["pool_restarts"] += 1
+
+    @staticmethod
+    def _kill_pool(executor: ProcessPoolExecutor, wait: bool) -> None:
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _expire(self) -> None:
+        """Descarta los trabajos terminados hace más de keep_s segundos."""
+        now = time.monotonic()
+        old = [
+            key for key, job in self._jobs.items()
+            if job["finished_at"] is not None and now - job["finished_at"] > self.keep_s
+        ]
+        for key in old:
+            del self._jobs[key]
+
+    # ------------------------------------------------------
+    # ESTADO
+    # ------------------------------------------------------
+    def jobs(self) -> pd.DataFrame:
+        """Una fila por trabajo conservado: clave, estado, espera y duración."""
+        with self._cond:
+            self._expire()
+            rows = [self._public(job) for job in self._jobs.values()]
+        return pd.DataFrame(
+            [
+                {**{k: v for k, v in row.items() if k != "result"}, "key": key_text(row["key"])}
+                for row in rows
+            ],
+            columns=["key", "state", "error", "queued_s", "elapsed_s"],
+        )
+
+    def stats(self) -> dict:
+        with self._cond:
+            states = [job["state"] for job in self._jobs.values()]
+            return {
+                **self._stats,
+                "workers": self.workers,
+                "queued": states.count("queued"),
+                "running": states.count("running"),
+            }
+
+
+forecast_jobs = JobScheduler(
+    workers=FORECAST_WORKERS,
+    timeout_s=FORECAST_JOB_TIMEOUT_S,
+    keep_s=FORECAST_JOB_KEEP_S,
+)
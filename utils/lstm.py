@@ -0,0 +1,285 @@
+import json
+import os
+import pickle
+
+import numpy as np
+
+
+# ==========================================================
+# PREDICCIÓN RECURSIVA CON LSTM
+# ==========================================================
+# Los LSTM predicen un día a partir de los `time_steps` anteriores; para un
+# horizonte de N días se realimenta cada predicción N veces. Aquí todo el
+# bucle va dentro de un único grafo compilado y con un lote de series a la
+# vez (todas las regiones/ciudades en una sola llamada).
+
+# Longitud de la ventana de entrada de cada modelo
+LSTM_TIME_STEPS = {"LSTM": 14, "LSTM_PDF": 50}
+
+
+def last_windows(series, time_steps: int) -> np.ndarray:
+    """Matriz (n_series, time_steps) con la última ventana de cada serie."""
+    windows = np.empty((len(series), time_steps), dtype="float32")
+    for i, ts in enumerate(series):
+        values = np.asarray(ts, dtype="float32")
+        if len(values) < time_steps:
+            raise ValueError(
+                f"La serie {i} tiene {len(values)} días; el modelo necesita {time_steps}."
+            )
+        windows[i] = values[-time_steps:]
+    return windows
+
+
+def scale(scaler, values: np.ndarray) -> np.ndarray:
+    """Aplica un escalador de una sola variable a una matriz de cualquier forma."""
+    return scaler.transform(values.reshape(-1, 1)).reshape(values.shape).astype("float32")
+
+
+def unscale(scaler, values: np.ndarray) -> np.ndarray:
+    return scaler.inverse_transform(values.reshape(-1, 1)).reshape(values.shape)
+
+
+def compile_rollout(model):
+    """
+    Devuelve rollout(window, horizon): predicción recursiva de `horizon`
+    pasos para un lote de ventanas ya escaladas (batch, time_steps).
+    - Con un NumpyLSTM: bucle NumPy sobre un búfer preasignado.
+    - Con un modelo Keras: un tf.function. La ventana es un búfer de tamaño
+      fijo que se desplaza dentro del grafo; no crece ni vuelve a Python.
+    """
+    if isinstance(model, NumpyLSTM):
+        return _numpy_rollout(model)
+
+    import tensorflow as tf
+
+    @tf.function(reduce_retracing=True)
+    def rollout(window, horizon):
+        preds = tf.TensorArray(tf.float32, size=horizon)
+        for i in tf.range(horizon):
+            p = model(window[:, :, tf.newaxis], training=False)[:, 0]
+            preds = preds.write(i, p)
+            window = tf.concat([window[:, 1:], p[:, tf.newaxis]], axis=1)
+        return tf.transpose(preds.stack())
+
+    def run(window: np.ndarray, horizon: int) -> np.ndarray:
+        out = rollout(tf.constant(window, tf.float32), tf.constant(horizon, tf.int32))
+        return out.numpy()
+
+    return run
+
+
+def lstm_forecast(rollout, scaler, series, time_steps: int, horizon: int) -> np.ndarray:
+    """
+    Predicción de `horizon` días para cada serie de `series` en una sola
+    llamada. Devuelve una matriz (n_series, horizon) en euros.
+    """
+    windows = scale(scaler, last_windows(series, time_steps))
+    return unscale(scaler, rollout(windows, horizon))
+
+
+def _numpy_rollout(model):
+    def run(window: np.ndarray, horizon: int) -> np.ndarray:
+        batch, time_steps = window.shape
+        # Ventana + predicciones en un único búfer: cada paso lee una vista
+        buffer = np.empty((batch, time_steps + horizon), dtype="float32")
+        buffer[:, :time_steps] = window
+        for i in range(horizon):
+            buffer[:, time_steps + i] = model(buffer[:, i:i + time_steps, np.newaxis])[:, 0]
+        return buffer[:, time_steps:].copy()
+
+    return run
+
+
+# ==========================================================
+# RUNTIME NUMPY (sin TensorFlow)
+# ==========================================================
+# Los pesos de los .h5 se exportan a un .npz (scripts/export_lstm.py) y el
+# forward se hace con NumPy: mismas ecuaciones que Keras (puertas i, f, c, o
+# en ese orden), en float32. TensorFlow solo hace falta para entrenar.
+def _sigmoid(x):
+    return 0.5 * (1.0 + np.tanh(0.5 * x))
+
+
+_ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "tanh": np.tanh,
+    "sigmoid": _sigmoid,
+}
+
+
+def _activation(name: str):
+    if name not in _ACTIVATIONS:
+        raise ValueError(f"Activación no soportada en el runtime NumPy: '{name}'")
+    return _ACTIVATIONS[name]
+
+
+class NumpyLSTM:
+    """
+    Modelo secuencial de capas LSTM y Dense (las Dropout no hacen nada en
+    inferencia). Entrada (batch, time_steps, features) como en Keras.
+    """
+
+    def __init__(self, layers: list):
+        self.layers = layers
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype="float32")
+        for layer in self.layers:
+            if layer["type"] == "lstm":
+                x = self._lstm(layer, x)
+            else:
+                x = _activation(layer["activation"])(x @ layer["kernel"] + layer["bias"])
+        return x
+
+    predict = __call__
+
+    @staticmethod
+    def _lstm(layer, x):
+        units = layer["units"]
+        act = _activation(layer["activation"])
+        rec_act = _activation(layer["recurrent_activation"])
+        batch, steps, _ = x.shape
+
+        # Proyección de la entrada de todos los pasos en una sola matmul 2D
+        z_in = (x.reshape(batch * steps, -1) @ layer["kernel"]).reshape(batch, steps, -1)
+        z_in += layer["bias"]
+        h = np.zeros((batch, units), dtype="float32")
+        c = np.zeros((batch, units), dtype="float32")
+        out = np.empty((batch, steps, units), dtype="float32") if layer["return_sequences"] else None
+
+        for t in range(steps):
+            z = z_in[:, t] + h @ layer["recurrent_kernel"]
+            i = rec_act(z[:, :units])
+            f = rec_act(z[:, units:2 * units])
+            g = act(z[:, 2 * units:3 * units])
+            o = rec_act(z[:, 3 * units:])
+            c = f * c + i * g
+            h = o * act(c)
+            if out is not None:
+                out[:, t] = h
+        return h if out is None else out
+
+
+class AffineScaler:
+    """Escalador x -> (x - offset) / scale (RobustScaler, StandardScaler...)."""
+
+    def __init__(self, offset, scale):
+        self.offset = np.asarray(offset, dtype="float64")
+        self.scale = np.asarray(scale, dtype="float64")
+
+    def transform(self, x):
+        return (np.asarray(x, dtype="float64") - self.offset) / self.scale
+
+    def inverse_transform(self, x):
+        return np.asarray(x, dtype="float64") * self.scale + self.offset
+
+
+def _scaler_params(scaler):
+    """(offset, scale) de un escalador de sklearn ya ajustado."""
+    name = type(scaler).__name__
+    if name == "MinMaxScaler":
+        return -scaler.min_ / scaler.scale_, 1.0 / scaler.scale_
+    if name == "RobustScaler":
+        offset = scaler.center_ if scaler.center_ is not None else 0.0
+        scale = scaler.scale_ if scaler.scale_ is not None else 1.0
+        return offset, scale
+    if name == "StandardScaler":
+        offset = scaler.mean_ if scaler.mean_ is not None else 0.0
+        scale = scaler.scale_ if scaler.scale_ is not None else 1.0
+        return offset, scale
+    raise ValueError(f"Escalador no soportado: {name}")
+
+
+def load_numpy_lstm(path: str):
+    """Lee un .npz exportado y devuelve (NumpyLSTM, AffineScaler)."""
+    with np.load(path) as data:
+        config = json.loads(str(data["config"]))
+        layers = []
+        for i, layer in enumerate(config["layers"]):
+            weights = {
+                name: data[f"layer{i}_{name}"].astype("float32")
+                for name in ("kernel", "recurrent_kernel", "bias")
+                if f"layer{i}_{name}" in data
+            }
+            layers.append({**layer, **weights})
+        scaler = AffineScaler(data["scaler_offset"], data["scaler_scale"])
+    return NumpyLSTM(layers), scaler
+
+
+def load_lstm(h5_path: str, scaler_path: str, npz_path: str = None):
+    """
+    (modelo, escalador) de un LSTM. Usa la exportación .npz (por defecto,
+    junto al .h5) si existe; si no, carga el .h5 con Keras (requiere
+    TensorFlow).
+    """
+    npz_path = npz_path or os.path.splitext(h5_path)[0] + ".npz"
+    if os.path.exists(npz_path):
+        return load_numpy_lstm(npz_path)
+
+    from tensorflow.keras.models import load_model
+
+    with open(scaler_path, "rb") as f:
+        scaler = pickle.load(f)
+    return load_model(h5_path, compile=False), scaler
+
+
+# ==========================================================
+# EXPORTACIÓN .h5 -> .npz
+# ==========================================================
+def _h5_text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def export_lstm(h5_path: str, scaler_path: str, out_path: str = None) -> str:
+    """
+    Extrae arquitectura y pesos de un modelo Keras guardado en .h5 (solo
+    necesita h5py) y los parámetros de su escalador a un .npz comprimido.
+    """
+    import h5py
+
+    out_path = out_path or os.path.splitext(h5_path)[0] + ".npz"
+    arrays = {}
+    layers = []
+
+    with h5py.File(h5_path, "r") as f:
+        config = json.loads(_h5_text(f.attrs["model_config"]))
+        group = f["model_weights"] if "model_weights" in f else f
+
+        for layer in config["config"]["layers"]:
+            kind = layer["class_name"]
+            cfg = layer["config"]
+            if kind in ("InputLayer", "Dropout"):
+                continue
+            if kind not in ("LSTM", "Dense"):
+                raise ValueError(f"Capa no soportada en el runtime NumPy: {kind}")
+
+            index = len(layers)
+            layer_group = group[cfg["name"]]
+            for weight_name in layer_group.attrs["weight_names"]:
+                weight_name = _h5_text(weight_name)
+                short = weight_name.rsplit("/", 1)[-1].split(":")[0]
+                arrays[f"layer{index}_{short}"] = layer_group[weight_name][()].astype("float32")
+
+            if kind == "LSTM":
+                layers.append({
+                    "type": "lstm",
+                    "units": cfg["units"],
+                    "activation": cfg.get("activation", "tanh"),
+                    "recurrent_activation": cfg.get("recurrent_activation", "sigmoid"),
+                    "return_sequences": cfg.get("return_sequences", False),
+                })
+            else:
+                layers.append({"type": "dense", "activation": cfg.get("activation", "linear")})
+
+    with open(scaler_path, "rb") as f:
+        offset, scale = _scaler_params(pickle.load(f))
+
+    np.savez_compressed(
+        out_path,
+        config=np.array(json.dumps({"source": os.path.basename(h5_path), "layers": layers})),
+        scaler_offset=np.asarray(offset, dtype="float64"),
+        scaler_scale=np.asarray(scale, dtype="float64"),
+        **arrays,
+    )
+    return out_path
@@ -0,0 +1,73 @@
+import logging
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================================================
+# REGISTRO DE MÉTRICAS POR CONSULTA
+# ==========================================================
+class QueryMetrics:
+    """
+    Guarda las últimas consultas ejecutadas (tiempo total, tiempo en base de
+    datos, espera del pool, filas y bytes) y un log aparte con las lentas.
+    Es segura entre hilos y de tamaño acotado.
+    """
+
+    def __init__(self, slow_threshold_s: float, max_records: int = 2000, max_slow: int = 200):
+        self.slow_threshold_s = slow_threshold_s
+        self._records = deque(maxlen=max_records)
+        self._slow = deque(maxlen=max_slow)
+        self._lock = threading.Lock()
+
+    def add(self, record: dict) -> None:
+        record.setdefault("at", time.time())
+        with self._lock:
+            self._records.append(record)
+            if record.get("seconds", 0) >= self.slow_threshold_s:
+                self._slow.append(record)
+                logger.warning(
+                    "Consulta lenta (%.3f s, %s filas): %s",
+                    record["seconds"],
+                    record.get("rows"),
+                    record.get("label"),
+                )
+
+    def recent(self) -> pd.DataFrame:
+        with self._lock:
+            return pd.DataFrame(list(self._records))
+
+    def slow_queries(self) -> pd.DataFrame:
+        with self._lock:
+            return pd.DataFrame(list(self._slow))
+
+    def summary(self) -> pd.DataFrame:
+        """Agregado por consulta: llamadas, tiempos medio/p95/máx, filas y bytes."""
+        df = self.recent()
+        if df.empty:
+            return df
+
+        return (
+            df.groupby("label")
+            .agg(
+                llamadas=("seconds", "size"),
+                seg_medio=("seconds", "mean"),
+                seg_p95=("seconds", lambda s: s.quantile(0.95)),
+                seg_max=("seconds", "max"),
+                espera_pool_media=("pool_wait", "mean"),
+                filas_media=("rows", "mean"),
+                bytes_total=("bytes", "sum"),
+            )
+            .sort_values("seg_p95", ascending=False)
+            .reset_index()
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+            self._slow.clear()
@@ -0,0 +1,248 @@
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+import types
+
+import numpy as np
+import pandas as pd
+
+from utils.forecast import file_version
+from utils.lstm import compile_rollout, load_lstm
+
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================================================
+# REGISTRO DE MODELOS (carga perezosa)
+# ==========================================================
+# Cada modelo se carga la primera vez que se pide, no todos a la vez. Se
+# anota versión, hash del fichero, tiempo de carga y memoria, y se descarga
+# si lleva más de MODEL_IDLE_UNLOAD_S sin usarse o si entre todos superan
+# MODEL_MEMORY_MAX_MB (se descarga primero el usado hace más tiempo).
+MODEL_IDLE_UNLOAD_S = float(os.getenv("MODEL_IDLE_UNLOAD_S", "1800"))
+MODEL_MEMORY_MAX_MB = float(os.getenv("MODEL_MEMORY_MAX_MB", "2048"))
+
+
+class ModelLoadError(RuntimeError):
+    """No se ha podido cargar un modelo (fichero ausente, dependencia...)."""
+
+
+def _sha256(paths) -> str:
+    """Hash del contenido de los ficheros que existen."""
+    digest = hashlib.sha256()
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def model_nbytes(obj, _seen=None) -> int:
+    """
+    Bytes de los arrays de un modelo (pesos, árboles, escaladores), que son
+    casi toda su memoria. Recorre sus atributos; de Keras cuenta get_weights().
+    """
+    # id -> objeto: retener los estados temporales evita que se reutilicen sus id
+    seen = {} if _seen is None else _seen
+    if id(obj) in seen or obj is None or isinstance(obj, (str, int, float, bool, type,
+                                                           types.FunctionType, types.ModuleType)):
+        return 0
+    seen[id(obj)] = obj
+
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    if hasattr(obj, "get_weights"):
+        return sum(np.asarray(w).nbytes for w in obj.get_weights())
+    if isinstance(obj, dict):
+        return sum(model_nbytes(v, seen) for v in obj.values())
+    if isinstance(obj, (list, tuple, set)):
+        return sum(model_nbytes(v, seen) for v in obj)
+    # Objetos de sklearn (y sus árboles en Cython, vía __getstate__)
+    try:
+        state = obj.__getstate__()
+    except Exception:
+        return 0
+    return 0 if state is obj else model_nbytes(state, seen)
+
+
+class ModelRegistry:
+    """
+    Modelos por nombre: register(nombre, ficheros, cargador) y get(nombre).
+    Es segura entre hilos; un modelo que falla no afecta a los demás.
+    """
+
+    def __init__(self, idle_unload_s: float, max_bytes: int):
+        self.idle_unload_s = idle_unload_s
+        self.max_bytes = max_bytes
+        self._specs = {}
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._sweeper = None
+
+    def register(self, name: str, files, loader) -> None:
+        """`loader(*files)` devuelve el objeto que usará quien llame a get()."""
+        self._specs[name] = {"files": list(files), "loader": loader}
+        self._load_locks[name] = threading.Lock()
+
+    def version(self, name: str) -> str:
+        """Huella barata de los ficheros (cambia al sustituirlos)."""
+        return file_version(*self._specs[name]["files"])
+
+    # ------------------------------------------------------
+    # CARGA / DESCARGA
+    # ------------------------------------------------------
+    def get(self, name: str):
+        entry = self._touch(name)
+        if entry is not None:
+            return entry["model"]
+
+        # Un cerrojo por modelo: dos sesiones no lo cargan dos veces
+        with self._load_locks[name]:
+            entry = self._touch(name)
+            if entry is None:
+                entry = self._load(name)
+        self._enforce_budget(keep=name)
+        self._start_sweeper()
+        return entry["model"]
+
+    def _touch(self, name: str):
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                entry["last_used"] = time.monotonic()
+            return entry
+
+    def _load(self, name: str) -> dict:
+        spec = self._specs[name]
+        start = time.perf_counter()
+        try:
+            model = spec["loader"](*spec["files"])
+        except Exception as e:
+            raise ModelLoadError(f"No se pudo cargar el modelo '{name}': {e}") from e
+        load_s = time.perf_counter() - start
+        # Memoria del propio modelo (no del proceso): cada carga se mide sola
+        memory = model_nbytes(model)
+
+        entry = {
+            "model": model,
+            "version": self.version(name),
+            "sha256": _sha256(spec["files"]),
+            "load_s": load_s,
+            "memory_bytes": memory,
+            "loaded_at": pd.Timestamp.now(),
+            "last_used": time.monotonic(),
+        }
+        with self._lock:
+            self._entries[name] = entry
+        logger.info(
+            "Modelo %s cargado en %.2f s (%.1f MB)", name, entry["load_s"], memory / 1024**2
+        )
+        return entry
+
+    def unload(self, name: str) -> bool:
+        with self._lock:
+            return self._entries.pop(name, None) is not None
+
+    def unload_idle(self) -> list:
+        """Descarga los modelos sin uso desde hace más de idle_unload_s."""
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                n for n, e in self._entries.items()
+                if now - e["last_used"] > self.idle_unload_s
+            ]
+            for name in idle:
+                del self._entries[name]
+        for name in idle:
+            logger.info("Modelo %s descargado por inactividad", name)
+        return idle
+
+    def _enforce_budget(self, keep: str) -> None:
+        with self._lock:
+            total = sum(e["memory_bytes"] for e in self._entries.values())
+            by_age = sorted(self._entries.items(), key=lambda kv: kv[1]["last_used"])
+            for name, entry in by_age:
+                if total <= self.max_bytes:
+                    break
+                if name != keep:
+                    del self._entries[name]
+                    total -= entry["memory_bytes"]
+                    logger.info("Modelo %s descargado por memoria", name)
+
+    def _start_sweeper(self) -> None:
+        """Hilo de fondo que descarga lo inactivo aunque nadie llame a get()."""
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(
+                target=self._sweep_forever, name="model-sweeper", daemon=True
+            )
+            self._sweeper.start()
+
+    def _sweep_forever(self) -> None:
+        while True:
+            time.sleep(max(1.0, self.idle_unload_s / 4))
+            self.unload_idle()
+
+    # ------------------------------------------------------
+    # ESTADO
+    # ------------------------------------------------------
+    def status(self) -> pd.DataFrame:
+        """Una fila por modelo registrado: si está cargado, versión, hash, carga y memoria."""
+        now = time.monotonic()
+        rows = []
+        with self._lock:
+            for name in self._specs:
+                entry = self._entries.get(name)
+                rows.append({
+                    "modelo": name,
+                    "cargado": entry is not None,
+                    "version": entry["version"] if entry else None,
+                    "sha256": entry["sha256"] if entry else None,
+                    "carga_s": entry["load_s"] if entry else None,
+                    "memoria_mb": entry["memory_bytes"] / 1024**2 if entry else None,
+                    "inactivo_s": now - entry["last_used"] if entry else None,
+                })
+        return pd.DataFrame(rows)
+
+
+# ==========================================================
+# MODELOS DE PREDICCIÓN DE VENTAS
+# ==========================================================
+def _load_pickle(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def _load_lstm(h5_path, npz_path, scaler_path):
+    """LSTM listo para predecir: modelo, escalador y bucle compilado."""
+    model, scaler = load_lstm(h5_path, scaler_path, npz_path)
+    return {"model": model, "scaler": scaler, "rollout": compile_rollout(model)}
+
+
+def _lstm_files(h5_path, scaler_path):
+    # El .npz es la exportación para el runtime NumPy (puede no existir)
+    return [h5_path, os.path.splitext(h5_path)[0] + ".npz", scaler_path]
+
+
+model_registry = ModelRegistry(
+    idle_unload_s=MODEL_IDLE_UNLOAD_S,
+    max_bytes=int(MODEL_MEMORY_MAX_MB * 1024 * 1024),
+)
+
+model_registry.register("RANDOM FOREST", ["modelos/random_forest_sales.pkl"], _load_pickle)
+model_registry.register("XGBOOST", ["modelos/xgboost_sales_model.pkl"], _load_pickle)
+for _name, _h5, _scaler in (
+    ("LSTM", "modelos/lstm_sales_model.h5", "modelos/lstm_scaler.pkl"),
+    ("LSTM_PDF", "modelos/lstm_pdf_model.h5", "modelos/lstm_pdf_scaler.pkl"),
+):
+    model_registry.register(_name, _lstm_files(_h5, _scaler), _load_lstm)
@@ -0,0 +1,333 @@
+import logging
+import time
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from utils.db import DB_BACKEND, engine, invalidate_tables
+from utils.schema import AGGREGATE_VIEWS, aggregate_sql
+
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================================================
+# GESTOR DE LOS AGREGADOS mv_*
+# ==========================================================
+# En Postgres cada agregado se divide en tres objetos:
+#   <vista>_hist   -> MATERIALIZED VIEW con los años cerrados
+#   <vista>_actual -> tabla con el año en curso (se recalcula sola)
+#   <vista>        -> VIEW que une ambas (es lo que consultan las páginas)
+# El refresco incremental solo recalcula el año en curso; el histórico se
+# refresca (CONCURRENTLY, sin bloquear lecturas) en el modo completo o al
+# cambiar de año. En DuckDB (backend offline) los agregados son tablas y
+# siempre se reconstruyen enteros.
+#
+# Nunca se borra ni se sustituye una vista existente. Los agregados que ya
+# había en producción (legacy en utils.schema) toman su SQL de la vista
+# real: el operador la renombra a <vista>_legacy y se usa su definición
+# (pg_get_viewdef), filtrada por `anio`. La vista renombrada se conserva.
+STATE_TABLE = "mv_refresh_state"
+LEGACY_SUFFIX = "_legacy"
+
+REFRESH_MODES = ("incremental", "full")
+
+_HIST_FILTER = """o."DATE_" < date_trunc('year', now())"""
+_ACTUAL_FILTER = """o."DATE_" >= date_trunc('year', now())"""
+
+# Las páginas filtran los agregados legacy por `anio`: por ahí se dividen
+_LEGACY_FILTERS = {
+    "hist": "v.anio < EXTRACT(YEAR FROM now())",
+    "actual": "v.anio >= EXTRACT(YEAR FROM now())",
+}
+
+_RELKINDS = {"r": "tabla", "v": "vista", "m": "vista materializada"}
+
+_STATE_DDL = f"""
+CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+    view_name VARCHAR PRIMARY KEY,
+    mode VARCHAR NOT NULL,
+    refreshed_at TIMESTAMP NOT NULL,
+    duration_s DOUBLE PRECISION NOT NULL,
+    watermark TIMESTAMP,
+    hist_year INTEGER
+)
+"""
+
+_STATE_UPSERT = f"""
+INSERT INTO {STATE_TABLE}
+    (view_name, mode, refreshed_at, duration_s, watermark, hist_year)
+VALUES (:view_name, :mode, :refreshed_at, :duration_s, :watermark, :hist_year)
+ON CONFLICT (view_name) DO UPDATE SET
+    mode = excluded.mode,
+    refreshed_at = excluded.refreshed_at,
+    duration_s = excluded.duration_s,
+    watermark = excluded.watermark,
+    hist_year = excluded.hist_year
+"""
+
+
+# ==========================================================
+# INSTALACIÓN (DDL)
+# ==========================================================
+def _relkind(conn, name: str):
+    """Tipo de relación en Postgres ('r', 'v', 'm'...) o None si no existe."""
+    return conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"),
+        {"name": name},
+    ).scalar()
+
+
+def _viewdef(conn, name: str) -> str:
+    """SQL de la vista `name` según Postgres, o None si no existe."""
+    definition = conn.execute(
+        text("SELECT pg_get_viewdef(to_regclass(:name), true)"),
+        {"name": name},
+    ).scalar()
+    return None if definition is None else definition.strip().rstrip(";")
+
+
+def _part_sql(conn, name: str, part: str) -> str:
+    """SELECT del tramo `part` ("hist" o "actual") de un agregado en Postgres."""
+    if not AGGREGATE_VIEWS[name].get("legacy"):
+        return aggregate_sql(name, _HIST_FILTER if part == "hist" else _ACTUAL_FILTER)
+
+    legacy = f"{name}{LEGACY_SUFFIX}"
+    definition = _viewdef(conn, legacy)
+    if definition is None:
+        raise RuntimeError(
+            f"No se encuentra la definición real de {name}: renombre la vista "
+            f"existente (ALTER MATERIALIZED VIEW {name} RENAME TO {legacy}) y "
+            f"vuelva a instalar; se usará su SQL."
+        )
+    return f"SELECT * FROM ({definition}) v WHERE {_LEGACY_FILTERS[part]}"
+
+
+def install(views=None) -> None:
+    """
+    Crea (si faltan) los objetos de cada agregado y la tabla de estado, en
+    una sola transacción. Si ya existe una relación con el nombre de un
+    agregado que no es la vista del gestor, falla sin tocar nada.
+    """
+    views = list(views or AGGREGATE_VIEWS)
+
+    with engine.begin() as conn:
+        conn.execute(text(_STATE_DDL))
+
+        if DB_BACKEND != "duckdb":
+            # El refresco incremental del cubo filtra por fecha
+            conn.execute(text(
+                'CREATE INDEX IF NOT EXISTS orders_date_idx ON "Orders" ("DATE_")'
+            ))
+
+        for name in views:
+            if DB_BACKEND == "duckdb":
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} AS {aggregate_sql(name)}"
+                ))
+                continue
+
+            kind = _relkind(conn, name)
+            installed = kind == "v" and _relkind(conn, f"{name}_hist") == "m"
+            if kind is not None and not installed:
+                raise RuntimeError(
+                    f"{name} ya existe ({_RELKINDS.get(kind, kind)}) y no se "
+                    f"sustituye. Renómbrela a {name}{LEGACY_SUFFIX} y vuelva a instalar."
+                )
+
+            keys = ", ".join(AGGREGATE_VIEWS[name]["keys"])
+            conn.execute(text(
+                f"CREATE MATERIALIZED VIEW IF NOT EXISTS {name}_hist AS "
+                f"{_part_sql(conn, name, 'hist')}"
+            ))
+            conn.execute(text(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {name}_hist_key "
+                f"ON {name}_hist ({keys})"
+            ))
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name}_actual AS "
+                f"{_part_sql(conn, name, 'actual')}"
+            ))
+            if not installed:
+                conn.execute(text(
+                    f"CREATE VIEW {name} AS "
+                    f"SELECT * FROM {name}_hist UNION ALL SELECT * FROM {name}_actual"
+                ))
+
+
+# ==========================================================
+# REFRESCO
+# ==========================================================
+def _current_year(conn) -> int:
+    return int(conn.execute(text("SELECT EXTRACT(YEAR FROM now())")).scalar())
+
+
+def _state(conn, name: str):
+    row = conn.execute(
+        text(f"SELECT hist_year FROM {STATE_TABLE} WHERE view_name = :name"),
+        {"name": name},
+    ).first()
+    return None if row is None else row.hist_year
+
+
+def _refresh_one(conn, name: str, mode: str) -> dict:
+    """Refresca un agregado dentro de la transacción `conn`."""
+    year = _current_year(conn)
+
+    if DB_BACKEND == "duckdb":
+        conn.execute(text(f"CREATE OR REPLACE TABLE {name} AS {aggregate_sql(name)}"))
+        return {"mode": "full", "hist_year": year}
+
+    # Evita dos refrescos simultáneos del mismo agregado
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": name})
+
+    # El histórico solo se toca en modo completo o si ha cambiado el año
+    if mode == "full" or _state(conn, name) != year:
+        conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}_hist"))
+        mode = "full"
+
+    # DELETE (no TRUNCATE) para no bloquear a los lectores
+    conn.execute(text(f"DELETE FROM {name}_actual"))
+    conn.execute(text(
+        f"INSERT INTO {name}_actual {_part_sql(conn, name, 'actual')}"
+    ))
+    return {"mode": mode, "hist_year": year}
+
+
+def refresh(views=None, mode: str = "incremental") -> pd.DataFrame:
+    """
+    Refresca los agregados indicados (todos por defecto).
+    - mode="incremental": solo el año en curso (salvo cambio de año).
+    - mode="full": también el histórico.
+    Devuelve una fila por agregado con modo, duración y marca de agua.
+    """
+    if mode not in REFRESH_MODES:
+        raise ValueError(f"Modo de refresco no válido: '{mode}'")
+
+    results = []
+    for name in views or AGGREGATE_VIEWS:
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            info = _refresh_one(conn, name, mode)
+            watermark = conn.execute(text('SELECT MAX("DATE_") FROM "Orders"')).scalar()
+            row = {
+                "view_name": name,
+                "mode": info["mode"],
+                "refreshed_at": pd.Timestamp.now().to_pydatetime(),
+                "duration_s": time.perf_counter() - start,
+                "watermark": watermark,
+                "hist_year": info["hist_year"],
+            }
+            conn.execute(text(_STATE_UPSERT), row)
+
+        invalidate_tables(name)
+        logger.info("Refrescado %s (%s) en %.2f s", name, row["mode"], row["duration_s"])
+        results.append(row)
+
+    return pd.DataFrame(results)
+
+
+def run_scheduler(every_s: float, full_every_s: float = None, views=None) -> None:
+    """
+    Bucle de refresco: incremental cada `every_s` segundos y completo cada
+    `full_every_s` (si se indica). Pensado para un proceso aparte.
+    """
+    last_full = time.monotonic()
+    while True:
+        full_due = full_every_s is not None and time.monotonic() - last_full >= full_every_s
+        try:
+            refresh(views, mode="full" if full_due else "incremental")
+            if full_due:
+                last_full = time.monotonic()
+        except Exception:
+            logger.exception("Error refrescando los agregados")
+        time.sleep(every_s)
+
+
+# ==========================================================
+# MARCAS DE AGUA (para invalidar cachés)
+# ==========================================================
+def get_watermarks() -> pd.DataFrame:
+    """
+    Estado del último refresco de cada agregado. Vacío si el gestor no
+    está instalado todavía en esta base de datos.
+    """
+    try:
+        with engine.connect() as conn:
+            return pd.read_sql(text(f"SELECT * FROM {STATE_TABLE}"), conn)
+    except DBAPIError:
+        return pd.DataFrame(
+            columns=["view_name", "mode", "refreshed_at", "duration_s", "watermark", "hist_year"]
+        )
+
+
+_version = {"value": None, "checked_at": 0.0}
+
+# Versión cuando el gestor de refrescos no está instalado: los mv_* pueden
+# cambiar sin que se sepa, así que no sirve para cachés en disco.
+UNTRACKED_VERSION = "sin-refrescos"
+
+
+def _orders_fingerprint(conn) -> str:
+    """Último día y nº de filas de "Orders": cambia al cargar pedidos."""
+    row = conn.execute(text('SELECT MAX("DATE_"), COUNT(*) FROM "Orders"')).first()
+    return f"{row[0]}|{row[1]}"
+
+
+def data_version(max_age_s: float = 30) -> str:
+    """
+    Token que cambia cada vez que se refresca algún agregado o cambian los
+    pedidos de "Orders". Sirve como parte de la clave de cualquier caché
+    derivada de los datos. Se consulta a la base de datos como mucho una
+    vez cada `max_age_s` segundos. Empieza por UNTRACKED_VERSION si el
+    gestor de refrescos no está instalado.
+    """
+    now = time.monotonic()
+    if _version["value"] is None or now - _version["checked_at"] >= max_age_s:
+        df = get_watermarks()
+        refreshes = (
+            UNTRACKED_VERSION
+            if df.empty
+            else f"{df['refreshed_at'].max()}|{df['watermark'].max()}"
+        )
+        with engine.connect() as conn:
+            _version["value"] = f"{refreshes}|{_orders_fingerprint(conn)}"
+        _version["checked_at"] = now
+    return _version["value"]
+
+
+def tracked(version: str) -> bool:
+    """True si `version` procede del gestor de refrescos (apta para disco)."""
+    return not version.startswith(UNTRACKED_VERSION)
+
+
+_seen_refreshes = {}
+_last_sync = 0.0
+
+
+def sync_caches(min_interval_s: float = 30) -> list:
+    """
+    Invalida en este proceso la caché de consultas de los agregados que otro
+    proceso haya refrescado (y de "Orders" si han llegado pedidos nuevos).
+    Como mucho consulta el estado una vez cada `min_interval_s` segundos.
+    """
+    global _last_sync
+    now = time.monotonic()
+    if now - _last_sync < min_interval_s:
+        return []
+    _last_sync = now
+
+    changed = []
+    for row in get_watermarks().itertuples():
+        previous = _seen_refreshes.get(row.view_name)
+        current = (row.refreshed_at, row.watermark)
+        if previous is not None and previous != current:
+            changed.append(row.view_name)
+            if previous[1] != row.watermark:
+                changed.append("Orders")
+        _seen_refreshes[row.view_name] = current
+
+    if changed:
+        invalidate_tables(*changed)
+    return changed
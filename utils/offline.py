@@ -0,0 +1,283 @@
+import os
+import time
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from utils.schema import AGGREGATE_VIEWS, aggregate_sql
+
+
+# ==========================================================
+# BASE DE DATOS OFFLINE (DuckDB)
+# ==========================================================
+# Réplica local del esquema de producción para perfilar las páginas sin
+# red: mismas tablas, vista de RRHH y agregados mv_* (aquí como tablas).
+# Los datos son sintéticos y deterministas para una semilla dada.
+DEFAULT_PATH = os.path.join("data", "offline.duckdb")
+
+REGIONES = {
+    "Andalucía": ["Sevilla", "Málaga", "Granada", "Córdoba"],
+    "Cataluña": ["Barcelona", "Girona", "Tarragona"],
+    "Madrid": ["Madrid", "Alcalá de Henares", "Getafe"],
+    "Comunidad Valenciana": ["Valencia", "Alicante", "Castellón"],
+    "Galicia": ["A Coruña", "Vigo", "Santiago"],
+    "País Vasco": ["Bilbao", "San Sebastián", "Vitoria"],
+    "Castilla y León": ["Valladolid", "Burgos", "León", "Salamanca"],
+}
+
+CATEGORIAS = {
+    "Electrónica": ["Lumina", "Voltex", "Nexa"],
+    "Ropa": ["Alba", "Nórdica", "Trazo"],
+    "Hogar": ["Casa Viva", "Dómina"],
+    "Juguetes": ["Pequeñín", "Ludo"],
+    "Deportes": ["Ritmo", "Cumbre"],
+    "Alimentación": ["La Huerta", "Sabor", "Granja Sol"],
+}
+
+
+# ==========================================================
+# ESQUEMA
+# ==========================================================
+SCHEMA = """
+CREATE TABLE "Branches" (
+    "BRANCH_ID" INTEGER PRIMARY KEY,
+    "REGION" VARCHAR,
+    "CITY" VARCHAR,
+    "TOWN" VARCHAR
+);
+
+CREATE TABLE "Customers" (
+    "USERID" INTEGER PRIMARY KEY,
+    "NAMESURNAME" VARCHAR,
+    "REGION" VARCHAR,
+    "CITY" VARCHAR,
+    "TOWN" VARCHAR
+);
+
+CREATE TABLE "Categories" (
+    "ITEMID" INTEGER PRIMARY KEY,
+    "ITEMCODE" VARCHAR,
+    "ITEMNAME" VARCHAR,
+    "CATEGORY1" VARCHAR,
+    "BRAND" VARCHAR,
+    "UNITPRICE" DOUBLE
+);
+
+CREATE TABLE "Orders" (
+    "ORDERID" BIGINT,
+    "BRANCH_ID" INTEGER,
+    "DATE_" TIMESTAMP,
+    "USERID" INTEGER,
+    "TOTALBASKET" DOUBLE
+);
+
+CREATE TABLE "Order_Details" (
+    "ORDERDETAILID" BIGINT,
+    "ORDERID" BIGINT,
+    "ITEMID" INTEGER,
+    "AMOUNT" INTEGER,
+    "UNITPRICE" DOUBLE,
+    "TOTALPRICE" DOUBLE
+);
+
+CREATE TABLE Users (
+    email VARCHAR PRIMARY KEY,
+    password_hash VARCHAR,
+    role VARCHAR
+);
+
+CREATE VIEW vw_sales_rrhh AS
+SELECT
+    b."TOWN",
+    CAST(o."DATE_" AS DATE) AS date,
+    SUM(o."TOTALBASKET") AS daily_sales
+FROM "Orders" o
+JOIN "Branches" b ON o."BRANCH_ID" = b."BRANCH_ID"
+GROUP BY b."TOWN", CAST(o."DATE_" AS DATE);
+"""
+
+# ==========================================================
+# DIMENSIONES (pequeñas → se generan con NumPy)
+# ==========================================================
+def _branches(n: int, rng) -> pd.DataFrame:
+    ciudades = [(r, c) for r, cs in REGIONES.items() for c in cs]
+    idx = rng.integers(0, len(ciudades), n)
+    return pd.DataFrame({
+        "BRANCH_ID": np.arange(1, n + 1),
+        "REGION": [ciudades[i][0] for i in idx],
+        "CITY": [ciudades[i][1] for i in idx],
+        "TOWN": [f"{ciudades[i][1]} - Tienda {k}" for k, i in enumerate(idx, 1)],
+    })
+
+
+def _customers(n: int, rng) -> pd.DataFrame:
+    ciudades = [(r, c) for r, cs in REGIONES.items() for c in cs]
+    idx = rng.integers(0, len(ciudades), n)
+    barrio = rng.integers(1, 40, n)
+    return pd.DataFrame({
+        "USERID": np.arange(1, n + 1),
+        "NAMESURNAME": [f"Cliente {k}" for k in range(1, n + 1)],
+        "REGION": [ciudades[i][0] for i in idx],
+        "CITY": [ciudades[i][1] for i in idx],
+        "TOWN": [f"{ciudades[i][1]} - Barrio {b}" for i, b in zip(idx, barrio)],
+    })
+
+
+def _categories(n: int, rng) -> pd.DataFrame:
+    pares = [(c, m) for c, ms in CATEGORIAS.items() for m in ms]
+    idx = rng.integers(0, len(pares), n)
+    return pd.DataFrame({
+        "ITEMID": np.arange(1, n + 1),
+        "ITEMCODE": [f"IT{k:06d}" for k in range(1, n + 1)],
+        "ITEMNAME": [f"{pares[i][1]} {pares[i][0]} {k}" for k, i in enumerate(idx, 1)],
+        "CATEGORY1": [pares[i][0] for i in idx],
+        "BRAND": [pares[i][1] for i in idx],
+        "UNITPRICE": np.round(rng.lognormal(2.5, 0.8, n), 2),
+    })
+
+
+# ==========================================================
+# HECHOS (grandes → se generan dentro de DuckDB)
+# ==========================================================
+# Pseudoaleatorio determinista y paralelizable: hash(i, semilla, sal).
+# Fechas con tendencia creciente (sqrt) y más líneas por pedido en fin de
+# semana y en diciembre, para que las series tengan estacionalidad.
+_ORDERS_SQL = """
+INSERT INTO "Orders"
+WITH base AS (
+    SELECT
+        i,
+        CAST(floor($days * sqrt((hash(i, $seed, 1) % 1000000) / 1000000.0)) AS INTEGER) AS dia
+    FROM range($orders) t(i)
+)
+SELECT
+    i + 1 AS "ORDERID",
+    CAST(1 + hash(i, $seed, 2) % $branches AS INTEGER) AS "BRANCH_ID",
+    CAST($start AS TIMESTAMP)
+        + to_days(dia)
+        + to_seconds(CAST(28800 + hash(i, $seed, 3) % 46800 AS BIGINT)) AS "DATE_",
+    CAST(1 + hash(i, $seed, 4) % $customers AS INTEGER) AS "USERID",
+    NULL AS "TOTALBASKET"
+FROM base
+"""
+
+_DETAILS_SQL = """
+INSERT INTO "Order_Details"
+WITH lineas AS (
+    SELECT
+        o."ORDERID",
+        1 + hash(o."ORDERID", $seed, 5) % 3
+          + CASE WHEN dayofweek(o."DATE_") IN (0, 6) THEN 2 ELSE 0 END
+          + CASE WHEN month(o."DATE_") = 12 THEN 1 ELSE 0 END AS n_lineas
+    FROM "Orders" o
+)
+SELECT
+    l."ORDERID" * 8 + k AS "ORDERDETAILID",
+    l."ORDERID",
+    CAST(1 + hash(l."ORDERID", k, $seed, 6) % $items AS INTEGER) AS "ITEMID",
+    CAST(1 + hash(l."ORDERID", k, $seed, 7) % 4 AS INTEGER) AS "AMOUNT",
+    NULL AS "UNITPRICE",
+    NULL AS "TOTALPRICE"
+FROM lineas l, range(6) r(k)
+WHERE k < l.n_lineas
+"""
+
+_PRICES_SQL = """
+UPDATE "Order_Details" d
+SET "UNITPRICE" = c."UNITPRICE",
+    "TOTALPRICE" = round(c."UNITPRICE" * d."AMOUNT", 2)
+FROM "Categories" c
+WHERE d."ITEMID" = c."ITEMID"
+"""
+
+_BASKETS_SQL = """
+UPDATE "Orders" o
+SET "TOTALBASKET" = t.total
+FROM (
+    SELECT "ORDERID", round(SUM("TOTALPRICE"), 2) AS total
+    FROM "Order_Details"
+    GROUP BY "ORDERID"
+) t
+WHERE o."ORDERID" = t."ORDERID"
+"""
+
+
+def build_aggregates(con) -> None:
+    """(Re)crea las tablas mv_* a partir de los datos actuales."""
+    for name in AGGREGATE_VIEWS:
+        con.execute(f"CREATE OR REPLACE TABLE {name} AS {aggregate_sql(name)}")
+
+
+def generate(
+    path: str = DEFAULT_PATH,
+    orders: int = 1_000_000,
+    branches: int = 150,
+    customers: int = None,
+    items: int = 2_000,
+    start: str = "2021-01-01",
+    days: int = 3 * 365,
+    seed: int = 42,
+    admin_password: str = "admin",
+    log=print,
+) -> str:
+    """
+    Crea (sobrescribe) la base offline con datos sintéticos.
+    Escala a decenas de millones de pedidos: los hechos se generan con SQL
+    dentro de DuckDB, sin pasar filas por Python.
+    """
+    import bcrypt
+
+    customers = customers or max(1_000, orders // 25)
+    rng = np.random.default_rng(seed)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+
+    con = duckdb.connect(path)
+    try:
+        con.execute(SCHEMA)
+
+        for table, df in (
+            ("Branches", _branches(branches, rng)),
+            ("Customers", _customers(customers, rng)),
+            ("Categories", _categories(items, rng)),
+        ):
+            con.register("tmp_df", df)
+            con.execute(f'INSERT INTO "{table}" SELECT * FROM tmp_df')
+            con.unregister("tmp_df")
+
+        order_params = {
+            "orders": orders,
+            "branches": branches,
+            "customers": customers,
+            "start": start,
+            "days": days,
+            "seed": seed,
+        }
+        steps = [
+            ("pedidos", _ORDERS_SQL, order_params),
+            ("líneas de pedido", _DETAILS_SQL, {"seed": seed, "items": items}),
+            ("precios", _PRICES_SQL, None),
+            ("importes de cesta", _BASKETS_SQL, None),
+        ]
+        for label, sql, step_params in steps:
+            t0 = time.perf_counter()
+            con.execute(sql, step_params)
+            log(f"  {label}: {time.perf_counter() - t0:.1f} s")
+
+        t0 = time.perf_counter()
+        build_aggregates(con)
+        log(f"  agregados mv_*: {time.perf_counter() - t0:.1f} s")
+
+        password_hash = bcrypt.hashpw(admin_password.encode(), bcrypt.gensalt()).decode()
+        con.execute(
+            "INSERT INTO Users VALUES ($email, $hash, 'admin')",
+            {"email": "admin@admin3a.com", "hash": password_hash},
+        )
+        con.execute("CHECKPOINT")
+    finally:
+        con.close()
+
+    return path
@@ -0,0 +1,282 @@
+import logging
+import time
+
+import numpy as np
+
+from utils import forecast_store
+from utils.forecast import forecast_cache, sarima_prediction
+from utils.jobs import forecast_jobs
+from utils.calendar_features import tree_forecast
+from utils.lstm import LSTM_TIME_STEPS, lstm_forecast
+from utils.models import model_registry
+from utils.mviews import data_version
+from utils.sarima import SARIMA_SPEC, sarima_forecast, sarima_forecasts, sarima_states
+from utils.series_store import sales_store
+
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================================================
+# PREDICCIÓN DE VENTAS (tab 3 de Dirección)
+# ==========================================================
+# Las combinaciones posibles son finitas: modelos x horizontes x cada
+# selección (región, ciudad). Se precalculan todas tras cada refresco de
+# datos (precompute_grid) y la página las lee del almacén persistente;
+# lo que falte se calcula al vuelo como antes.
+MODELOS = ["SARIMA", "RANDOM FOREST", "XGBOOST", "LSTM", "LSTM_PDF"]
+HORIZONTES = [30, 90]
+
+
+# ---------------- PREDICCIÓN UNIFICADA ----------------
+TREE_MODELS = ["RANDOM FOREST", "XGBOOST"]
+
+
+def predict(modelo_sel, ts, horizonte, timings=None):
+    modelo_sel = modelo_sel.upper()
+
+    # ===== SARIMA DINÁMICO =====
+    # Ajuste síncrono (backtesting y procesos por lotes); la página usa
+    # sarima_prediction para no bloquear.
+    if modelo_sel == "SARIMA":
+        result = sarima_forecast(ts, horizonte)
+        if timings is not None:
+            timings["fit_s"] = result["fit_s"]
+        return result["pred"]
+
+    # ===== RANDOM FOREST / XGBOOST =====
+    if modelo_sel in TREE_MODELS:
+        return predict_tree_batch(modelo_sel, [ts], horizonte)[0]
+
+    # ===== LSTM / LSTM PDF =====
+    # Todo el horizonte en una llamada al bucle compilado
+    if modelo_sel in LSTM_TIME_STEPS:
+        return predict_lstm_batch(modelo_sel, [ts], horizonte)[0]
+
+
+def predict_tree_batch(modelo_id, series, horizonte):
+    """
+    Random Forest / XGBoost para varias series a la vez: matriz
+    (n_series, horizonte). Solo usan el calendario, así que la predicción
+    depende únicamente del último día de cada serie; cada fecha distinta
+    se predice una vez y todo va en una sola llamada a model.predict.
+    """
+    last = np.array([ts.index.max() for ts in series], dtype="datetime64[D]")
+    fechas, posicion = np.unique(last, return_inverse=True)
+    preds = tree_forecast(model_registry.get(modelo_id), fechas, horizonte)
+    return preds[posicion]
+
+
+def predict_lstm_batch(modelo_id, series, horizonte):
+    """Predicción LSTM de varias series a la vez: matriz (n_series, horizonte)."""
+    lstm = model_registry.get(modelo_id)
+    return lstm_forecast(
+        lstm["rollout"],
+        lstm["scaler"],
+        series,
+        LSTM_TIME_STEPS[modelo_id],
+        horizonte,
+    )
+
+
+def selecciones(store):
+    """Todas las combinaciones (región, ciudad) del selector, con sus filtros."""
+    yield "Todas", "Todas", {}
+    for region in store.members("REGION"):
+        yield region, "Todas", {"REGION": region}
+        for ciudad in store.members("CITY", REGION=region):
+            yield region, ciudad, {"REGION": region, "CITY": ciudad}
+
+
+# ---------------- CACHÉ DE PREDICCIÓN ----------------
+# Clave pequeña y estable: (modelo, versión del modelo, horizonte, región,
+# ciudad, versión de datos). La serie no se hashea: la determinan la
+# región, la ciudad y la versión de datos.
+def prediction_key(modelo_sel, horizonte, region, ciudad, version):
+    modelo_id = modelo_sel.upper()
+    modelo_version = (
+        SARIMA_SPEC if modelo_id == "SARIMA" else model_registry.version(modelo_id)
+    )
+    return (modelo_id, modelo_version, horizonte, region, ciudad, version)
+
+
+def stored_prediction(key):
+    """Predicción precalculada de `key` (memoria y, si no, almacén persistente)."""
+    pred = forecast_cache.get(key)
+    if pred is not None:
+        return pred
+
+    stored = forecast_store.load(key)
+    if stored is None:
+        return None
+    return forecast_cache.put(key, stored["pred"], stored["fit_s"], stored["predict_s"])["pred"]
+
+
+def cached_prediction(modelo_sel, horizonte, region, ciudad, version, ts):
+    """Predicción de la selección; None si el SARIMA aún se está ajustando."""
+    modelo_id = modelo_sel.upper()
+    key = prediction_key(modelo_sel, horizonte, region, ciudad, version)
+
+    pred = stored_prediction(key)
+    if pred is not None:
+        return pred
+
+    if modelo_id == "SARIMA":
+        return sarima_prediction(key, ("direccion", region, ciudad), ts, horizonte)
+
+    def compute(timings):
+        # Árboles y LSTM predicen toda la jerarquía en un solo lote y dejan
+        # en caché el resto de selecciones: cambiar de región ya no recalcula.
+        store = sales_store(version)
+        preds, por_serie = _hierarchy(modelo_id, store, horizonte)
+        for (r, c), pred in preds.items():
+            if (r, c) != (region, ciudad):
+                forecast_cache.put(key[:3] + (r, c, version), pred, predict_s=por_serie)
+
+        if (region, ciudad) not in preds:
+            return predict(modelo_sel, ts, horizonte, timings)
+        return preds[(region, ciudad)]
+
+    return forecast_cache.get_or_compute(key, compute)
+
+
+def _hierarchy(modelo_id, store, horizonte):
+    """
+    Predicción de un modelo de árboles o LSTM para todas las selecciones
+    con histórico suficiente en un solo lote:
+    ({(región, ciudad): pred}, segundos por serie).
+    """
+    minimo = LSTM_TIME_STEPS.get(modelo_id, 1)
+    lote = [
+        (r, c, store.series(**f)) for r, c, f in selecciones(store)
+        if len(store.series(**f)) >= minimo
+    ]
+    if not lote:
+        return {}, 0.0
+
+    batch = predict_lstm_batch if modelo_id in LSTM_TIME_STEPS else predict_tree_batch
+    start = time.perf_counter()
+    preds = batch(modelo_id, [s for _, _, s in lote], horizonte)
+    por_serie = (time.perf_counter() - start) / len(lote)
+    return {(r, c): pred for (r, c, _), pred in zip(lote, preds)}, por_serie
+
+
+# ==========================================================
+# PRECÁLCULO DE LA REJILLA COMPLETA
+# ==========================================================
+def precompute_grid(version, scheduler=None, modelos=MODELOS, horizontes=HORIZONTES) -> dict:
+    """
+    Calcula todas las combinaciones (modelo, horizonte, región, ciudad)
+    de la versión de datos `version` que aún no están en el almacén y las
+    guarda. Los SARIMA (lo caro) se reparten entre los procesos de
+    `scheduler`; un único ajuste por serie sirve para todos los horizontes.
+    Devuelve un resumen {modelo: nº de predicciones guardadas}.
+    """
+    scheduler = scheduler or forecast_jobs
+    store = sales_store(version)
+    sel = list(selecciones(store))
+    done = forecast_store.stored_keys(version)
+
+    def pending(modelo_id, horizonte, region, ciudad):
+        key = prediction_key(modelo_id, horizonte, region, ciudad, version)
+        return None if key in done else key
+
+    resumen = {m: 0 for m in modelos}
+
+    # 1. SARIMA: las series con un ajuste previo se avanzan aquí con los
+    # días nuevos; el resto se encola primero para que los procesos empiecen ya
+    sarima_jobs = {}
+    if "SARIMA" in modelos:
+        for region, ciudad, filtros in sel:
+            keys = {h: pending("SARIMA", h, region, ciudad) for h in horizontes}
+            keys = {h: k for h, k in keys.items() if k is not None}
+            ts = store.series(**filtros)
+            if not keys or ts.empty:
+                continue
+
+            serie = ("direccion", region, ciudad)
+            rolled = sarima_states.forecast(serie, ts, sorted(keys))
+            if rolled is not None:
+                resumen["SARIMA"] += forecast_store.save(
+                    (key, rolled["preds"][h], 0.0, rolled["predict_s"] / len(keys))
+                    for h, key in keys.items()
+                )
+                continue
+
+            job_key = ("PRECALCULO", SARIMA_SPEC, version, region, ciudad)
+            scheduler.submit(job_key, sarima_forecasts, ts, sorted(keys))
+            sarima_jobs[job_key] = (serie, keys)
+
+    # 2. El resto de modelos, en este proceso mientras tanto
+    for modelo_id in modelos:
+        if modelo_id == "SARIMA":
+            continue
+        try:
+            entries = _grid_in_process(modelo_id, horizontes, store, sel, pending)
+        except Exception:
+            logger.exception("Error precalculando %s", modelo_id)
+            continue
+        resumen[modelo_id] += forecast_store.save(entries)
+
+    # 3. Recoger los SARIMA según terminan
+    for job_key, (serie, keys) in sarima_jobs.items():
+        job = scheduler.wait(job_key)
+        scheduler.forget(job_key)
+        if job is None or job["state"] != "done":
+            logger.warning("SARIMA %s sin precalcular: %s", serie[1:], job and job["error"])
+            continue
+        result = job["result"]
+        sarima_states.put(serie, result["state"])
+        por_horizonte = result["predict_s"] / len(keys)
+        resumen["SARIMA"] += forecast_store.save(
+            (key, result["preds"][h], result["fit_s"], por_horizonte)
+            for h, key in keys.items()
+        )
+
+    forecast_store.prune()
+    return resumen
+
+
+def _grid_in_process(modelo_id, horizontes, store, sel, pending) -> list:
+    """
+    (key, pred, fit_s, predict_s) de un modelo para cada selección y
+    horizonte. Se predice una vez el horizonte mayor para toda la jerarquía
+    y se recorta: ni los árboles ni el bucle recursivo de los LSTM dependen
+    del horizonte pedido.
+    """
+    keys = {
+        (h, r, c): pending(modelo_id, h, r, c)
+        for h in horizontes for r, c, _ in sel
+    }
+    if all(key is None for key in keys.values()):
+        return []
+
+    preds, por_serie = _hierarchy(modelo_id, store, max(horizontes))
+    return [
+        (keys[(h, r, c)], pred[:h], 0.0, por_serie)
+        for (r, c), pred in preds.items()
+        for h in horizontes
+        if keys[(h, r, c)] is not None
+    ]
+
+
+def run_watcher(every_s: float, scheduler=None, modelos=MODELOS) -> None:
+    """
+    Bucle del proceso de precálculo: cada `every_s` segundos mira la versión
+    de datos y, si ha cambiado (hay un refresco nuevo), calcula la rejilla.
+    """
+    last = None
+    while True:
+        try:
+            version = data_version(max_age_s=0)
+            if version != last:
+                start = time.perf_counter()
+                resumen = precompute_grid(version, scheduler, modelos)
+                logger.info(
+                    "Rejilla de predicciones %s en %.1f s: %s",
+                    version, time.perf_counter() - start, resumen,
+                )
+                last = version
+        except Exception:
+            logger.exception("Error precalculando la rejilla de predicciones")
+        time.sleep(every_s)
@@ -0,0 +1,243 @@
+import logging
+import os
+import threading
+import time
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+from statsmodels.tsa.statespace.initialization import Initialization
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================================================
+# SARIMA (el ajuste completo se ejecuta en los procesos de utils.jobs)
+# ==========================================================
+SARIMA_ORDER = (2, 1, 2)
+SARIMA_SEASONAL_ORDER = (1, 1, 1, 7)
+
+# SARIMA se ajusta al vuelo: su "versión" es su especificación
+SARIMA_SPEC = f"order={SARIMA_ORDER} seasonal={SARIMA_SEASONAL_ORDER}"
+
+
+def _model(endog, enforce: bool):
+    return SARIMAX(
+        endog,
+        order=SARIMA_ORDER,
+        seasonal_order=SARIMA_SEASONAL_ORDER,
+        enforce_stationarity=enforce,
+        enforce_invertibility=enforce,
+    )
+
+
+def _clip(pred, ts):
+    # Clipping para evitar valores locos
+    return pred.clip(0, float(np.max(ts)) * 3)
+
+
+def sarima_forecasts(ts, horizons, enforce: bool = False) -> dict:
+    """
+    Ajusta un SARIMA a la serie diaria `ts` una sola vez y predice cada
+    horizonte de `horizons` (los primeros días de un horizonte largo son
+    los de uno corto: se predice el mayor y se recorta).
+    - enforce: fuerza estacionariedad e invertibilidad (más estable con
+      series cortas).
+    La predicción se recorta a [0, 3 × máximo histórico].
+    Devuelve {"preds": {horizonte: array}, "fit_s", "predict_s", "state"};
+    `state` permite avanzar el ajuste con datos nuevos (sarima_states).
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        start = time.perf_counter()
+        res = _model(ts, enforce).fit(disp=False)
+        fit_s = time.perf_counter() - start
+        pred = _clip(np.asarray(res.forecast(max(horizons))), ts)
+
+    state = {
+        "spec": SARIMA_SPEC,
+        "enforce": enforce,
+        "params": np.asarray(res.params),
+        "state": res.predicted_state[:, -1].copy(),
+        "state_cov": res.predicted_state_cov[:, :, -1].copy(),
+        "last_date": ts.index[-1],
+        "tail": np.asarray(ts, dtype="float64")[-_TAIL:].copy(),
+        "fitted_at": time.time(),
+        "new_obs": 0,
+        "drift_sum": 0.0,
+        "drift_n": 0,
+    }
+    return {
+        "preds": {h: pred[:h] for h in horizons},
+        "fit_s": fit_s,
+        "predict_s": time.perf_counter() - start - fit_s,
+        "state": state,
+    }
+
+
+def sarima_forecast(ts, horizon: int, enforce: bool = False) -> dict:
+    """Un solo horizonte: {"pred", "fit_s", "predict_s", "state"}."""
+    result = sarima_forecasts(ts, [horizon], enforce)
+    return {
+        "pred": result["preds"][horizon],
+        "fit_s": result["fit_s"],
+        "predict_s": result["predict_s"],
+        "state": result["state"],
+    }
+
+
+# ==========================================================
+# ACTUALIZACIÓN INCREMENTAL (sin reajustar)
+# ==========================================================
+# Con un ajuste previo de la misma serie, los días nuevos solo se pasan por
+# el filtro de Kalman con los parámetros ya estimados, partiendo del estado
+# al final del ajuste (lo mismo que hace MLEResults.extend): milisegundos
+# en lugar de una estimación por máxima verosimilitud. Se reajusta solo:
+# - cada SARIMA_REFIT_MAX_AGE_S segundos o SARIMA_REFIT_MAX_NEW_OBS días
+#   nuevos acumulados (reajuste programado),
+# - si el error de predicción a un paso de los días nuevos, normalizado por
+#   su varianza, supera de media SARIMA_DRIFT_RATIO (deriva),
+# - si el histórico ya conocido ha cambiado.
+SARIMA_REFIT_MAX_AGE_S = float(os.getenv("SARIMA_REFIT_MAX_AGE_S", str(7 * 24 * 3600)))
+SARIMA_REFIT_MAX_NEW_OBS = int(os.getenv("SARIMA_REFIT_MAX_NEW_OBS", "28"))
+SARIMA_DRIFT_RATIO = float(os.getenv("SARIMA_DRIFT_RATIO", "3"))
+SARIMA_DRIFT_MIN_OBS = 7
+SARIMA_STATES_MAX = int(os.getenv("SARIMA_STATES_MAX", "2000"))
+
+# Últimos valores que se comparan para comprobar que el histórico no cambió
+_TAIL = 14
+
+
+def refit_reason(state, ts, enforce: bool = False):
+    """None si `state` puede avanzarse con `ts`; si no, el motivo para reajustar."""
+    if state is None:
+        return "sin_ajuste"
+    if state["spec"] != SARIMA_SPEC or state["enforce"] != enforce:
+        return "especificacion"
+    if time.time() - state["fitted_at"] > SARIMA_REFIT_MAX_AGE_S:
+        return "programado"
+
+    # El último día del ajuste tiene que seguir en la serie, con los mismos
+    # valores hasta él (vale también para ventanas móviles como la de RRHH)
+    pos = ts.index.searchsorted(state["last_date"])
+    tail = state["tail"]
+    if pos >= len(ts) or ts.index[pos] != state["last_date"] or pos + 1 < len(tail):
+        return "historico"
+    if not np.array_equal(np.asarray(ts, dtype="float64")[pos + 1 - len(tail):pos + 1], tail):
+        return "historico"
+
+    if state["new_obs"] + len(ts) - pos - 1 > SARIMA_REFIT_MAX_NEW_OBS:
+        return "programado"
+    return None
+
+
+def sarima_update(state, ts, horizons) -> dict:
+    """
+    Avanza `state` con los días de `ts` posteriores a su último día y
+    predice cada horizonte. Mismo formato que sarima_forecasts (fit_s = 0).
+    """
+    start = time.perf_counter()
+    values = np.asarray(ts, dtype="float64")
+    new = values[ts.index.searchsorted(state["last_date"], "right"):]
+    horizon = max(horizons)
+
+    # Los días a predecir van como observaciones ausentes: el filtro da
+    # en ellos la predicción a varios pasos.
+    endog = np.concatenate([new, np.full(horizon, np.nan)])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model = _model(endog, state["enforce"])
+        model.ssm.initialization = Initialization(
+            model.k_states, "known",
+            constant=state["state"], stationary_cov=state["state_cov"],
+        )
+        res = model.filter(state["params"])
+
+    n = len(new)
+    pred = _clip(res.forecasts[0, n:], ts)
+    errors = res.forecasts_error[0, :n] ** 2 / res.forecasts_error_cov[0, 0, :n]
+
+    updated = {
+        **state,
+        "state": res.predicted_state[:, n].copy(),
+        "state_cov": res.predicted_state_cov[:, :, n].copy(),
+        "last_date": ts.index[-1],
+        "tail": values[-_TAIL:].copy(),
+        "new_obs": state["new_obs"] + n,
+        "drift_sum": state["drift_sum"] + float(errors.sum()),
+        "drift_n": state["drift_n"] + n,
+    }
+    return {
+        "preds": {h: pred[:h] for h in horizons},
+        "fit_s": 0.0,
+        "predict_s": time.perf_counter() - start,
+        "state": updated,
+    }
+
+
+def drifted(state) -> bool:
+    """True si los errores de los días añadidos indican que el ajuste ya no vale."""
+    return (
+        state["drift_n"] >= SARIMA_DRIFT_MIN_OBS
+        and state["drift_sum"] / state["drift_n"] > SARIMA_DRIFT_RATIO
+    )
+
+
+class SarimaStates:
+    """
+    Último ajuste de cada serie (clave libre, p. ej. ("direccion", región,
+    ciudad)), acotado a `max_entries` (se olvida el usado hace más tiempo).
+    Cada estado ocupa unos pocos KB: parámetros y estado del filtro.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"updates": 0, "refits": {}}
+
+    def put(self, key, state) -> None:
+        with self._lock:
+            self._states[key] = state
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_entries:
+                self._states.popitem(last=False)
+
+    def forecast(self, key, ts, horizons, enforce: bool = False):
+        """
+        Predicción avanzando el ajuste guardado de `key` con los días nuevos
+        de `ts`, o None si hace falta un ajuste completo.
+        """
+        with self._lock:
+            state = self._states.get(key)
+
+        reason = refit_reason(state, ts, enforce)
+        if reason is None:
+            result = sarima_update(state, ts, horizons)
+            if drifted(result["state"]):
+                reason = "deriva"
+
+        if reason is not None:
+            with self._lock:
+                self._stats["refits"][reason] = self._stats["refits"].get(reason, 0) + 1
+            if state is not None:
+                logger.info("SARIMA %s: reajuste completo (%s)", key, reason)
+            return None
+
+        self.put(key, result["state"])
+        with self._lock:
+            self._stats["updates"] += 1
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "series": len(self._states),
+                "updates": self._stats["updates"],
+                "refits": dict(self._stats["refits"]),
+            }
+
+
+sarima_states = SarimaStates(SARIMA_STATES_MAX)
@@ -0,0 +1,110 @@
+# ==========================================================
+# DEFINICIÓN DE LOS AGREGADOS mv_*
+# ==========================================================
+# SQL válido en Postgres y en DuckDB. `{filtro}` es un predicado sobre
+# o."DATE_" que permite construir el agregado por tramos (histórico /
+# año en curso); con "TRUE" se construye completo. `keys` son las columnas
+# que identifican una fila (índice único para REFRESH ... CONCURRENTLY).
+# Los agregados `legacy` ya existían en producción: en Postgres su SQL se
+# toma de la vista real (ver utils.mviews) y el de aquí solo construye la
+# base de datos offline. mv_ventas_diarias es nuevo y se define aquí.
+AGGREGATE_VIEWS = {
+    # Cubo diario (día x tienda, con región, ciudad y pueblo): KPIs y
+    # comparativas filtran por rangos de fechas sobre él, así que su coste
+    # depende de días x tiendas y no del número de pedidos. El ticket medio
+    # se obtiene como SUM(total_ventas) / SUM(num_cestas) para que sea
+    # exacto al agregar.
+    "mv_ventas_diarias": {
+        "keys": ["dia", '"BRANCH_ID"'],
+        "sql": """
+        SELECT
+            CAST(o."DATE_" AS DATE) AS dia,
+            b."BRANCH_ID",
+            b."REGION",
+            b."CITY",
+            b."TOWN",
+            SUM(o."TOTALBASKET") AS total_ventas,
+            COUNT(o."ORDERID") AS num_pedidos,
+            COUNT(o."TOTALBASKET") AS num_cestas,
+            MIN(o."TOTALBASKET") AS cesta_min,
+            MAX(o."TOTALBASKET") AS cesta_max
+        FROM "Orders" o
+        JOIN "Branches" b ON o."BRANCH_ID" = b."BRANCH_ID"
+        WHERE {filtro}
+        GROUP BY 1, 2, 3, 4, 5
+        """,
+    },
+    "mv_evolucion_mensual": {
+        "legacy": True,
+        "keys": ["anio", "mes", '"REGION"'],
+        "sql": """
+        SELECT
+            CAST(EXTRACT(YEAR FROM o."DATE_") AS INTEGER) AS anio,
+            CAST(EXTRACT(MONTH FROM o."DATE_") AS INTEGER) AS mes,
+            b."REGION",
+            SUM(o."TOTALBASKET") AS total_ventas,
+            COUNT(o."ORDERID") AS num_pedidos,
+            AVG(o."TOTALBASKET") AS ticket_medio
+        FROM "Orders" o
+        JOIN "Branches" b ON o."BRANCH_ID" = b."BRANCH_ID"
+        WHERE {filtro}
+        GROUP BY 1, 2, 3
+        """,
+    },
+    "mv_ventas_mapa": {
+        "legacy": True,
+        "keys": ["anio", '"REGION"', '"CITY"'],
+        "sql": """
+        SELECT
+            CAST(EXTRACT(YEAR FROM o."DATE_") AS INTEGER) AS anio,
+            b."REGION",
+            b."CITY",
+            SUM(o."TOTALBASKET") AS total_ventas,
+            COUNT(o."ORDERID") AS num_pedidos,
+            AVG(o."TOTALBASKET") AS ticket_medio
+        FROM "Orders" o
+        JOIN "Branches" b ON o."BRANCH_ID" = b."BRANCH_ID"
+        WHERE {filtro}
+        GROUP BY 1, 2, 3
+        """,
+    },
+    "mv_top_productos": {
+        "legacy": True,
+        "keys": ["anio", '"ITEMNAME"', "categoria", "marca"],
+        "sql": """
+        SELECT
+            CAST(EXTRACT(YEAR FROM o."DATE_") AS INTEGER) AS anio,
+            c."ITEMNAME",
+            c."CATEGORY1" AS categoria,
+            c."BRAND" AS marca,
+            SUM(d."TOTALPRICE") AS ingresos,
+            SUM(d."AMOUNT") AS unidades
+        FROM "Order_Details" d
+        JOIN "Orders" o ON d."ORDERID" = o."ORDERID"
+        JOIN "Categories" c ON d."ITEMID" = c."ITEMID"
+        WHERE {filtro}
+        GROUP BY 1, 2, 3, 4
+        """,
+    },
+    "mv_top_categorias": {
+        "legacy": True,
+        "keys": ["anio", "categoria"],
+        "sql": """
+        SELECT
+            CAST(EXTRACT(YEAR FROM o."DATE_") AS INTEGER) AS anio,
+            c."CATEGORY1" AS categoria,
+            SUM(d."TOTALPRICE") AS ingresos,
+            SUM(d."AMOUNT") AS unidades
+        FROM "Order_Details" d
+        JOIN "Orders" o ON d."ORDERID" = o."ORDERID"
+        JOIN "Categories" c ON d."ITEMID" = c."ITEMID"
+        WHERE {filtro}
+        GROUP BY 1, 2
+        """,
+    },
+}
+
+
+def aggregate_sql(name: str, filtro: str = "TRUE") -> str:
+    """SELECT del agregado `name` restringido por `filtro`."""
+    return AGGREGATE_VIEWS[name]["sql"].format(filtro=filtro)
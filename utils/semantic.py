@@ -0,0 +1,210 @@
+# ==========================================================
+# CAPA SEMÁNTICA: ENRUTADO AL AGREGADO MÁS BARATO
+# ==========================================================
+# Cada fuente declara qué dimensiones y métricas sabe servir y cómo se
+# re-agregan. Una petición (métricas, dimensiones, filtros) se envía a la
+# primera fuente de la lista que pueda responderla; están ordenadas de
+# menos a más filas, así que la última de cada hecho es la tabla cruda.
+# La granularidad temporal se pide como dimensión: "anio", "mes" o "dia".
+
+_ANIO_DIA = "CAST(EXTRACT(YEAR FROM dia) AS INTEGER)"
+_MES_DIA = "CAST(EXTRACT(MONTH FROM dia) AS INTEGER)"
+_ANIO_RAW = 'CAST(EXTRACT(YEAR FROM o."DATE_") AS INTEGER)'
+_MES_RAW = 'CAST(EXTRACT(MONTH FROM o."DATE_") AS INTEGER)'
+
+# Los agregados mensual y anual no guardan el nº de cestas con importe:
+# su ticket medio se pondera por nº de pedidos (todo pedido tiene cesta).
+_VENTAS_ROLLUP = {
+    "total_ventas": "SUM(total_ventas)",
+    "num_pedidos": "SUM(num_pedidos)",
+    "ticket_medio": "SUM(total_ventas) / NULLIF(SUM(num_pedidos), 0)",
+}
+
+SOURCES = [
+    # ---------------- VENTAS (cabecera de pedido) ----------------
+    {
+        "name": "mv_ventas_mapa",
+        "fact": "ventas",
+        "from": "mv_ventas_mapa",
+        "dims": {"anio": "anio", "REGION": '"REGION"', "CITY": '"CITY"'},
+        "metrics": _VENTAS_ROLLUP,
+    },
+    {
+        "name": "mv_evolucion_mensual",
+        "fact": "ventas",
+        "from": "mv_evolucion_mensual",
+        "dims": {"anio": "anio", "mes": "mes", "REGION": '"REGION"'},
+        "metrics": _VENTAS_ROLLUP,
+    },
+    {
+        "name": "mv_ventas_diarias",
+        "fact": "ventas",
+        "from": "mv_ventas_diarias",
+        "date": "dia",
+        "dims": {
+            "anio": _ANIO_DIA,
+            "mes": _MES_DIA,
+            "dia": "dia",
+            "REGION": '"REGION"',
+            "CITY": '"CITY"',
+            "TOWN": '"TOWN"',
+            "BRANCH_ID": '"BRANCH_ID"',
+        },
+        "metrics": {
+            "total_ventas": "SUM(total_ventas)",
+            "num_pedidos": "SUM(num_pedidos)",
+            "ticket_medio": "SUM(total_ventas) / NULLIF(SUM(num_cestas), 0)",
+        },
+    },
+    {
+        "name": "orders",
+        "fact": "ventas",
+        "from": '"Orders" o JOIN "Branches" b ON o."BRANCH_ID" = b."BRANCH_ID"',
+        "date": 'o."DATE_"',
+        "dims": {
+            "anio": _ANIO_RAW,
+            "mes": _MES_RAW,
+            "dia": 'CAST(o."DATE_" AS DATE)',
+            "REGION": 'b."REGION"',
+            "CITY": 'b."CITY"',
+            "TOWN": 'b."TOWN"',
+            "BRANCH_ID": 'b."BRANCH_ID"',
+        },
+        "metrics": {
+            "total_ventas": 'SUM(o."TOTALBASKET")',
+            "num_pedidos": 'COUNT(o."ORDERID")',
+            "ticket_medio": 'AVG(o."TOTALBASKET")',
+        },
+    },
+    # ---------------- PRODUCTOS (líneas de pedido) ----------------
+    {
+        "name": "mv_top_categorias",
+        "fact": "productos",
+        "from": "mv_top_categorias",
+        "dims": {"anio": "anio", "categoria": "categoria"},
+        "metrics": {"ingresos": "SUM(ingresos)", "unidades": "SUM(unidades)"},
+    },
+    {
+        "name": "mv_top_productos",
+        "fact": "productos",
+        "from": "mv_top_productos",
+        "dims": {
+            "anio": "anio",
+            "ITEMNAME": '"ITEMNAME"',
+            "categoria": "categoria",
+            "marca": "marca",
+        },
+        "metrics": {"ingresos": "SUM(ingresos)", "unidades": "SUM(unidades)"},
+    },
+    {
+        "name": "order_details",
+        "fact": "productos",
+        "from": (
+            '"Order_Details" d '
+            'JOIN "Orders" o ON d."ORDERID" = o."ORDERID" '
+            'JOIN "Categories" c ON d."ITEMID" = c."ITEMID" '
+            'JOIN "Branches" b ON o."BRANCH_ID" = b."BRANCH_ID"'
+        ),
+        "date": 'o."DATE_"',
+        "dims": {
+            "anio": _ANIO_RAW,
+            "mes": _MES_RAW,
+            "dia": 'CAST(o."DATE_" AS DATE)',
+            "ITEMNAME": 'c."ITEMNAME"',
+            "categoria": 'c."CATEGORY1"',
+            "marca": 'c."BRAND"',
+            "REGION": 'b."REGION"',
+            "CITY": 'b."CITY"',
+        },
+        "metrics": {"ingresos": 'SUM(d."TOTALPRICE")', "unidades": 'SUM(d."AMOUNT")'},
+    },
+]
+
+# Filtros admitidos: clave del parámetro -> (dimensión que necesita, tipo).
+# - "year": año exacto. En fuentes diarias o crudas se traduce a un rango
+#   de fechas (aprovecha el índice) en lugar de EXTRACT(YEAR ...).
+# - "region": patrón ILIKE; con valor None no filtra (el SQL es el mismo,
+#   así la sentencia preparada sirve para ambos casos).
+# - "regiones": lista de regiones exactas.
+FILTERS = {
+    "year": ("anio", "year"),
+    "region": ("REGION", "ilike"),
+    "regiones": ("REGION", "any"),
+}
+
+
+# ==========================================================
+# ENRUTADO
+# ==========================================================
+def route(metrics, dimensions=(), filters=()) -> dict:
+    """
+    Fuente más barata que tiene todas las métricas, dimensiones y columnas
+    de filtro pedidas. ValueError si ninguna puede responder.
+    """
+    unknown = [f for f in filters if f not in FILTERS]
+    if unknown:
+        raise ValueError(f"Filtros no soportados: {', '.join(unknown)}")
+
+    needed = set(dimensions) | {FILTERS[f][0] for f in filters}
+    for source in SOURCES:
+        if set(metrics) <= source["metrics"].keys() and needed <= source["dims"].keys():
+            return source
+
+    raise ValueError(
+        f"Ninguna fuente sirve métricas {list(metrics)} por {sorted(needed)}"
+    )
+
+
+def _where(source: dict, filters) -> list:
+    clauses = []
+    for key in filters:
+        dim, kind = FILTERS[key]
+        column = source["dims"][dim]
+        if kind == "year" and "date" in source:
+            date = source["date"]
+            clauses.append(
+                f"{date} >= make_date(:{key}, 1, 1) AND {date} < make_date(:{key} + 1, 1, 1)"
+            )
+        elif kind == "year":
+            clauses.append(f"{column} = :{key}")
+        elif kind == "ilike":
+            clauses.append(f"(CAST(:{key} AS text) IS NULL OR {column} ILIKE :{key})")
+        else:
+            clauses.append(f"{column} = ANY(:{key})")
+    return clauses
+
+
+def build_query(metrics, dimensions=(), filters=(), order_by=(), limit=None):
+    """
+    SQL para la petición sobre la fuente elegida por route().
+    - order_by: columnas de salida; con "-" delante, descendente.
+    Devuelve (sql, nombre_de_la_fuente).
+    """
+    source = route(metrics, dimensions, filters)
+
+    select = [f'{source["dims"][d]} AS "{d}"' for d in dimensions]
+    select += [f'{source["metrics"][m]} AS "{m}"' for m in metrics]
+
+    sql = f"SELECT\n    {', '.join(select)}\nFROM {source['from']}"
+    where = _where(source, filters)
+    if where:
+        sql += "\nWHERE " + "\nAND ".join(where)
+    if dimensions:
+        sql += "\nGROUP BY " + ", ".join(str(i) for i in range(1, len(dimensions) + 1))
+    if order_by:
+        order = [f'"{c[1:]}" DESC' if c.startswith("-") else f'"{c}"' for c in order_by]
+        sql += "\nORDER BY " + ", ".join(order)
+    if limit is not None:
+        sql += f"\nLIMIT {int(limit)}"
+
+    return sql, source["name"]
+
+
+def semantic_query(name, metrics, dimensions=(), filters=None, order_by=(), limit=None):
+    """
+    Petición lista para run_query/run_queries: (sql, params, sentencia).
+    El nombre de la sentencia preparada incluye la fuente elegida.
+    """
+    filters = filters or {}
+    sql, source = build_query(metrics, dimensions, filters, order_by, limit)
+    return sql, filters, f"{name}_{source}"
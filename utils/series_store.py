@@ -0,0 +1,210 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils.db import persistent, run_query
+from utils.semantic import semantic_query
+
+
+# ==========================================================
+# ALMACÉN DE SERIES DIARIAS (solo lectura)
+# ==========================================================
+class SeriesStore:
+    """
+    Series diarias ya construidas para cada clave de cada agrupación, p. ej.
+    () -> total, ("REGION",) -> por región, ("REGION", "CITY") -> por ciudad.
+    Cada serie está en arrays contiguos ordenados por fecha, con los
+    índices de cada día de la semana precalculados, de modo que:
+    - series(...) es una consulta a un diccionario,
+    - between(...) y same_weekday(...) son búsquedas binarias.
+    """
+
+    def __init__(self, df: pd.DataFrame, groupings, date="date", value="daily_sales"):
+        self._value = value
+        self._series = {}
+        self._weekdays = {}
+        self._members = {}
+        self._totals = {}
+
+        columns = list(dict.fromkeys(c for g in groupings for c in g))
+        df = df[columns + [date]].assign(**{value: df[value].astype("float64")})
+        for grouping in groupings:
+            self._index(df, tuple(grouping), date, value)
+
+    def _index(self, df, grouping, date, value):
+        """Construye las series de una agrupación con un único groupby."""
+        daily = df.groupby(list(grouping) + [date], observed=True, sort=True)[value].sum()
+
+        if grouping:
+            codes = daily.index.droplevel(date)
+            bounds = np.flatnonzero(~codes.duplicated()).tolist() + [len(daily)]
+            pieces = [
+                (codes[start] if len(grouping) > 1 else (codes[start],), start, end)
+                for start, end in zip(bounds[:-1], bounds[1:])
+            ]
+        else:
+            pieces = [((), 0, len(daily))]
+
+        dates = daily.index.get_level_values(date)
+        values = daily.to_numpy()
+        for members, start, end in pieces:
+            key = tuple(sorted(zip(grouping, members)))
+            ts = pd.Series(
+                values[start:end].copy(),
+                index=pd.DatetimeIndex(dates[start:end], name="date"),
+                name=value,
+            )
+            ts.values.flags.writeable = False
+            weekday = ts.index.weekday.to_numpy()
+
+            self._series[key] = ts
+            self._weekdays[key] = [np.flatnonzero(weekday == d) for d in range(7)]
+            self._totals[key] = float(ts.sum())
+            for column, member in zip(grouping, members):
+                parent = tuple(kv for kv in key if kv[0] != column)
+                self._members.setdefault((column, parent), set()).add(member)
+
+    # ------------------------------------------------------
+    # CONSULTAS
+    # ------------------------------------------------------
+    @staticmethod
+    def _key(filters: dict):
+        return tuple(sorted(filters.items()))
+
+    def series(self, **filters) -> pd.Series:
+        """
+        Serie diaria de la clave, p. ej. series(REGION="Madrid").
+        Solo días con ventas. Vacía si la clave no existe.
+        """
+        ts = self._series.get(self._key(filters))
+        if ts is None:
+            empty = pd.DatetimeIndex([], name="date")
+            return pd.Series(dtype="float64", index=empty, name=self._value)
+        return ts
+
+    def between(self, start=None, end=None, **filters) -> pd.Series:
+        """Tramo [start, end] de la serie (ambos incluidos)."""
+        ts = self.series(**filters)
+        dates = ts.index.values
+        lo, hi = 0, len(dates)
+        if start is not None:
+            lo = dates.searchsorted(np.datetime64(pd.Timestamp(start)), "left")
+        if end is not None:
+            hi = dates.searchsorted(np.datetime64(pd.Timestamp(end)), "right")
+        return ts.iloc[lo:hi]
+
+    def same_weekday(self, date, n: int = 5, **filters) -> pd.Series:
+        """Últimos `n` días anteriores a `date` que caen en su mismo día de la semana."""
+        key = self._key(filters)
+        ts = self.series(**filters)
+        if ts.empty:
+            return ts
+
+        date = pd.Timestamp(date)
+        before = ts.index.values.searchsorted(np.datetime64(date), "left")
+        positions = self._weekdays[key][date.weekday()]
+        k = positions.searchsorted(before, "left")
+        return ts.iloc[positions[max(0, k - n):k]]
+
+    def members(self, column: str, **filters) -> list:
+        """Valores de `column` dentro de los filtros dados (p. ej. ciudades de una región)."""
+        return sorted(self._members.get((column, self._key(filters)), ()))
+
+    def totals(self, column: str, **filters) -> pd.Series:
+        """Suma de todo el histórico para cada valor de `column`."""
+        members = self.members(column, **filters)
+        return pd.Series(
+            [self._totals[self._key({**filters, column: m})] for m in members],
+            index=pd.Index(members, name=column),
+            name="total_sales",
+        )
+
+
+# ==========================================================
+# ALMACÉN DE VENTAS (compartido por todo el proceso)
+# ==========================================================
+# Un almacén por versión de datos; se guardan los dos últimos de cada tipo
+# para que las sesiones abiertas durante un refresco sigan funcionando.
+SALES_GROUPINGS = [(), ("REGION",), ("REGION", "CITY"), ("TOWN",)]
+
+_stores = OrderedDict()
+_stores_lock = threading.Lock()
+
+
+@persistent("ventas_diarias_tienda")
+def load_daily_sales(version):
+    """
+    Ventas por (día, región, ciudad, pueblo) agregadas en la base de datos.
+    Región, ciudad y pueblo como category y ventas en float32.
+    """
+    query, params, nombre = semantic_query(
+        "ventas_diarias_tienda",
+        ["total_ventas"],
+        ["dia", "REGION", "CITY", "TOWN"],
+        order_by=["dia"],
+    )
+    df = run_query(query, params, nombre, fetch="copy")
+    return pd.DataFrame({
+        "date": pd.to_datetime(df["dia"]).astype("datetime64[ns]"),
+        "REGION": df["REGION"].astype("category"),
+        "CITY": df["CITY"].astype("category"),
+        "TOWN": df["TOWN"].astype("category"),
+        "daily_sales": df["total_ventas"].astype("float32"),
+    })
+
+
+def _cached_store(name: str, version, build) -> SeriesStore:
+    """Almacén `name` para `version`: se construye una vez con build(version)."""
+    with _stores_lock:
+        stores = _stores.setdefault(name, OrderedDict())
+        store = stores.get(version)
+        if store is None:
+            store = build(version)
+            stores[version] = store
+            while len(stores) > 2:
+                stores.popitem(last=False)
+        stores.move_to_end(version)
+        return store
+
+
+def sales_store(version) -> SeriesStore:
+    """Almacén de series de ventas para `version` (se construye una vez)."""
+    return _cached_store(
+        "ventas", version,
+        lambda v: SeriesStore(load_daily_sales(v), SALES_GROUPINGS),
+    )
+
+
+# ==========================================================
+# ALMACÉN DE RRHH (vw_sales_rrhh)
+# ==========================================================
+# La planificación de personal se basa en las ventas diarias por pueblo de
+# vw_sales_rrhh, como siempre; solo cambia que la serie se construye una
+# vez por versión de datos y la comparten todas las sesiones.
+@persistent("ventas_rrhh")
+def load_rrhh_sales(version):
+    """Ventas diarias por pueblo de vw_sales_rrhh (pueblo como category)."""
+    df = run_query(
+        """
+        SELECT "TOWN", date, daily_sales
+        FROM vw_sales_rrhh
+        ORDER BY date
+        """,
+        name="load_data_rrhh",
+        fetch="copy",
+    )
+    return pd.DataFrame({
+        "date": pd.to_datetime(df["date"]).astype("datetime64[ns]"),
+        "TOWN": df["TOWN"].astype("category"),
+        "daily_sales": df["daily_sales"].astype("float64"),
+    })
+
+
+def rrhh_store(version) -> SeriesStore:
+    """Almacén de series por pueblo de vw_sales_rrhh para `version`."""
+    return _cached_store(
+        "rrhh", version,
+        lambda v: SeriesStore(load_rrhh_sales(v), [("TOWN",)]),
+    )
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# ==========================================================
+# CACHÉ EN DISCO (PARQUET)
+# ==========================================================
+class SnapshotCache:
+    """
+    Guarda DataFrames como Parquet comprimido en un directorio local para
+    que sobrevivan a reinicios y despliegues. Las lecturas usan memory map.
+    - max_bytes: tamaño total máximo; se expulsa lo menos usado.
+    - max_age_s: antigüedad máxima desde que se escribió cada fichero.
+    Es segura entre procesos: cada escritura es un rename atómico.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_age_s: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(*parts) -> str:
+        """Clave estable a partir de consulta, parámetros y versión de datos."""
+        return hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.parquet")
+
+    # ------------------------------------------------------
+    # LECTURA / ESCRITURA
+    # ------------------------------------------------------
+    def load(self, key: str, max_age_s: float = None):
+        """
+        DataFrame guardado para `key`, o None si no existe o ha caducado.
+        - max_age_s: antigüedad máxima para esta lectura (nunca más que la
+          del almacén); lo más antiguo no se devuelve, pero se conserva.
+        """
+        path = self._path(key)
+        max_age_s = self.max_age_s if max_age_s is None else min(max_age_s, self.max_age_s)
+        try:
+            info = os.stat(path)
+            age = time.time() - info.st_mtime
+            if age > self.max_age_s:
+                os.remove(path)
+                raise FileNotFoundError(path)
+            if age > max_age_s:
+                raise FileNotFoundError(path)
+
+            df = pq.read_table(path, memory_map=True).to_pandas()
+            # atime = último uso (para LRU); mtime = fecha de escritura
+            os.utime(path, (time.time(), info.st_mtime))
+        except (FileNotFoundError, pa.ArrowInvalid):
+            self._count("misses")
+            return None
+
+        self._count("hits")
+        return df
+
+    def save(self, key: str, df: pd.DataFrame) -> None:
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_table(table, tmp, compression="zstd")
+        os.replace(tmp, path)
+        self._count("writes")
+        self.evict()
+
+    # ------------------------------------------------------
+    # EXPULSIÓN
+    # ------------------------------------------------------
+    def evict(self) -> int:
+        """Borra lo caducado y, si se supera max_bytes, lo menos usado."""
+        now = time.time()
+        files = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".parquet"):
+                continue
+            info = entry.stat()
+            files.append((info.st_atime, info.st_mtime, info.st_size, entry.path))
+
+        removed = 0
+        total = sum(f[2] for f in files)
+        for atime, mtime, size, path in sorted(files):
+            if now - mtime <= self.max_age_s and total <= self.max_bytes:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+
+        self._count("evictions", removed)
+        return removed
+
+    def clear(self) -> None:
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".parquet"):
+                os.remove(entry.path)
+
+    def stats(self) -> dict:
+        files = [e.stat().st_size for e in os.scandir(self.directory) if e.name.endswith(".parquet")]
+        with self._lock:
+            return {**self._stats, "files": len(files), "bytes": sum(files)}
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += n